@@ -0,0 +1,183 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import pandas as pd
+from instrumentation import span
+from market_values import DEFAULT_CACHE_DIR, fetch_market_values, load_cached_market_values
+
+# Seconds each source may take before its last snapshot is used instead
+DEFAULT_TIMEOUTS = {
+    "understat": 15 * 60,
+    "whoscored": 3 * 60,
+    "transfermarkt": 60,
+}
+
+
+def acquire_understat(timeout):
+    """
+    Scrape Understat into the team directories, cancelling the scrape after timeout seconds.
+    """
+    from parse_understat import scrape_team_links_and_statistics
+
+    async def scrape():
+        return await asyncio.wait_for(scrape_team_links_and_statistics(), timeout)
+
+    failed = asyncio.run(scrape())
+    if failed:
+        print(f"Understat teams kept from the last snapshot: {', '.join(failed)}")
+    return failed
+
+
+def acquire_whoscored(who_scored_csv):
+    """
+    Scrape the WhoScored team statistics table into who_scored_csv.
+    """
+    from parse_whoscored import scrape_table
+
+    if scrape_table(output_csv=who_scored_csv) is None:
+        raise RuntimeError("WhoScored table could not be scraped")
+
+
+def acquire_transfermarkt(timeout, cache_dir):
+    """
+    Fetch the Transfermarkt market values through the cached provider.
+    """
+    return fetch_market_values(cache_dir=cache_dir, timeout=timeout)
+
+
+def understat_snapshot(base_dir):
+    """
+    Check that team directories from an earlier scrape exist in base_dir.
+    """
+    has_teams = any(
+        os.path.exists(os.path.join(base_dir, d, "matches.csv"))
+        for d in os.listdir(base_dir)
+    )
+    if not has_teams:
+        raise FileNotFoundError(f"No Understat team directories in {base_dir}")
+
+
+def whoscored_snapshot(who_scored_csv):
+    """
+    Check that a WhoScored CSV from an earlier scrape exists.
+    """
+    if not os.path.exists(who_scored_csv):
+        raise FileNotFoundError(who_scored_csv)
+
+
+def transfermarkt_snapshot(cache_dir):
+    """
+    Return the last cached market values, or an empty table when there are none.
+    """
+    market_values = load_cached_market_values(cache_dir)
+    if market_values is None:
+        print(f"WARNING no Transfermarkt market values cached in {cache_dir}: Market_Value is left empty, "
+              "fetch them with `cli.py scrape transfermarkt`")
+        return pd.DataFrame(columns=["Team", "Market_Value", "Market_Value_EUR"])
+    return market_values
+
+
+def run_in_daemon_thread(name, task):
+    """
+    Run task in a daemon thread and return a Future of its result.
+
+    Unlike the workers of a ThreadPoolExecutor, which the interpreter joins at
+    exit, a daemon thread still running when the process ends is dropped, so a
+    source that hangs past its timeout cannot keep the process alive.
+    """
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(task())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=f"acquire-{name}", daemon=True).start()
+    return future
+
+
+def acquire_sources(base_dir="./", who_scored_csv="./premier_league_stats.csv",
+                    timeouts=None, cache_dir=DEFAULT_CACHE_DIR, sources=("understat", "whoscored", "transfermarkt")):
+    """
+    Fetch Understat, WhoScored and Transfermarkt concurrently.
+
+    Each source runs in its own daemon thread. When a source fails or does not finish
+    within its timeout, its last snapshot on disk (team directories, WhoScored
+    CSV, cached Transfermarkt page) is used instead, so the run is only as slow
+    as the slowest source and never fails because of a single one. A source that
+    times out is no longer waited for, not even at interpreter exit; a WhoScored
+    scrape only replaces the CSV once it is complete.
+
+    :param base_dir: The directory of the Understat team directories
+    :param who_scored_csv: The path of the WhoScored CSV
+    :param timeouts: Per-source timeouts in seconds, overriding DEFAULT_TIMEOUTS
+    :param cache_dir: The Transfermarkt cache directory
+    :param sources: The sources to fetch, the others are read from their snapshots
+    :return: A tuple of the market values DataFrame and a report dictionary mapping
+        each source to its status ("fresh", "snapshot" or "failed"), latency in
+        seconds and error.
+    """
+    timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+    tasks = {
+        "understat": lambda: acquire_understat(timeouts["understat"]),
+        "whoscored": lambda: acquire_whoscored(who_scored_csv),
+        "transfermarkt": lambda: acquire_transfermarkt(timeouts["transfermarkt"], cache_dir),
+    }
+    snapshots = {
+        "understat": lambda: understat_snapshot(base_dir),
+        "whoscored": lambda: whoscored_snapshot(who_scored_csv),
+        "transfermarkt": lambda: transfermarkt_snapshot(cache_dir),
+    }
+
+    def timed(name, task):
+        start = time.perf_counter()
+        try:
+            with span("source", name):
+                return task(), time.perf_counter() - start, None
+        except Exception as e:
+            return None, time.perf_counter() - start, e
+
+    start = time.perf_counter()
+    futures = {name: run_in_daemon_thread(name, lambda name=name: timed(name, tasks[name])) for name in sources}
+
+    report = {}
+    results = {}
+    for name in tasks:
+        if name not in futures:
+            report[name] = {"status": "snapshot", "seconds": 0.0, "error": None}
+            error = None
+        else:
+            remaining = max(timeouts[name] - (time.perf_counter() - start), 0)
+            try:
+                result, seconds, exception = futures[name].result(timeout=remaining)
+            except FutureTimeoutError:
+                result, seconds, exception = None, time.perf_counter() - start, None
+                error = f"timed out after {timeouts[name]}s"
+            else:
+                if exception is None:
+                    results[name] = result
+                    report[name] = {"status": "fresh", "seconds": seconds, "error": None}
+                    continue
+                error = repr(exception)
+            report[name] = {"status": "snapshot", "seconds": seconds, "error": error}
+
+        try:
+            results[name] = snapshots[name]()
+        except Exception as e:
+            report[name]["status"] = "failed"
+            report[name]["error"] = error or repr(e)
+
+    for name, entry in report.items():
+        detail = f" ({entry['error']})" if entry["error"] else ""
+        print(f"{name}: {entry['status']} in {entry['seconds']:.2f}s{detail}")
+    print(f"Acquisition finished in {time.perf_counter() - start:.2f}s")
+
+    market_values = results.get("transfermarkt")
+    if market_values is None:
+        market_values = pd.DataFrame(columns=["Team", "Market_Value", "Market_Value_EUR"])
+    return market_values, report
@@ -2,11 +2,11 @@ import pandas as pd
 import plotly.express as px
 import streamlit as st
 import numpy as np
-from sklearn.preprocessing import StandardScaler
-from umap import UMAP
+import os
 import warnings
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
+from clustering import cluster_peers
+from embeddings import data_digest, load_artifacts
+from rank_index import RankIndex, derive_metrics
 
 warnings.filterwarnings("ignore")
 
@@ -14,11 +14,42 @@ warnings.filterwarnings("ignore")
 @st.cache_data
 def load_data():
     df = pd.read_csv("output.csv")
-    df1 = pd.read_csv("last_output.csv")
-    return df,df1
+    return df
 
 
-df,df1 = load_data()
+def read_table(name):
+    # The Feather copy written by `cli.py cluster --feather` loads faster than the CSV
+    if os.path.exists(f"{name}.feather"):
+        return pd.read_feather(f"{name}.feather")
+    return pd.read_csv(f"{name}.csv")
+
+
+# The team table and the team -> cluster membership table written by the clustering step,
+# both one row per team. They are joined per selected team instead of being exploded.
+@st.cache_resource
+def load_cluster_tables():
+    return read_table("team_table").set_index("team"), read_table("cluster_membership")
+
+
+# Cluster labels and UMAP embeddings, computed once per dataset version (or
+# precomputed with `python cli.py embed`) instead of on every rerun
+@st.cache_resource
+def load_cluster_artifacts(digest, _df):
+    return load_artifacts(_df)
+
+
+# Derived metrics and the rank of every team on every metric, built once per dataset version.
+# The returned objects are shared between reruns and must not be modified.
+@st.cache_resource
+def load_rank_index(digest, _df):
+    metrics_df = derive_metrics(_df)
+    return metrics_df, RankIndex(metrics_df)
+
+
+df = load_data()
+team_table, membership = load_cluster_tables()
+data_version = data_digest(df)
+metrics_df, rank_index = load_rank_index(data_version, df)
 
 # --- Sidebar for Team Selection ---
 st.sidebar.header("Team Statistics")
@@ -27,7 +58,8 @@ selected_team = st.sidebar.selectbox("Select a Team", df["team"].sort_values())
 
 # --- Filter data for selected team ---
 team_data = df[df["team"] == selected_team].iloc[0]  # Get the row as a Series
-team_data_changed = df1[df1["team"] == selected_team].iloc[0]  # Get the row as a Series
+market_value = team_table["Market_Value"].get(selected_team) if "Market_Value" in team_table else None
+similar_teams = cluster_peers(membership, selected_team)
 
 # --- Main content ---
 st.title("Football Team Performance Analysis")
@@ -37,8 +69,8 @@ st.sidebar.subheader(f"Statistics for {selected_team}")
 
 # Basic Stats
 st.sidebar.markdown(f"**Favorite Tactics:** {team_data['favorite_tactics']}")
-st.sidebar.markdown(f"**Market Value:** {team_data_changed['Market_Value']}")
-st.sidebar.markdown(f"**Similar Teams:** {str(team_data_changed['cluster_members']).strip("[]").replace("'","")}")
+st.sidebar.markdown(f"**Market Value:** {market_value}")
+st.sidebar.markdown(f"**Similar Teams:** {', '.join(similar_teams)}")
 st.sidebar.markdown(f"**Squad Size:** {team_data['squad_size']}")
 st.sidebar.markdown(f"**Points (Last 5):** {team_data['points_last_5']}")
 st.sidebar.markdown(f"**Points (Last 10):** {team_data['points_last_10']}")
@@ -49,48 +81,20 @@ st.sidebar.markdown(f"**Aerials Won:** {team_data['aerialswon']}")
 st.sidebar.markdown(f"**Rating:** {team_data['rating']}")
 
 # --- Comparison with Other Teams ---
-st.sidebar.subheader("Comparison (Points Last 5)")
-
-# 1. Sort by the metric
-df_sorted = df.sort_values("points_last_5", ascending=False).reset_index(drop=True)
-
-# 2. Find the index of the selected team
-selected_team_index = df_sorted[df_sorted["team"] == selected_team].index[0]
+# Any numeric or derived metric, looked up in the rank index instead of sorting on every rerun
+comparison_metrics = st.sidebar.multiselect(
+    "Compare on", rank_index.metrics, default=["points_last_5", "normal_goals_per_shot"]
+)
 
-# 3. Slice to get the 2 higher and 2 lower teams
-higher_teams = df_sorted.iloc[max(0, selected_team_index - 2):selected_team_index]
-lower_teams = df_sorted.iloc[selected_team_index + 1:min(selected_team_index + 3, len(df_sorted))]
+for metric in comparison_metrics:
+    st.sidebar.subheader(f"Comparison ({metric})")
+    st.sidebar.markdown(f"**Rank:** {rank_index.rank(selected_team, metric)} of {len(rank_index.teams)}")
+    comparison_df = rank_index.neighbours(selected_team, metric, k=2)
 
-# Concatenate and display
-comparison_df = pd.concat([higher_teams, lower_teams])
-
-if not comparison_df.empty:
-    st.sidebar.dataframe(comparison_df[["team", "points_last_5"]].sort_values("points_last_5", ascending=False))
-else:
-    st.sidebar.write("No teams to compare.")
-
-# --- Add more comparisons based on other statistics ---
-# Example: Goals per shot
-st.sidebar.subheader("Comparison (Normal Goals per Shot)")
-df["normal_goals_per_shot"] = df["normal_goals"] / df["normal_shots"]
-
-# 1. Sort by the metric (Normal Goals per Shot)
-df_sorted = df.sort_values("normal_goals_per_shot", ascending=False).reset_index(drop=True)
-
-# 2. Find the index of the selected team
-selected_team_index = df_sorted[df_sorted["team"] == selected_team].index[0]
-
-# 3. Slice to get the 2 higher and 2 lower teams
-higher_teams = df_sorted.iloc[max(0, selected_team_index - 2):selected_team_index]
-lower_teams = df_sorted.iloc[selected_team_index + 1:min(selected_team_index + 3, len(df_sorted))]
-
-comparison_df = pd.concat([higher_teams, lower_teams])
-
-if not comparison_df.empty:
-    st.sidebar.dataframe(
-        comparison_df[["team", "normal_goals_per_shot"]].sort_values("normal_goals_per_shot", ascending=False))
-else:
-    st.sidebar.write("No teams to compare.")
+    if not comparison_df.empty:
+        st.sidebar.dataframe(comparison_df[["team", metric]])
+    else:
+        st.sidebar.write("No teams to compare.")
 
 # --- New Analysis and Visualizations ---
 
@@ -142,9 +146,8 @@ if analysis_type == "Shooting Efficiency":
                      title=f"{shot_type.capitalize()} Goals vs. {shot_type.capitalize()} Shots")
     st.plotly_chart(fig)
 
-    # Goals per shot calculation and bar chart
-    df[f"{shot_type}_goals_per_shot"] = df[f"{shot_type}_goals"] / df[f"{shot_type}_shots"]
-    fig = px.bar(df, x="team", y=f"{shot_type}_goals_per_shot",
+    # Goals per shot bar chart
+    fig = px.bar(metrics_df, x="team", y=f"{shot_type}_goals_per_shot",
                  title=f"{shot_type.capitalize()} Goals per Shot")
     fig.update_xaxes(categoryorder='total descending')  # Sort bars
     st.plotly_chart(fig)
@@ -162,10 +165,8 @@ elif analysis_type == "Expected Goals (xG)":
                      title=f"{shot_type.capitalize()} Goals vs. {shot_type.capitalize()} xG")
     st.plotly_chart(fig)
 
-    # Goals - xG calculation and bar chart
-    df[f"{shot_type}_goals_minus_xg"] = df[f"{shot_type}_goals"] - df[f"{shot_type}_xg"]
-
-    fig = px.bar(df, x="team", y=f"{shot_type}_goals_minus_xg",
+    # Goals - xG bar chart
+    fig = px.bar(metrics_df, x="team", y=f"{shot_type}_goals_minus_xg",
                  title=f"{shot_type.capitalize()} Goals - xG")
     fig.update_xaxes(categoryorder='total descending')
     st.plotly_chart(fig)
@@ -211,33 +212,32 @@ elif analysis_type == "UMAP Visualization":
     # df = df.iloc[:, :-4]
     st.header("UMAP Visualization of EPL Teams with K-Means Clustering")
 
-    numeric_features = df.select_dtypes(include='number')
-    numeric_features.fillna(numeric_features.mean(), inplace=True)
+    artifacts = load_cluster_artifacts(data_version, df)
 
-    scaler = StandardScaler()
-    scaled_features = scaler.fit_transform(numeric_features)
-
-    # K-Means Clustering
-    num_clusters = 6
-    kmeans = KMeans(n_clusters=num_clusters, random_state=42)
-    df['Cluster'] = kmeans.fit_predict(scaled_features)
-    silhouette_avg = silhouette_score(scaled_features, df['Cluster'])
-    st.write(f"Silhouette Score: {silhouette_avg:.2f}")
+    # K-Means Clustering, choosing among the precomputed cluster counts
+    cluster_counts = artifacts["cluster_counts"]
+    num_clusters = st.sidebar.selectbox(
+        "Number of Clusters", cluster_counts,
+        index=cluster_counts.index(artifacts["chosen_k"])
+    )
+    umap_df = df.assign(Cluster=artifacts["labels"][num_clusters])
+    silhouette_avg = artifacts["silhouette"][num_clusters]
+    st.write(f"Silhouette Score: {silhouette_avg:.2f}, "
+             f"Stability: {artifacts['stability'][num_clusters]:.2f}")
 
     # --- 3D UMAP Visualization ---
-    umap_3d = UMAP(n_components=3, random_state=42)
-    umap_embedding_3d = umap_3d.fit_transform(scaled_features)
+    umap_embedding_3d = artifacts["umap_3d"]
 
-    df['UMAP_1_3d'] = umap_embedding_3d[:, 0]
-    df['UMAP_2_3d'] = umap_embedding_3d[:, 1]
-    df['UMAP_3_3d'] = umap_embedding_3d[:, 2]
+    umap_df['UMAP_1_3d'] = umap_embedding_3d[:, 0]
+    umap_df['UMAP_2_3d'] = umap_embedding_3d[:, 1]
+    umap_df['UMAP_3_3d'] = umap_embedding_3d[:, 2]
 
     fig_3d = px.scatter_3d(
-        df,
+        umap_df,
         x='UMAP_1_3d',
         y='UMAP_2_3d',
         z='UMAP_3_3d',
-        color=df['Cluster'].astype(str),
+        color=umap_df['Cluster'].astype(str),
         text='team',
         title='Clusters on Original Data Visualized in 3D with UMAP',
         labels={'UMAP_1_3d': 'UMAP Dimension 1', 'UMAP_2_3d': 'UMAP Dimension 2', 'UMAP_3_3d': 'UMAP Dimension 3'}
@@ -253,17 +253,16 @@ elif analysis_type == "UMAP Visualization":
     # ... (rest of the code is the same) ...
 
     # --- 2D UMAP Visualization ---
-    umap_2d = UMAP(n_components=2, random_state=42)
-    umap_embedding_2d = umap_2d.fit_transform(scaled_features)
+    umap_embedding_2d = artifacts["umap_2d"]
 
-    df['UMAP_1'] = umap_embedding_2d[:, 0]
-    df['UMAP_2'] = umap_embedding_2d[:, 1]
+    umap_df['UMAP_1'] = umap_embedding_2d[:, 0]
+    umap_df['UMAP_2'] = umap_embedding_2d[:, 1]
 
     fig_2d = px.scatter(
-        df,
+        umap_df,
         x='UMAP_1',
         y='UMAP_2',
-        color=df['Cluster'].astype(str),
+        color=umap_df['Cluster'].astype(str),
         text='team',
         title='Clusters on Original Data Visualized in 2D with UMAP',
         labels={'UMAP_1': 'UMAP Dimension 1', 'UMAP_2': 'UMAP Dimension 2', 'color': 'Cluster'}
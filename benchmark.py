@@ -0,0 +1,567 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+import numpy as np
+
+# Scales as "<teams>x<seasons>", from one real season to a long history of a large league
+DEFAULT_SCALES = ("20x1", "100x5", "500x20")
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+# A case regresses when it is this much slower (or uses this much more memory) than
+# the baseline, and by at least the absolute margins, which hide timer noise
+DEFAULT_THRESHOLD = 0.25
+MIN_SECONDS_MARGIN = 0.01
+MIN_MEMORY_MARGIN_MB = 1.0
+
+# Bumped whenever the generated files change, so that stale datasets are regenerated
+GENERATOR_VERSION = 1
+
+# Concurrency settings of the replayed Understat scrape, and the latency every replayed
+# page waits for, close to the round trip of the real site
+DEFAULT_SCRAPE_CONCURRENCY = (1, 4, 8, 16)
+DEFAULT_REPLAY_LATENCY = 0.05
+
+FIRST_SEASON = 2005
+MATCHES_PER_SEASON = 38
+PLAYERS_PER_TEAM = 25
+
+GAME_STATES = ["Goal diff 0", "Goal diff +1", "Goal diff > +1", "Goal diff -1", "Goal diff < -1"]
+FORMATIONS = ["4-3-3", "4-4-2", "4-2-3-1", "5-4-1", "5-3-2", "4-4-1-1"]
+ATTACK_SPEEDS = ["Normal", "Standard", "Slow", "Fast"]
+TIMINGS = ["1-15", "16-30", "31-45", "46-60", "61-75", "76+"]
+SHOT_ZONES = ["ownGoals", "shotOboxTotal", "shotPenaltyArea", "shotSixYardBox"]
+RESULTS = ["SavedShot", "MissedShots", "BlockedShot", "Goal", "ShotOnPost"]
+SITUATIONS = ["OpenPlay", "FromCorner", "SetPiece", "DirectFreekick", "Penalty"]
+SITUATION_NAMES = ["Open play", "From corner", "Set piece", "Direct Freekick", "Penalty"]
+POSITIONS = ["GK", "D", "D S", "M", "M S", "F M", "F", "F S"]
+
+
+def parse_scale(scale):
+    """
+    Split a "<teams>x<seasons>" scale into its two integers.
+    """
+    teams, seasons = scale.lower().split("x")
+    return int(teams), int(seasons)
+
+
+def _stat_rows(rng, names, with_stat, with_time):
+    lines = []
+    for name in names:
+        shots = int(rng.integers(5, 200))
+        goals = int(rng.binomial(shots, 0.1))
+        fields = [name] + ([name] if with_stat else [])
+        fields += [str(int(rng.integers(10, 1500)))] if with_time else []
+        fields += [str(shots), str(goals), repr(float(goals + rng.normal(0, 2) + 1))]
+        lines.append(",".join(fields))
+    return lines
+
+
+def _compound(rng, value):
+    delta = rng.normal(0, 1)
+    return f"{value:.2f}{delta:+.2f}"
+
+
+def write_team_dir(team_dir, team, opponents, season, rng):
+    """
+    Write the ten Understat category files of one synthetic team and season, in the
+    layout written by parse_understat.save_team_data.
+    """
+    os.makedirs(team_dir, exist_ok=True)
+    header = "Statistic,stat,shots,goals,xG"
+    timed_header = "Statistic,stat,time,shots,goals,xG"
+    plain_header = "Statistic,shots,goals,xG"
+    files = {
+        "attackSpeed": [header] + _stat_rows(rng, ATTACK_SPEEDS, True, False),
+        "formation": [timed_header] + _stat_rows(rng, FORMATIONS[:int(rng.integers(1, 7))], True, True),
+        "gameState": [timed_header] + _stat_rows(rng, GAME_STATES, True, True),
+        "timing": [header] + _stat_rows(rng, TIMINGS, True, False),
+        "shotZone": [header] + _stat_rows(rng, SHOT_ZONES, True, False),
+        "result": [plain_header] + _stat_rows(rng, RESULTS, False, False),
+        "situation": [plain_header] + _stat_rows(rng, SITUATIONS, False, False),
+    }
+
+    section_1 = ["№,Situation,Sh,G,ShA,GA,xG,xGA,xGD,xG/Sh,xGA/Sh"]
+    for number, situation in enumerate(SITUATION_NAMES, 1):
+        shots, against = int(rng.integers(2, 200)), int(rng.integers(2, 200))
+        xg, xga = shots * 0.1, against * 0.1
+        section_1.append(f"{number},{situation},{shots},{int(xg)},{against},{int(xga)},"
+                         f"{_compound(rng, xg)},{_compound(rng, xga)},{xg - xga:.2f},0.10,0.10")
+    files["section_1"] = section_1
+
+    section_2 = ["№,Player,Pos,Apps,Min,G,A,Sh90,KP90,xG,xA,xG90,xA90"]
+    for number in range(1, PLAYERS_PER_TEAM + 1):
+        minutes = int(rng.integers(10, 3420))
+        xg, xa = rng.gamma(1.0, 2.0), rng.gamma(1.0, 1.5)
+        section_2.append(
+            f"{number},{team.replace('_', ' ')} Player {number},{POSITIONS[number % len(POSITIONS)]},"
+            f"{int(rng.integers(1, 39))},{minutes},{int(rng.poisson(xg))},{int(rng.poisson(xa))},"
+            f"{rng.gamma(2, 0.7):.2f},{rng.gamma(2, 0.5):.2f},{_compound(rng, xg)},{_compound(rng, xa)},"
+            f"{xg * 90 / minutes:.2f},{xa * 90 / minutes:.2f}"
+        )
+    section_2.append(",,,,,40,30,13.94,11.21,46.81+7.81,36.84+6.84,2.24,1.76")
+    files["section_2"] = section_2
+
+    matches = ["Date,Opponent,Home Score,Away Score,Side,Home xG,Away xG"]
+    kickoff = date(season, 8, 10)
+    for week, opponent in enumerate(rng.choice(opponents, MATCHES_PER_SEASON)):
+        home_goals, away_goals = rng.poisson(1.5), rng.poisson(1.2)
+        matches.append(f"\"{(kickoff + timedelta(weeks=week)).strftime('%b %d, %Y')}\","
+                       f"{opponent.replace('_', ' ')},{home_goals},{away_goals},{'ha'[week % 2]},"
+                       f"{rng.gamma(3, 0.5):.2f},{rng.gamma(3, 0.4):.2f}")
+    files["matches"] = matches
+
+    for category, lines in files.items():
+        with open(os.path.join(team_dir, f"{category}.csv"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def write_history(path, teams, seasons, rng):
+    """
+    Write a pl-tables-shaped league history of every team over the seasons.
+    """
+    lines = ['"season_end_year","team","position","played","won","drawn","lost","gf","ga","gd","points","notes"']
+    played = 2 * (len(teams) - 1)
+    for season in seasons:
+        won = rng.integers(0, played + 1, len(teams))
+        drawn = rng.integers(0, played - won + 1)
+        lost = played - won - drawn
+        goals_for, goals_against = rng.poisson(50, len(teams)), rng.poisson(50, len(teams))
+        points = 3 * won + drawn
+        for position, row in enumerate(np.argsort(-points, kind="stable"), 1):
+            lines.append(f'{season + 1},"{teams[row].replace("_", " ")}",{position},{played},{won[row]},'
+                         f'{drawn[row]},{lost[row]},{goals_for[row]},{goals_against[row]},'
+                         f'{goals_for[row] - goals_against[row]},{points[row]},""')
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def write_who_scored(path, teams, rng):
+    """
+    Write a WhoScored-shaped team statistics table.
+    """
+    lines = ["Team,Goals,Shots pg,Discipline,Possession%,Pass%,AerialsWon,Rating"]
+    for position, team in enumerate(teams, 1):
+        lines.append(f"{position}. {team.replace('_', ' ')},{rng.poisson(40)},{rng.uniform(8, 18):.1f},"
+                     f"{rng.integers(300, 500)},{rng.uniform(35, 65):.1f},{rng.uniform(70, 90):.1f},"
+                     f"{rng.uniform(8, 20):.1f},{rng.uniform(6.3, 7.0):.2f}")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def generate_dataset(data_dir, n_teams, n_seasons, seed=0):
+    """
+    Generate a synthetic dataset: one directory of Understat team directories per
+    season, the pl-tables history of every season and a WhoScored table. A dataset
+    already generated with the same scale, seed and generator version is reused.
+
+    :return: A dictionary with the "root", the latest "season_dir" (the ETL's base
+        directory), the "pl_tables" and the "who_scored" paths.
+    """
+    root = os.path.join(data_dir, f"{n_teams}x{n_seasons}-seed{seed}-v{GENERATOR_VERSION}")
+    seasons = list(range(FIRST_SEASON, FIRST_SEASON + n_seasons))
+    paths = {
+        "root": root,
+        "season_dir": os.path.join(root, "understat", str(seasons[-1])),
+        "pl_tables": os.path.join(root, "pl-tables.csv"),
+        "who_scored": os.path.join(root, "premier_league_stats.csv"),
+    }
+    marker = os.path.join(root, "complete")
+    if os.path.exists(marker):
+        return paths
+
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    teams = [f"Team_{i:03d}" for i in range(n_teams)]
+    for season in seasons:
+        for team in teams:
+            team_dir = os.path.join(root, "understat", str(season), team)
+            write_team_dir(team_dir, team, [t for t in teams if t != team], season, rng)
+    write_history(paths["pl_tables"], teams, seasons, rng)
+    write_who_scored(paths["who_scored"], teams, rng)
+    open(marker, "w").close()
+    print(f"Generated {n_teams} teams x {n_seasons} seasons in {time.perf_counter() - start:.1f}s")
+    return paths
+
+
+def _json_blob(name, data):
+    # Understat escapes every character of the JSON string but letters and digits as \xNN
+    escaped = "".join(
+        char if char.isascii() and char.isalnum() else "".join(f"\\x{byte:02x}" for byte in char.encode("utf-8"))
+        for char in json.dumps(data)
+    )
+    return f"var {name} = JSON.parse('{escaped}');"
+
+
+def _stat_entries(rng, names, stat, timed):
+    entries = {}
+    for name in names:
+        entry = {"stat": name} if stat else {}
+        if timed:
+            entry["time"] = int(rng.integers(10, 1500))
+        for side in (entry, entry.setdefault("against", {})):
+            shots = int(rng.integers(5, 200))
+            side.update(shots=shots, goals=int(rng.binomial(shots, 0.1)), xG=f"{shots * rng.uniform(0.05, 0.15):.6f}")
+        entries[name] = entry
+    return entries
+
+
+def understat_pages(n_teams=20, season=2024, seed=0):
+    """
+    Generate a synthetic Understat league page and team pages, with the embedded
+    teamsData, statisticsData, playersData and datesData blobs that understat_http
+    parses.
+
+    :return: A list of (URL on understat.com, HTML) tuples, the league page first.
+    """
+    from understat_data import UNDERSTAT_URL
+
+    rng = np.random.default_rng(seed)
+    teams = [f"Team {i:03d}" for i in range(n_teams)]
+    kickoff = datetime(season, 8, 16, 15)
+
+    teams_data = {}
+    for number, team in enumerate(teams):
+        history = [{"date": (kickoff + timedelta(weeks=week)).strftime("%Y-%m-%d %H:%M:%S"), "h_a": "ha"[week % 2]}
+                   for week in range(MATCHES_PER_SEASON // 2)]
+        teams_data[str(number)] = {"id": str(number), "title": team, "history": history}
+    pages = [(f"{UNDERSTAT_URL}/league/EPL",
+              f"<html><body><script>{_json_blob('teamsData', teams_data)}</script></body></html>")]
+
+    for number, team in enumerate(teams):
+        statistics = {
+            "situation": _stat_entries(rng, SITUATIONS, False, False),
+            "formation": _stat_entries(rng, FORMATIONS[:int(rng.integers(1, 7))], True, True),
+            "gameState": _stat_entries(rng, GAME_STATES, True, True),
+            "timing": _stat_entries(rng, TIMINGS, True, False),
+            "shotZone": _stat_entries(rng, SHOT_ZONES, True, False),
+            "attackSpeed": _stat_entries(rng, ATTACK_SPEEDS, True, False),
+            "result": _stat_entries(rng, RESULTS, False, False),
+        }
+        players = [{
+            "player_name": f"{team} Player {i}", "position": POSITIONS[i % len(POSITIONS)],
+            "games": str(rng.integers(1, 39)), "time": str(rng.integers(10, 3420)),
+            "goals": str(rng.poisson(2)), "assists": str(rng.poisson(1.5)), "shots": str(rng.poisson(20)),
+            "key_passes": str(rng.poisson(15)), "xG": f"{rng.gamma(1.0, 2.0):.6f}", "xA": f"{rng.gamma(1.0, 1.5):.6f}",
+        } for i in range(1, PLAYERS_PER_TEAM + 1)]
+        dates = []
+        for week in range(MATCHES_PER_SEASON):
+            opponent = teams[(number + week + 1) % n_teams]
+            side = "ha"[week % 2]
+            home, away = (team, opponent) if side == "h" else (opponent, team)
+            dates.append({
+                "isResult": week < MATCHES_PER_SEASON // 2, "side": side,
+                "h": {"title": home}, "a": {"title": away},
+                "goals": {"h": str(rng.poisson(1.5)), "a": str(rng.poisson(1.2))},
+                "xG": {"h": f"{rng.gamma(3, 0.5):.6f}", "a": f"{rng.gamma(3, 0.4):.6f}"},
+                "datetime": (kickoff + timedelta(weeks=week)).strftime("%Y-%m-%d %H:%M:%S"),
+            })
+        scripts = "\n".join([_json_blob("statisticsData", statistics), _json_blob("playersData", players),
+                             _json_blob("datesData", dates)])
+        pages.append((f"{UNDERSTAT_URL}/team/{team.replace(' ', '_')}/{season}",
+                      f"<html><body><script>{scripts}</script></body></html>"))
+    return pages
+
+
+def write_understat_archive(root, n_teams=20, season=2024, seed=0):
+    """
+    Record the synthetic pages of understat_pages in a scrape_archive directory,
+    so that a full scrape can be replayed without a recorded archive. An archive
+    already written is reused.
+
+    :return: The number of pages in the archive.
+    """
+    from scrape_archive import PageArchive
+
+    archive = PageArchive(root)
+    if len(archive):
+        return len(archive)
+    headers = {"Content-Type": "text/html; charset=utf-8"}
+    for url, html in understat_pages(n_teams, season, seed):
+        archive.record(url, 200, headers, html.encode())
+    return len(archive)
+
+
+def measure(case, repeats=3):
+    """
+    Run a benchmark case: repeats timed runs (the best is kept), then one run
+    under tracemalloc for the peak memory, which would distort the timings.
+
+    :param case: A tuple of the setup function, run untimed before every run, and the function to time
+    :return: A dictionary of "seconds", "runs" and "peak_mb".
+    """
+    setup, function = case
+    runs = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats):
+            setup()
+            start = time.perf_counter()
+            function()
+            runs.append(time.perf_counter() - start)
+        setup()
+        tracemalloc.start()
+        try:
+            function()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return {"seconds": min(runs), "runs": runs, "peak_mb": peak / 2 ** 20}
+
+
+def build_cases(paths):
+    """
+    Describe the benchmark cases of one dataset: name -> (setup, function).
+    Every setup drops the parsed files of team_store, so each run reads its files.
+    """
+    import clustering
+    import etl
+    import team_points
+    from team_store import clear_cache
+
+    season_dir, pl_tables, who_scored = paths["season_dir"], paths["pl_tables"], paths["who_scored"]
+    cases = {}
+    for name in ["process_attack_speed", "process_team_formation", "process_team_game_state",
+                 "process_team_form", "process_team_squad_size", "process_all_data"]:
+        cases[name] = (clear_cache, lambda process=getattr(etl, name): process(season_dir))
+
+    cases["process_team_data"] = (
+        clear_cache, lambda: team_points.process_team_data(csv_file=pl_tables, current_dir=season_dir)
+    )
+
+    def merge():
+        # get_final_merged_df maps the historical points of the working directory's teams
+        current_dir = os.getcwd()
+        os.chdir(season_dir)
+        try:
+            # No source is fetched: the network steps fall back to their (empty) snapshots
+            return etl.get_final_merged_df(season_dir, pl_tables, who_scored, sources=())
+        finally:
+            os.chdir(current_dir)
+
+    cases["get_final_merged_df"] = (clear_cache, merge)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        final_df = merge()
+    cases["clustering"] = (lambda: None, lambda: clustering.fit_clustering(final_df, n_jobs=1))
+    return cases
+
+
+def run_scrape_benchmarks(archive_dir=None, concurrencies=DEFAULT_SCRAPE_CONCURRENCY, repeats=3,
+                          latency=DEFAULT_REPLAY_LATENCY, jitter=0.0, error_rate=0.0, data_dir=None, seed=0):
+    """
+    Measure a full Understat scrape (the HTTP engine) replayed from an archive by a
+    local scrape_archive.ReplayServer, at every concurrency setting. Every run scrapes
+    all the teams into a temporary directory, with a fresh manifest.
+
+    :param archive_dir: An archive recorded with `cli.py scrape understat --engine http --record`,
+        a synthetic 20-team archive (write_understat_archive) by default
+    :param concurrencies: The concurrency settings measured
+    :param repeats: The timed runs of each setting
+    :param latency: The seconds every replayed response waits
+    :param jitter: The upper bound of a random extra delay per response
+    :param error_rate: The share of responses replaced by a 503 error, which the scraper retries
+    :return: A tuple of the dictionary of cases "understat_http_c<concurrency>" -> the
+        measure() dictionary with "pages" (responses per run, retries included),
+        "pages_per_sec" and "failed" (always 0), and the dictionary of the cases left
+        out because a team failed in one of their runs -> the errors of those teams.
+        The timing of a scrape that did not save every team says nothing about the
+        scraper, so it is never recorded.
+    """
+    from scrape_archive import ReplayServer
+    from understat_http import scrape_league_http
+
+    if archive_dir is None:
+        data_dir = data_dir or os.path.join(tempfile.gettempdir(), "epl-benchmark")
+        archive_dir = os.path.join(data_dir, f"understat-archive-seed{seed}-v{GENERATOR_VERSION}")
+        write_understat_archive(archive_dir, seed=seed)
+
+    results = {}
+    failures = {}
+    with ReplayServer(archive_dir, latency=latency, jitter=jitter, error_rate=error_rate, seed=seed) as server, \
+            tempfile.TemporaryDirectory() as work_dir:
+        manifest_path = os.path.join(work_dir, "manifest.json")
+        for concurrency in concurrencies:
+            failed = {}
+
+            def setup():
+                if os.path.exists(manifest_path):
+                    os.remove(manifest_path)
+
+            def scrape(concurrency=concurrency):
+                current_dir = os.getcwd()
+                os.chdir(work_dir)
+                try:
+                    failed.update(asyncio.run(scrape_league_http(
+                        base_url=server.url, concurrency=concurrency, incremental=False,
+                        manifest_path=manifest_path
+                    )))
+                finally:
+                    os.chdir(current_dir)
+
+            requests_before = server.stats["requests"]
+            name = f"understat_http_c{concurrency}"
+            result = measure((setup, scrape), repeats)
+            result["pages"] = (server.stats["requests"] - requests_before) / (repeats + 1)
+            result["pages_per_sec"] = result["pages"] / result["seconds"]
+            result["failed"] = len(failed)
+            if failed:
+                failures[name] = failed
+                team, error = next(iter(failed.items()))
+                print(f"{'scrape':>8} {name:<26} FAILED: {len(failed)} teams, e.g. {team}: {error}")
+                continue
+            results[name] = result
+            print(f"{'scrape':>8} {name:<26} {result['seconds']:>8.3f}s {result['peak_mb']:>8.1f} MB "
+                  f"{result['pages_per_sec']:>8.1f} pages/s")
+    return results, failures
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, repeats=3, data_dir=None, seed=0, cases=None):
+    """
+    Generate (or reuse) the dataset of every scale and measure every case on it.
+
+    :param scales: The "<teams>x<seasons>" scales
+    :param repeats: The timed runs of each case
+    :param data_dir: Where the datasets are generated, a temporary directory by default
+    :param seed: The seed of the generated data
+    :param cases: The names of the cases to run, all by default
+    :return: The results dictionary: "machine" information and, per scale, per case,
+        the measure() dictionary. The replayed scrape cases (run_scrape_benchmarks)
+        are added by main() under the "scrape" scale.
+    """
+    data_dir = data_dir or os.path.join(tempfile.gettempdir(), "epl-benchmark")
+    results = {
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "date": date.today().isoformat(),
+        },
+        "scales": {},
+    }
+    for scale in scales:
+        paths = generate_dataset(data_dir, *parse_scale(scale), seed=seed)
+        scale_results = results["scales"][scale] = {}
+        for name, case in build_cases(paths).items():
+            if cases and name not in cases:
+                continue
+            scale_results[name] = measure(case, repeats)
+            print(f"{scale:>8} {name:<26} {scale_results[name]['seconds']:>8.3f}s "
+                  f"{scale_results[name]['peak_mb']:>8.1f} MB")
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare results with a baseline of the same format.
+
+    Timings are only compared when they are comparable: when the baseline was
+    recorded on a machine with another CPU count (the clustering and scrape cases
+    depend on it), or a case was timed over another number of runs (the best of
+    more runs is lower), its seconds are skipped with a warning. Peak memory is
+    always compared.
+
+    :return: A list of regression dictionaries ("scale", "case", "metric", "baseline",
+        "current", "ratio"), for the cases and scales present in both.
+    """
+    baseline_cpus = baseline.get("machine", {}).get("cpus")
+    current_cpus = results["machine"]["cpus"]
+    compare_seconds = baseline_cpus == current_cpus
+    if not compare_seconds:
+        print(f"WARNING the baseline was recorded with {baseline_cpus} CPUs and this machine has "
+              f"{current_cpus}: timings are not compared, record a baseline here with --update-baseline")
+
+    regressions = []
+    for scale, cases in results["scales"].items():
+        for name, current in cases.items():
+            reference = baseline.get("scales", {}).get(scale, {}).get(name)
+            if reference is None:
+                continue
+            metrics = [("peak_mb", MIN_MEMORY_MARGIN_MB)]
+            if compare_seconds and len(reference["runs"]) != len(current["runs"]):
+                print(f"WARNING {scale} {name}: the baseline kept the best of {len(reference['runs'])} runs "
+                      f"and this run of {len(current['runs'])}, timings are not compared")
+            elif compare_seconds:
+                metrics.insert(0, ("seconds", MIN_SECONDS_MARGIN))
+            for metric, margin in metrics:
+                if (current[metric] > reference[metric] * (1 + threshold)
+                        and current[metric] - reference[metric] > margin):
+                    regressions.append({
+                        "scale": scale, "case": name, "metric": metric,
+                        "baseline": reference[metric], "current": current[metric],
+                        "ratio": current[metric] / reference[metric] if reference[metric] else float("inf"),
+                    })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ETL, clustering and replayed scrape on synthetic data.")
+    parser.add_argument("--scales", nargs="*", default=list(DEFAULT_SCALES),
+                        help="Dataset scales as <teams>x<seasons>, none to only run the scrape.")
+    parser.add_argument("--cases", nargs="+", default=None, help="Only run these cases.")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per case, the best is kept.")
+    parser.add_argument("--data-dir", default=None, help="Directory of the generated datasets.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated data.")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file of the results.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="JSON baseline to compare against.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown or memory growth flagged as a regression.")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Write the results as the new baseline instead of comparing.")
+    parser.add_argument("--scrape-concurrency", type=int, nargs="*", default=list(DEFAULT_SCRAPE_CONCURRENCY),
+                        help="Concurrency settings of the replayed Understat scrape, none to skip it.")
+    parser.add_argument("--scrape-archive", default=None,
+                        help="Archive recorded with scrape --record to replay, a synthetic one by default.")
+    parser.add_argument("--latency", type=float, default=DEFAULT_REPLAY_LATENCY,
+                        help="Seconds every replayed page waits.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra delay of every replayed page.")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Share of the replayed pages answered with a 503 error.")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.scales, args.repeats, args.data_dir, args.seed, args.cases)
+    scrape_failures = {}
+    if args.scrape_concurrency:
+        scrape_results, scrape_failures = run_scrape_benchmarks(
+            args.scrape_archive, args.scrape_concurrency, args.repeats, args.latency, args.jitter,
+            args.error_rate, args.data_dir, args.seed
+        )
+        results["scales"]["scrape"] = {
+            name: result for name, result in scrape_results.items() if not args.cases or name in args.cases
+        }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if scrape_failures:
+        print(f"FAILED scrape cases: {', '.join(scrape_failures)}; the baseline is not compared or updated")
+        return 1
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, create one with --update-baseline")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        regressions = compare(results, json.load(f), args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression['scale']} {regression['case']} {regression['metric']}: "
+              f"{regression['baseline']:.3f} -> {regression['current']:.3f} ({regression['ratio']:.2f}x)")
+    if not regressions:
+        print("No regression against the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+from urllib.parse import urlparse
+from scrape_archive import recording_archive
+
+# Resource types that are never needed to read the statistics tables.
+# Stylesheets are kept because inner_text() depends on the rendered layout.
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+
+
+def is_allowed_host(url, allowed_hosts):
+    """
+    Check whether the URL points to one of the allowed hosts or their subdomains.
+    """
+    host = urlparse(url).hostname or ""
+    return any(host == allowed or host.endswith(f".{allowed}") for allowed in allowed_hosts)
+
+
+def should_block_request(url, resource_type, allowed_hosts):
+    """
+    Decide whether a request can be aborted without affecting the scraped data.
+
+    Images, media and fonts are always blocked, and so is everything served
+    from a host that is not in allowed_hosts (ads, trackers, analytics).
+    """
+    if url.startswith("data:"):
+        return False
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    return not is_allowed_host(url, allowed_hosts)
+
+
+async def block_unneeded_resources(target, allowed_hosts):
+    """
+    Install a route on a Playwright page or context (async API) that aborts
+    third-party and media requests. While scrape_archive is recording, the
+    responses of the target are also added to the archive.
+
+    :param target: The Playwright page or browser context
+    :param allowed_hosts: Hosts whose documents and scripts must still be loaded
+    :return: None
+    """
+    async def handle_route(route):
+        request = route.request
+        if should_block_request(request.url, request.resource_type, allowed_hosts):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await target.route("**/*", handle_route)
+    archive = recording_archive()
+    if archive is not None:
+        target.on("response", archive.record_playwright_response)
+
+
+def block_unneeded_resources_sync(target, allowed_hosts):
+    """
+    Same as block_unneeded_resources, for the Playwright sync API.
+    """
+    def handle_route(route):
+        request = route.request
+        if should_block_request(request.url, request.resource_type, allowed_hosts):
+            route.abort()
+        else:
+            route.continue_()
+
+    target.route("**/*", handle_route)
+    archive = recording_archive()
+    if archive is not None:
+        target.on("response", archive.record_playwright_response_sync)
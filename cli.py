@@ -0,0 +1,395 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Heavy dependencies (playwright, requests, sklearn, umap, streamlit) are imported
+# inside the command that needs them, so `python cli.py --help` and the ETL start
+# without loading them.
+
+ALL_SOURCES = ("understat", "whoscored", "transfermarkt")
+
+STAGE_CACHE_DIR = os.path.join(".cache", "stages")
+
+
+def record_pages(args):
+    if args.record:
+        from scrape_archive import start_recording
+
+        start_recording(args.record)
+
+
+def scrape_understat(args):
+    import asyncio
+    from parse_understat import scrape_team_links_and_statistics
+
+    record_pages(args)
+    failed = asyncio.run(scrape_team_links_and_statistics(
+        concurrency=args.concurrency, headless=not args.headed, engine=args.engine,
+        incremental=not args.full, output_format=args.format, base_url=args.base_url
+    ))
+    return 1 if failed else 0
+
+
+def scrape_whoscored(args):
+    from parse_whoscored import scrape_table
+
+    record_pages(args)
+    return 0 if scrape_table(headless=not args.headed, output_csv=args.output, base_url=args.base_url) else 1
+
+
+def scrape_transfermarkt(args):
+    from market_values import TRANSFERMARKT_URL, fetch_market_values
+    from scrape_archive import rebase_url
+
+    record_pages(args)
+    url = rebase_url(TRANSFERMARKT_URL, args.base_url) if args.base_url else TRANSFERMARKT_URL
+    market_values = fetch_market_values(cache_dir=args.cache_dir, ttl=0 if args.refresh else args.ttl, url=url)
+    print(market_values)
+    return 0
+
+
+def replay(args):
+    from scrape_archive import ReplayServer
+
+    server = ReplayServer(args.archive, args.host, args.port, args.latency, args.jitter, args.error_rate)
+    print(f"Replaying {len(server.archive)} pages of {args.archive} on {server.url}, Ctrl+C to stop")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+    print(f"Served {server.stats['requests']} requests, {server.stats['errors']} injected errors, "
+          f"{server.stats['missing']} not in the archive")
+    return 0
+
+
+def run_etl(args):
+    from instrumentation import span
+    from pipeline import run_pipeline
+
+    df = run_pipeline(
+        base_dir=args.base_dir,
+        pl_tables_csv=args.pl_tables,
+        who_scored_csv=args.who_scored,
+        sources=ALL_SOURCES if args.scrape else (),
+        cache_dir=None if args.no_cache else args.cache_dir,
+        targets=("merge",)
+    )["merge"]
+    with span("file_write", "final_output", path=args.output) as record:
+        df.to_csv(args.output, index=False, encoding="utf-8")
+        record["rows"] = len(df)
+    print(f"Final table saved to {args.output}")
+    return 0
+
+
+def run_cluster(args):
+    from clustering import write_cluster_output
+
+    model = write_cluster_output(
+        args.input, args.team_table, args.membership, args.clusters, args.feather,
+        model_path=args.model, seeds=tuple(range(42, 42 + args.seeds)), n_jobs=args.n_jobs
+    )
+    print(model["summary"].round(3))
+    return 0
+
+
+def run_embed(args):
+    import pandas as pd
+    from embeddings import load_artifacts
+
+    artifacts = load_artifacts(pd.read_csv(args.input), tuple(args.clusters), args.artifact_dir)
+    for num_clusters in artifacts["cluster_counts"]:
+        print(f"{num_clusters} clusters: silhouette {artifacts['silhouette'][num_clusters]:.3f}, "
+              f"stability {artifacts['stability'][num_clusters]:.3f}")
+    print(f"Default cluster count: {artifacts['chosen_k']}")
+    return 0
+
+
+def predict(args):
+    import pandas as pd
+    from match_model import fit_strengths, load_fixtures, predict_fixtures, strength_table
+
+    try:
+        model = fit_strengths(load_fixtures(args.base_dir), half_life_days=args.half_life, xg_weight=args.xg_weight)
+    except ValueError as e:
+        print(e)
+        return 1
+    print(f"Fitted {model['matches']} matches in {model['seconds']:.3f}s "
+          f"(home advantage {model['home_advantage']:.3f}, rho {model['rho']:.3f})")
+    print(strength_table(model).round(3))
+    if args.fixtures:
+        predictions = predict_fixtures(model, pd.read_csv(args.fixtures))
+        predictions.to_csv(args.output, index=False)
+        print(predictions.round(3))
+        print(f"Predictions saved to {args.output}")
+    return 0
+
+
+def simulate(args):
+    import pandas as pd
+    from match_model import expected_goals, fit_strengths, load_fixtures
+    from season_sim import current_table, rating_rates, remaining_fixtures, simulate_season, team_ratings
+
+    fixtures = load_fixtures(args.base_dir)
+    try:
+        table = current_table(fixtures)
+        remaining = remaining_fixtures(fixtures)
+    except ValueError as e:
+        print(e)
+        return 1
+    if args.strength == "model":
+        home_rates, away_rates = expected_goals(fit_strengths(fixtures), remaining["home"], remaining["away"])
+    else:
+        ratings = team_ratings(pd.read_csv(args.final_output), args.strength)
+        home_rates, away_rates = rating_rates(ratings, remaining["home"], remaining["away"])
+
+    summary, distribution = simulate_season(table, remaining, home_rates, away_rates,
+                                            n_simulations=args.simulations, seed=args.seed)
+    print(summary.round(3))
+    summary.to_csv(args.output, index=False)
+    if args.distribution:
+        distribution.to_csv(args.distribution)
+    print(f"Probabilities saved to {args.output}")
+    return 0
+
+
+def build_players(args):
+    from player_store import build_player_index
+
+    build_player_index(args.base_dir, args.dataset_dir, args.index, args.min_minutes)
+    return 0
+
+
+def similar_players(args):
+    from player_store import load_player_index
+
+    if not os.path.exists(args.index):
+        print(f"No player index at {args.index}, build it with `cli.py players build`")
+        return 1
+    try:
+        similar = load_player_index(args.index).most_similar(args.player, args.k, args.team)
+    except KeyError as e:
+        print(e.args[0])
+        return 1
+    print(similar[["distance", "team", "minutes", "goals_90", "assists_90", "xg_90", "xa_90"]].round(3))
+    return 0
+
+
+def list_cache(args):
+    from datetime import datetime
+    from stage_cache import list_entries
+
+    entries = list_entries(args.cache_dir, args.stage)
+    for meta in entries:
+        created = datetime.fromtimestamp(meta["created"]).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"{meta['stage']:<18} {meta['key'][:12]}  {created}  {meta['rows'] or 0:>5} rows  "
+              f"{meta['bytes'] / 1024:>8.1f} KiB  computed in {meta['seconds']:.2f}s")
+    print(f"{len(entries)} entries in {args.cache_dir}")
+    return 0
+
+
+def invalidate_cache(args):
+    from stage_cache import invalidate
+
+    if args.stage is None and args.key is None and not args.all and not args.keep_latest:
+        print("Choose the entries to delete with --stage, --key, --keep-latest or --all")
+        return 2
+    deleted = invalidate(args.cache_dir, args.stage, args.key, args.keep_latest)
+    print(f"Deleted {deleted} entries from {args.cache_dir}")
+    return 0
+
+
+def serve(args):
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    command = [sys.executable, "-m", "streamlit", "run", app, "--server.port", str(args.port)]
+    if args.headless:
+        command += ["--server.headless", "true"]
+    return subprocess.call(command)
+
+
+def build_parser():
+    """
+    Build the argument parser of every command. Defaults that live in the
+    scraper modules are repeated here so that building the parser imports nothing.
+    """
+    from instrumentation import add_arguments
+
+    parser = argparse.ArgumentParser(description="EPL data scraper, ETL and dashboard.")
+    add_arguments(parser)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scrape = commands.add_parser("scrape", help="Scrape one source.")
+    sources = scrape.add_subparsers(dest="source", required=True)
+
+    understat = sources.add_parser("understat", help="Scrape the Understat team statistics.")
+    understat.add_argument("--concurrency", type=int, default=4,
+                           help="Number of teams scraped at the same time.")
+    understat.add_argument("--headed", action="store_true",
+                           help="Show the browser window instead of running headless.")
+    understat.add_argument("--engine", choices=["browser", "http"], default="browser",
+                           help="Render pages in Chromium or fetch the raw HTML over HTTP.")
+    understat.add_argument("--full", action="store_true",
+                           help="Scrape every team, even those without new matches.")
+    understat.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                           help="Write team CSV directories or the partitioned Parquet dataset.")
+    understat.add_argument("--base-url", default="https://understat.com",
+                           help="Site root to scrape, e.g. a local replay server.")
+    understat.set_defaults(func=scrape_understat)
+
+    whoscored = sources.add_parser("whoscored", help="Scrape the WhoScored team statistics table.")
+    whoscored.add_argument("--headed", action="store_true",
+                           help="Show the browser window instead of running headless.")
+    whoscored.add_argument("--output", default="premier_league_stats.csv", help="CSV file to write.")
+    whoscored.add_argument("--base-url", default=None,
+                           help="Site root replacing https://www.whoscored.com, e.g. a local replay server.")
+    whoscored.set_defaults(func=scrape_whoscored)
+
+    transfermarkt = sources.add_parser("transfermarkt", help="Fetch the Transfermarkt market values.")
+    transfermarkt.add_argument("--cache-dir", default=os.path.join(".cache", "transfermarkt"),
+                               help="Directory of the cached page.")
+    transfermarkt.add_argument("--ttl", type=int, default=24 * 60 * 60,
+                               help="Seconds a cached page is used without revalidation.")
+    transfermarkt.add_argument("--refresh", action="store_true",
+                               help="Revalidate the cached page whatever its age.")
+    transfermarkt.add_argument("--base-url", default=None,
+                               help="Site root replacing https://www.transfermarkt.com, e.g. a local replay server.")
+    transfermarkt.set_defaults(func=scrape_transfermarkt)
+
+    for source in (understat, whoscored, transfermarkt):
+        source.add_argument("--record", default=None, metavar="ARCHIVE_DIR",
+                            help="Archive every fetched page and response into this directory.")
+
+    replay_parser = commands.add_parser("replay", help="Serve recorded pages to scrape offline.")
+    replay_parser.add_argument("--archive", default=os.path.join(".cache", "archive"),
+                               help="Directory recorded with scrape --record.")
+    replay_parser.add_argument("--host", default="127.0.0.1", help="Address to listen on.")
+    replay_parser.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    replay_parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response.")
+    replay_parser.add_argument("--jitter", type=float, default=0.0,
+                               help="Upper bound of a random extra delay in seconds.")
+    replay_parser.add_argument("--error-rate", type=float, default=0.0,
+                               help="Share of the requests answered with a 503 error.")
+    replay_parser.set_defaults(func=replay)
+
+    etl = commands.add_parser("etl", help="Build final_output.csv from the scraped data.")
+    etl.add_argument("--base-dir", default="./", help="Directory holding the team directories.")
+    etl.add_argument("--pl-tables", default="./pl-tables-1993-2024.csv", help="Historical league tables CSV.")
+    etl.add_argument("--who-scored", default="./premier_league_stats.csv", help="WhoScored CSV.")
+    etl.add_argument("--output", default="final_output.csv", help="CSV file to write.")
+    etl.add_argument("--scrape", action="store_true",
+                     help="Scrape every source first instead of using the last snapshots.")
+    etl.add_argument("--cache-dir", default=STAGE_CACHE_DIR, help="Directory of the stage cache.")
+    etl.add_argument("--no-cache", action="store_true",
+                     help="Recompute every stage instead of reusing the stage cache.")
+    etl.set_defaults(func=run_etl)
+
+    cluster = commands.add_parser("cluster", help="Cluster the teams of the final output.")
+    cluster.add_argument("--input", default="final_output.csv", help="ETL output CSV.")
+    cluster.add_argument("--team-table", default="team_table.csv", help="Team table CSV to write.")
+    cluster.add_argument("--membership", default="cluster_membership.csv",
+                         help="Team to cluster membership CSV to write.")
+    cluster.add_argument("--feather", action="store_true", help="Also write both tables as Feather files.")
+    cluster.add_argument("--clusters", type=int, default=None,
+                         help="Number of KMeans clusters, chosen by a sweep over 2 to 10 by default.")
+    cluster.add_argument("--seeds", type=int, default=10, help="KMeans seeds fitted per cluster count.")
+    cluster.add_argument("--n-jobs", type=int, default=-1, help="Parallel workers, -1 for all cores.")
+    cluster.add_argument("--model", default=os.path.join(".cache", "clustering", "model.joblib"),
+                         help="Path of the persisted model.")
+    cluster.set_defaults(func=run_cluster)
+
+    embed = commands.add_parser("embed", help="Precompute the dashboard's clusters and UMAP embeddings.")
+    embed.add_argument("--input", default="output.csv", help="Team table read by the dashboard.")
+    embed.add_argument("--clusters", type=int, nargs="+", default=[3, 4, 5, 6, 7, 8],
+                       help="Cluster counts the dashboard can switch between.")
+    embed.add_argument("--artifact-dir", default=os.path.join(".cache", "embeddings"),
+                       help="Directory of the stored artifacts.")
+    embed.set_defaults(func=run_embed)
+
+    predict_parser = commands.add_parser("predict", help="Fit the team strengths and predict fixtures.")
+    predict_parser.add_argument("--base-dir", default="./", help="Directory holding the team directories.")
+    predict_parser.add_argument("--fixtures", default=None,
+                                help="CSV of the fixtures to predict, with home and away columns.")
+    predict_parser.add_argument("--output", default="predictions.csv", help="CSV file of the predictions.")
+    predict_parser.add_argument("--half-life", type=float, default=180,
+                                help="Days after which a match counts half, 0 to weigh all matches equally.")
+    predict_parser.add_argument("--xg-weight", type=float, default=0.0,
+                                help="Share of xG in the fitted scores, from 0 (goals) to 1 (xG).")
+    predict_parser.set_defaults(func=predict)
+
+    simulate_parser = commands.add_parser("simulate", help="Simulate the rest of the season.")
+    simulate_parser.add_argument("--base-dir", default="./", help="Directory holding the team directories.")
+    simulate_parser.add_argument("--strength", choices=["model", "points", "goals_minus_xg"], default="model",
+                                 help="Team strengths: the fitted Dixon-Coles model or a final_output.csv rating.")
+    simulate_parser.add_argument("--final-output", default="final_output.csv",
+                                 help="ETL output CSV read by the rating strengths.")
+    simulate_parser.add_argument("--simulations", type=int, default=100_000, help="Number of simulated seasons.")
+    simulate_parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    simulate_parser.add_argument("--output", default="season_probabilities.csv",
+                                 help="CSV of the title, top-4 and relegation probabilities.")
+    simulate_parser.add_argument("--distribution", default=None,
+                                 help="CSV of the full position distribution of every team (optional).")
+    simulate_parser.set_defaults(func=simulate)
+
+    players = commands.add_parser("players", help="Build or query the player similarity index.")
+    player_commands = players.add_subparsers(dest="players_command", required=True)
+    player_index = os.path.join(".cache", "players", "index.joblib")
+
+    players_build = player_commands.add_parser("build", help="Build the index, or add the new and changed players.")
+    players_build.add_argument("--base-dir", default="./", help="Directory holding the team directories.")
+    players_build.add_argument("--dataset-dir", default=None,
+                               help="Parquet dataset to read every season from instead of the team directories.")
+    players_build.add_argument("--min-minutes", type=int, default=270, help="Minutes a player needs to be indexed.")
+    players_build.add_argument("--index", default=player_index, help="Path of the saved index.")
+    players_build.set_defaults(func=build_players)
+
+    players_similar = player_commands.add_parser("similar", help="List the players most similar to a player.")
+    players_similar.add_argument("player", help="Player name as on Understat, e.g. \"Bukayo Saka\".")
+    players_similar.add_argument("-k", type=int, default=10, help="Number of similar players.")
+    players_similar.add_argument("--team", default=None,
+                                 help="Team directory of the player, when several players share the name.")
+    players_similar.add_argument("--index", default=player_index, help="Path of the saved index.")
+    players_similar.set_defaults(func=similar_players)
+
+    cache = commands.add_parser("cache", help="Inspect or invalidate the pipeline stage cache.")
+    cache_commands = cache.add_subparsers(dest="cache_command", required=True)
+
+    cache_list = cache_commands.add_parser("list", help="List the stored stage outputs, newest first.")
+    cache_list.add_argument("--cache-dir", default=STAGE_CACHE_DIR, help="Directory of the stage cache.")
+    cache_list.add_argument("--stage", default=None, help="Only list the entries of this stage.")
+    cache_list.set_defaults(func=list_cache)
+
+    cache_invalidate = cache_commands.add_parser("invalidate", help="Delete stored stage outputs.")
+    cache_invalidate.add_argument("--cache-dir", default=STAGE_CACHE_DIR, help="Directory of the stage cache.")
+    cache_invalidate.add_argument("--stage", default=None, help="Only delete the entries of this stage.")
+    cache_invalidate.add_argument("--key", default=None, help="Only delete the entries whose key starts with this.")
+    cache_invalidate.add_argument("--keep-latest", action="store_true",
+                                  help="Keep the newest entry of each stage.")
+    cache_invalidate.add_argument("--all", action="store_true", help="Delete every entry.")
+    cache_invalidate.set_defaults(func=invalidate_cache)
+
+    serve_parser = commands.add_parser("serve", help="Run the Streamlit dashboard.")
+    serve_parser.add_argument("--port", type=int, default=8501, help="Port of the dashboard.")
+    serve_parser.add_argument("--headless", action="store_true", help="Do not open a browser tab.")
+    serve_parser.set_defaults(func=serve)
+
+    # The tracing options are accepted after the subcommand too, e.g. `cli.py etl --trace trace.json`
+    for subcommands in (commands, sources, player_commands, cache_commands):
+        for subparser in subcommands.choices.values():
+            if subparser not in (scrape, players, cache):
+                add_arguments(subparser, suppress_defaults=True)
+
+    return parser
+
+
+def main(argv=None):
+    from instrumentation import traced_run
+
+    args = build_parser().parse_args(argv)
+    with traced_run(args, args.command):
+        return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+import os
+import warnings
+import numpy as np
+import pandas as pd
+from instrumentation import span
+
+# Cluster counts and KMeans seeds swept by default
+DEFAULT_K_VALUES = tuple(range(2, 11))
+DEFAULT_SEEDS = tuple(range(42, 52))
+
+# A cluster count is only chosen when its clusterings agree on at least this share of team pairs
+MIN_STABILITY = 0.8
+
+# Above this many teams the silhouette is estimated on a sample, it is quadratic in the team count
+SILHOUETTE_SAMPLE_SIZE = 2000
+
+# Rows of the co-assignment matrix computed at once, bounding its memory to block x teams
+CO_ASSIGNMENT_BLOCK = 1024
+
+DEFAULT_MODEL_PATH = os.path.join(".cache", "clustering", "model.joblib")
+
+# Outputs of the clustering step, one row per team each
+TEAM_TABLE_FILE = "team_table.csv"
+MEMBERSHIP_FILE = "cluster_membership.csv"
+
+
+def prepare_features(data):
+    """
+    Fit the feature preparation of the team table: its numeric columns, with missing
+    values filled by the column mean, standardised. Columns without any value (e.g.
+    market values when Transfermarkt was unavailable) are skipped with a warning.
+
+    :return: A tuple of the preparation dictionary ("columns", "means", "scaler"), to
+        be reused by transform_features, and the scaled feature matrix.
+    """
+    from sklearn.preprocessing import StandardScaler
+
+    numeric_features = data.select_dtypes(include='number')
+    empty = [column for column in numeric_features.columns if numeric_features[column].isna().all()]
+    if empty:
+        print(f"WARNING features without any value are left out of the clustering: {', '.join(empty)}")
+    numeric_features = numeric_features.drop(columns=empty)
+    means = numeric_features.mean()
+    numeric_features = numeric_features.fillna(means)
+    scaler = StandardScaler().fit(numeric_features)
+    preparation = {"columns": list(numeric_features.columns), "means": means, "scaler": scaler}
+    return preparation, scaler.transform(numeric_features)
+
+
+def transform_features(preparation, data):
+    """
+    Scale the features of a team table with a preparation fitted by prepare_features.
+    """
+    numeric_features = data.reindex(columns=preparation["columns"]).astype(float)
+    return preparation["scaler"].transform(numeric_features.fillna(preparation["means"]))
+
+
+def _fit_run(features, k, seed, sample_size):
+    from sklearn.cluster import KMeans
+    from sklearn.exceptions import ConvergenceWarning
+    from sklearn.metrics import silhouette_score
+
+    # Fewer distinct teams than clusters is expected at the top of the sweep
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", ConvergenceWarning)
+        kmeans = KMeans(n_clusters=k, random_state=seed).fit(features)
+    labels = kmeans.labels_.astype("int16")
+    if len(features) > sample_size:
+        silhouette = silhouette_score(features, labels, sample_size=sample_size, random_state=seed)
+    else:
+        silhouette = silhouette_score(features, labels)
+    return k, seed, float(kmeans.inertia_), float(silhouette), labels, kmeans
+
+
+def co_assignment(labelings, rows=slice(None)):
+    """
+    Return the co-assignment matrix of several clusterings of the same teams: the share
+    of clusterings in which each pair of teams is in the same cluster.
+
+    :param labelings: A list of label arrays, one per clustering
+    :param rows: The rows to compute, all teams by default
+    :return: A float32 array of shape (rows, teams).
+    """
+    matrix = np.zeros((len(labelings[0][rows]), len(labelings[0])), dtype="float32")
+    for labels in labelings:
+        matrix += labels[rows, None] == labels[None, :]
+    return matrix / len(labelings)
+
+
+def stability_score(labelings, block_size=CO_ASSIGNMENT_BLOCK):
+    """
+    Return how consistently several clusterings group the teams: the mean over team
+    pairs of |2c - 1|, c being the pair's co-assignment. 1 means every clustering puts
+    every pair together or apart alike, 0 that pairs are together half of the time.
+
+    The co-assignment matrix is built in blocks of rows, so memory stays linear in the
+    number of teams.
+    """
+    n = len(labelings[0])
+    if n < 2:
+        return 1.0
+    total = 0.0
+    for start in range(0, n, block_size):
+        block = co_assignment(labelings, slice(start, start + block_size))
+        total += float(np.abs(2 * block - 1).sum())
+    # The diagonal (a team with itself) always contributes 1
+    return (total - n) / (n * (n - 1))
+
+
+def sweep(features, k_values=DEFAULT_K_VALUES, seeds=DEFAULT_SEEDS, n_jobs=-1,
+          sample_size=SILHOUETTE_SAMPLE_SIZE):
+    """
+    Fit KMeans for every cluster count and seed in parallel with joblib.
+
+    :param features: The scaled feature matrix from prepare_features
+    :param k_values: The cluster counts, those not below the number of teams are skipped
+    :param seeds: The KMeans seeds fitted for every cluster count
+    :param n_jobs: The number of joblib workers, -1 for all cores
+    :param sample_size: The silhouette sample size above which it is estimated
+    :return: A tuple of the runs DataFrame (k, seed, inertia, silhouette, one row per fit),
+        the per-k summary DataFrame (mean and std silhouette, mean inertia, stability),
+        and a dictionary of (k, seed) to (labels, fitted KMeans).
+    """
+    from joblib import Parallel, delayed
+
+    k_values = [k for k in k_values if 1 < k < len(features)]
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_run)(features, k, seed, sample_size) for k in k_values for seed in seeds
+    )
+
+    runs = pd.DataFrame(
+        [(k, seed, inertia, silhouette) for k, seed, inertia, silhouette, _, _ in results],
+        columns=["k", "seed", "inertia", "silhouette"]
+    )
+    fits = {(k, seed): (labels, kmeans) for k, seed, _, _, labels, kmeans in results}
+
+    summary = runs.groupby("k").agg(
+        silhouette=("silhouette", "mean"),
+        silhouette_std=("silhouette", "std"),
+        inertia=("inertia", "mean"),
+    )
+    summary["stability"] = [
+        stability_score([fits[(k, seed)][0] for seed in seeds]) for k in summary.index
+    ]
+    return runs, summary, fits
+
+
+def choose_k(summary, min_stability=MIN_STABILITY):
+    """
+    Return the cluster count with the best mean silhouette among those whose stability
+    is at least min_stability, or among all of them when none is that stable.
+    """
+    stable = summary[summary["stability"] >= min_stability]
+    return int((stable if not stable.empty else summary)["silhouette"].idxmax())
+
+
+def fit_clustering(data, k_values=DEFAULT_K_VALUES, seeds=DEFAULT_SEEDS, num_clusters=None,
+                   n_jobs=-1, min_stability=MIN_STABILITY):
+    """
+    Sweep cluster counts and seeds, choose the cluster count and keep its best fit.
+
+    :param data: The team table, e.g. final_output.csv
+    :param k_values: The cluster counts to sweep
+    :param seeds: The KMeans seeds fitted for every cluster count
+    :param num_clusters: A fixed cluster count, which skips the choice
+    :param n_jobs: The number of joblib workers, -1 for all cores
+    :param min_stability: The stability a cluster count needs to be chosen
+    :return: The model dictionary: the chosen "k", the "seed" and "kmeans" of its fit with
+        the lowest inertia, the feature "preparation", the "membership" table (team,
+        cluster), the sweep "runs" and "summary", and the "labelings" of the chosen k for
+        every seed (from which co_assignment rebuilds its stability matrix).
+    """
+    preparation, features = prepare_features(data)
+    if num_clusters is not None:
+        k_values = (num_clusters,)
+    runs, summary, fits = sweep(features, k_values, seeds, n_jobs)
+
+    k = num_clusters if num_clusters is not None else choose_k(summary, min_stability)
+    k_runs = runs[runs["k"] == k]
+    seed = int(k_runs.loc[k_runs["inertia"].idxmin(), "seed"])
+    labels, kmeans = fits[(k, seed)]
+
+    print(f"Chose {k} clusters (silhouette {summary.loc[k, 'silhouette']:.3f}, "
+          f"stability {summary.loc[k, 'stability']:.3f})")
+    return {
+        "k": k,
+        "seed": seed,
+        "kmeans": kmeans,
+        "preparation": preparation,
+        "membership": pd.DataFrame({"team": data["team"].to_numpy(), "cluster": labels}),
+        "runs": runs,
+        "summary": summary,
+        "labelings": np.vstack([fits[(k, s)][0] for s in seeds]),
+    }
+
+
+def cluster_teams(data, num_clusters=None, seeds=DEFAULT_SEEDS, n_jobs=-1):
+    """
+    Cluster the teams of the final ETL output on their standardised numeric features.
+
+    :param data: The DataFrame written by main.py (final_output.csv)
+    :param num_clusters: The number of KMeans clusters, chosen by fit_clustering when None
+    :param seeds: The KMeans seeds tried
+    :param n_jobs: The number of joblib workers
+    :return: The membership DataFrame, one row per team with its "team" and "cluster".
+    """
+    return fit_clustering(data, seeds=seeds, num_clusters=num_clusters, n_jobs=n_jobs)["membership"]
+
+
+def predict_clusters(model, data):
+    """
+    Assign the teams of a table to the clusters of a fitted model.
+
+    :return: The membership DataFrame of the table's teams.
+    """
+    labels = model["kmeans"].predict(transform_features(model["preparation"], data))
+    return pd.DataFrame({"team": data["team"].to_numpy(), "cluster": labels.astype("int16")})
+
+
+def save_model(model, path=DEFAULT_MODEL_PATH):
+    """
+    Persist a model from fit_clustering with joblib, replacing the file only once complete.
+    """
+    import joblib
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    joblib.dump(model, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+
+
+def load_model(path=DEFAULT_MODEL_PATH):
+    """
+    Load a model saved by save_model.
+    """
+    import joblib
+
+    return joblib.load(path)
+
+
+def cluster_peers(membership, team):
+    """
+    Return the other teams of a team's cluster, in membership order.
+    """
+    cluster = membership.loc[membership["team"] == team, "cluster"]
+    if cluster.empty:
+        return []
+    same_cluster = membership["cluster"] == cluster.iloc[0]
+    return membership.loc[same_cluster & (membership["team"] != team), "team"].tolist()
+
+
+def write_cluster_tables(data, membership, team_table_path=TEAM_TABLE_FILE,
+                         membership_path=MEMBERSHIP_FILE, feather=False):
+    """
+    Write the team table and the team to cluster membership table as CSV files and,
+    with feather=True, also as Feather files beside them.
+    """
+    with span("file_write", "team_table", path=team_table_path) as record:
+        data.to_csv(team_table_path, index=False)
+        record["rows"] = len(data)
+    with span("file_write", "cluster_membership", path=membership_path) as record:
+        membership.to_csv(membership_path, index=False)
+        record["rows"] = len(membership)
+    if feather:
+        data.reset_index(drop=True).to_feather(os.path.splitext(team_table_path)[0] + ".feather")
+        membership.reset_index(drop=True).to_feather(os.path.splitext(membership_path)[0] + ".feather")
+    print(f"Clusters saved to {team_table_path} and {membership_path}")
+
+
+def write_cluster_output(input_csv='final_output.csv', team_table_path=TEAM_TABLE_FILE,
+                         membership_path=MEMBERSHIP_FILE, num_clusters=None,
+                         feather=False, model_path=DEFAULT_MODEL_PATH, seeds=DEFAULT_SEEDS, n_jobs=-1):
+    """
+    Cluster final_output.csv, write the team table and the membership table and
+    persist the model.
+
+    :return: The model dictionary of fit_clustering.
+    """
+    data = pd.read_csv(input_csv)
+    model = fit_clustering(data, seeds=seeds, num_clusters=num_clusters, n_jobs=n_jobs)
+    write_cluster_tables(data, model["membership"], team_table_path, membership_path, feather)
+    if model_path:
+        save_model(model, model_path)
+    return model
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import pickle
+import warnings
+import pandas as pd
+
+DEFAULT_ARTIFACT_DIR = os.path.join(".cache", "embeddings")
+
+# Cluster counts precomputed for the dashboard, which can switch between them without refitting
+DEFAULT_CLUSTER_COUNTS = (3, 4, 5, 6, 7, 8)
+
+
+def data_digest(df):
+    """
+    Return the SHA-256 of a DataFrame's columns and values, the version of a dataset.
+    """
+    digest = hashlib.sha256()
+    digest.update("\0".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def compute_artifacts(df, cluster_counts=DEFAULT_CLUSTER_COUNTS, random_state=42):
+    """
+    Sweep KMeans over the cluster counts with clustering.sweep and fit the 2D and 3D
+    UMAP embeddings of the teams.
+
+    :param df: The team table, one row per team
+    :param cluster_counts: The KMeans cluster counts to fit
+    :param random_state: The seed of UMAP
+    :return: A dictionary with the dataset "digest", the "teams", the "cluster_counts",
+        the KMeans "labels" (of the lowest-inertia seed), mean "silhouette" and
+        "stability" of each count, the "chosen_k" of clustering.choose_k, and the
+        "umap_2d" and "umap_3d" embeddings (arrays of one row per team).
+    """
+    from umap import UMAP
+    from clustering import choose_k, prepare_features, sweep
+
+    _, scaled_features = prepare_features(df)
+    runs, summary, fits = sweep(scaled_features, cluster_counts)
+
+    labels = {}
+    for k, k_runs in runs.groupby("k"):
+        seed = int(k_runs.loc[k_runs["inertia"].idxmin(), "seed"])
+        labels[int(k)] = fits[(k, seed)][0]
+
+    # UMAP warns that a fixed random_state disables its parallelism, which is intended here
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        umap_3d = UMAP(n_components=3, random_state=random_state).fit_transform(scaled_features)
+        umap_2d = UMAP(n_components=2, random_state=random_state).fit_transform(scaled_features)
+
+    return {
+        "digest": data_digest(df),
+        "teams": df["team"].tolist(),
+        "cluster_counts": sorted(labels),
+        "labels": labels,
+        "silhouette": summary["silhouette"].to_dict(),
+        "stability": summary["stability"].to_dict(),
+        "chosen_k": choose_k(summary),
+        "umap_3d": umap_3d,
+        "umap_2d": umap_2d,
+    }
+
+
+def load_artifacts(df, cluster_counts=DEFAULT_CLUSTER_COUNTS, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    """
+    Return the artifacts of compute_artifacts for this dataset version, from
+    artifact_dir when they were computed before, otherwise computing and storing them.
+    """
+    digest = data_digest(df)
+    path = os.path.join(artifact_dir, f"{digest}.pkl")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            artifacts = pickle.load(f)
+        # Counts that are not below the number of teams cannot be fitted
+        if ("chosen_k" in artifacts
+                and {k for k in cluster_counts if 1 < k < len(df)} <= set(artifacts["cluster_counts"])):
+            return artifacts
+
+    print(f"Computing cluster and UMAP artifacts for dataset {digest[:12]}...")
+    artifacts = compute_artifacts(df, cluster_counts)
+    os.makedirs(artifact_dir, exist_ok=True)
+    with open(f"{path}.tmp", "wb") as f:
+        pickle.dump(artifacts, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{path}.tmp", path)
+    return artifacts
@@ -1,33 +1,42 @@
 import os
 import pandas as pd
-import asyncio
+from parquet_store import read_category
 from team_points import process_team_data
-from parse_understat import scrape_team_links_and_statistics
-from parse_whoscored import scrape_table
-import requests
-from bs4 import BeautifulSoup
+from team_store import TeamDataStore, scan_team_dirs
+from form import compute_form, latest_form, load_matches
+from teams import REGISTRY
 
-scrape_table
 def get_team_dirs(base_dir):
     """
     Return a list of team directory names in the base directory.
     """
-    return [
-        d for d in os.listdir(base_dir)
-        if os.path.isdir(os.path.join(base_dir, d))
-           and not d.startswith('.') and not d.startswith('_')
-    ]
+    return scan_team_dirs(base_dir)
+
+def get_store(base_dir, store=None):
+    """
+    Return the given TeamDataStore, or a new one over base_dir. New stores read
+    the Parquet dataset under base_dir when it exists, and reuse the frames
+    already read in this process for the files that did not change.
+    """
+    return store if store is not None else TeamDataStore(base_dir)
 
-def process_attack_speed(base_dir):
+def load_category_dataset(dataset_dir, category, columns=None, teams=None, seasons=None):
+    """
+    Load one category for all teams from the Parquet dataset written by the scraper
+    (see parquet_store), reading only the requested columns, teams and seasons.
+    """
+    return read_category(dataset_dir, category, columns=columns, teams=teams, seasons=seasons)
+
+def process_attack_speed(base_dir, store=None):
     """
     Process attackSpeed.csv for all teams to extract the total shots, goals,
     and expected goals for each type of attack speed.
     """
+    store = get_store(base_dir, store)
     all_teams_data = []
-    for team in get_team_dirs(base_dir):
-        team_path = os.path.join(base_dir, team, "attackSpeed.csv")
+    for team in store.teams:
         try:
-            attack_speed_data = pd.read_csv(team_path)
+            attack_speed_data = store.get(team, "attackSpeed")
             team_stats = {"team": team}
             for speed in ["Normal", "Standard", "Slow", "Fast"]:
                 speed_data = attack_speed_data[attack_speed_data["stat"] == speed]
@@ -44,15 +53,15 @@ def process_attack_speed(base_dir):
             print(f"attackSpeed.csv not found for team: {team}")
     return pd.DataFrame(all_teams_data)
 
-def process_team_formation(base_dir):
+def process_team_formation(base_dir, store=None):
     """
     Process formation.csv for all teams to determine their favorite tactics.
     """
+    store = get_store(base_dir, store)
     all_teams_data = []
-    for team in get_team_dirs(base_dir):
-        formation_path = os.path.join(base_dir, team, "formation.csv")
+    for team in store.teams:
         try:
-            formation_data = pd.read_csv(formation_path)
+            formation_data = store.get(team, "formation")
             favorite_tactics = formation_data.loc[formation_data["time"].idxmax(), "stat"]
             all_teams_data.append({"team": team, "favorite_tactics": favorite_tactics})
         except (FileNotFoundError, ValueError):
@@ -60,15 +69,15 @@ def process_team_formation(base_dir):
             all_teams_data.append({"team": team, "favorite_tactics": None})
     return pd.DataFrame(all_teams_data)
 
-def process_team_game_state(base_dir):
+def process_team_game_state(base_dir, store=None):
     """
     Process gameState.csv for all teams to extract total time winning, losing, drawing.
     """
+    store = get_store(base_dir, store)
     all_teams_data = []
-    for team in get_team_dirs(base_dir):
-        game_state_path = os.path.join(base_dir, team, "gameState.csv")
+    for team in store.teams:
         try:
-            game_state_data = pd.read_csv(game_state_path)
+            game_state_data = store.get(team, "gameState")
             winning_time = game_state_data.loc[
                 game_state_data["stat"].isin(["Goal diff +1", "Goal diff > +1"]),
                 "time"
@@ -97,40 +106,36 @@ def process_team_game_state(base_dir):
             })
     return pd.DataFrame(all_teams_data)
 
-def process_team_form(base_dir):
+def process_team_form(base_dir, store=None):
     """
     Process matches.csv for all teams to calculate rolling form for the last 5 matches.
+    The form is NaN when the venue of one of those matches is unknown.
+    The full form time series for other windows is available from form.compute_form.
     """
-    all_teams_data = []
-    for team in get_team_dirs(base_dir):
-        matches_path = os.path.join(base_dir, team, "matches.csv")
-        try:
-            matches_data = pd.read_csv(matches_path)
-            matches_data["Date"] = pd.to_datetime(matches_data["Date"], format="%b %d, %Y")
-            matches_data = matches_data.sort_values("Date")
-            matches_data["points"] = matches_data.apply(
-                lambda row: 3 if (row["Home Score"] - row["Away Score"]) > 0
-                else 1 if (row["Home Score"] - row["Away Score"]) == 0
-                else 0,
-                axis=1
-            )
-            matches_data["form"] = matches_data["points"].rolling(window=5).sum()
-            latest_form = matches_data.iloc[-1]["form"] if not matches_data.empty else 0
-            all_teams_data.append({"team": team, "form": latest_form})
-        except (FileNotFoundError, ValueError):
-            print(f"matches.csv not found or empty for team: {team}")
-            all_teams_data.append({"team": team, "form": 0})
-    return pd.DataFrame(all_teams_data)
+    store = get_store(base_dir, store)
+    matches, missing = load_matches(store)
+    for team in missing:
+        print(f"matches.csv not found or empty for team: {team}")
 
-def process_team_squad_size(base_dir):
+    form = compute_form(matches, windows=(5,), ewm_spans=())
+    for team in form.loc[form["points"].isna(), "team"].unique():
+        print(f"matches.csv does not record the venue of every match for team: {team}; re-scrape it to record Side")
+
+    form_df = latest_form(form, "form_5")
+    form_df = form_df.rename(columns={"form_5": "form"})
+    form_df = pd.DataFrame({"team": store.teams}).merge(form_df, on="team", how="left")
+    form_df.loc[~form_df["team"].isin(matches["team"]), "form"] = 0
+    return form_df
+
+def process_team_squad_size(base_dir, store=None):
     """
     Process section_2.csv for all teams to determine the squad size.
     """
+    store = get_store(base_dir, store)
     all_teams_data = []
-    for team in get_team_dirs(base_dir):
-        section_path = os.path.join(base_dir, team, "section_2.csv")
+    for team in store.teams:
         try:
-            section_data = pd.read_csv(section_path)
+            section_data = store.get(team, "section_2")
             max_min = section_data["Min"].max()
             threshold = 0.3 * max_min
             squad_size = section_data[section_data["Min"] > threshold].shape[0]
@@ -140,16 +145,24 @@ def process_team_squad_size(base_dir):
             all_teams_data.append({"team": team, "squad_size": 0})
     return pd.DataFrame(all_teams_data)
 
-def process_all_data(base_dir):
+def process_all_data(base_dir, store=None):
     """
     Process all team data and merge into a single DataFrame.
-    """
-    attack_speed_df = process_attack_speed(base_dir)
-    formation_df = process_team_formation(base_dir)
-    game_state_df = process_team_game_state(base_dir)
-    form_df = process_team_form(base_dir)
-    squad_size_df = process_team_squad_size(base_dir)
+    The base directory is scanned and its files are loaded once for all steps.
+    """
+    store = get_store(base_dir, store)
+    return combine_team_frames(
+        process_attack_speed(base_dir, store),
+        process_team_formation(base_dir, store),
+        process_team_game_state(base_dir, store),
+        process_team_form(base_dir, store),
+        process_team_squad_size(base_dir, store)
+    )
 
+def combine_team_frames(attack_speed_df, formation_df, game_state_df, form_df, squad_size_df):
+    """
+    Merge the per-team outputs of the process_* functions into a single DataFrame.
+    """
     final_df = (
         attack_speed_df
         .merge(formation_df, on="team", how="outer")
@@ -159,112 +172,76 @@ def process_all_data(base_dir):
     )
     return final_df
 
+def load_who_scored(who_scored_csv):
+    """
+    Read the WhoScored team statistics CSV with the column names used by the final table.
+    """
+    who_scored = pd.read_csv(who_scored_csv, encoding="utf-8", skiprows=1)
+    who_scored.columns = [
+        "team", "goals", "shots pg", "discipline",
+        "possession", "pass%", "aerialswon", "rating"
+    ]
+    return who_scored
+
 def get_final_merged_df(
         base_dir="./",
         pl_tables_csv="./pl-tables-1993-2024.csv",
-        who_scored_csv="./premier_league_stats.csv"
+        who_scored_csv="./premier_league_stats.csv",
+        sources=("understat", "whoscored", "transfermarkt"),
+        timeouts=None
 ):
     """
     Scrape or parse data, then process and merge everything into a final DataFrame.
+    The sources are fetched concurrently, and any source that fails or times out
+    falls back to its last snapshot (see acquisition.acquire_sources).
     Returns final_merged_df.
     """
 
-    # Scrape Transfermarkt data
-    url = "https://www.transfermarkt.com/premier-league/marktwerteverein/wettbewerb/GB1"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.content, 'html.parser')
-    table = soup.find("table", {"class": "items"})
-
-    teams = []
-    market_values = []
+    # Fetch Understat, WhoScored and Transfermarkt at the same time. The scrapers
+    # and their browser/HTTP dependencies are only imported here.
+    from acquisition import acquire_sources
 
-    for row in table.find("tbody").find_all("tr"):
-        team_name = row.find("td", {"class": "hauptlink no-border-links"}).text.strip()
-        market_value = row.find_all("td", {"class": "rechts"})[1].text.strip()
-        teams.append(team_name)
-        market_values.append(market_value)
-
-    transfermarkt_data = pd.DataFrame({"Team": teams, "Market_Value": market_values})
-
-    # Manual mapping of Transfermarkt names to given names
-    team_market_mapping = {
-        'arsenal': 'Arsenal FC',
-        'aston_villa': 'Aston Villa',
-        'bournemouth': 'AFC Bournemouth',
-        'brentford': 'Brentford FC',
-        'brighton': 'Brighton & Hove Albion',
-        'southampton': 'Southampton FC',
-        'chelsea': 'Chelsea FC',
-        'crystal_palace': 'Crystal Palace',
-        'everton': 'Everton FC',
-        'fulham': 'Fulham FC',
-        'liverpool': 'Liverpool FC',
-        'ipswich': 'Ipswich Town',
-        'manchester_city': 'Manchester City',
-        'manchester_united': 'Manchester United',
-        'newcastle_united': 'Newcastle United',
-        'nottingham_forest': 'Nottingham Forest',
-        'leicester': 'Leicester City',
-        'tottenham': 'Tottenham Hotspur',
-        'west_ham': 'West Ham United',
-        'wolverhampton_wanderers': 'Wolverhampton Wanderers'
-    }
-
-    transfermarkt_data["Given_Name"] = transfermarkt_data["Team"].map(
-        {v: k for k, v in team_market_mapping.items()}
+    transfermarkt_data, _ = acquire_sources(
+        base_dir=base_dir, who_scored_csv=who_scored_csv, timeouts=timeouts, sources=sources
     )
 
     # Process other data
-    asyncio.run(scrape_team_links_and_statistics())
     df_tp = process_team_data(csv_file=pl_tables_csv, current_dir=os.getcwd())
     final_team_data = process_all_data(base_dir)
+    who_scored = load_who_scored(who_scored_csv)
 
-    team_mapping = {
-        "newcastle": "newcastle_united",
-        "wolves": "wolverhampton_wanderers",
-        "man_utd": "manchester_united",
-        "man_city": "manchester_city",
-        "spurs": "tottenham"
-    }
+    return merge_final(final_team_data, df_tp, who_scored, transfermarkt_data)
 
-    # Normalize team names
-    final_team_data["team"] = (
-        final_team_data["team"]
-        .str.lower()
-        .replace(team_mapping)
-    )
-    df_tp["teams"] = (
-        df_tp["teams"]
-        .str.lower()
-        .replace(team_mapping)
-    )
+def merge_final(final_team_data, df_tp, who_scored, transfermarkt_data):
+    """
+    Merge the Understat team data, historical points, WhoScored statistics and
+    Transfermarkt market values into the final table, one row per team.
+    The inputs are not modified.
+    """
+    final_team_data = final_team_data.copy()
+    df_tp = df_tp.copy()
+    who_scored = who_scored.copy()
+    transfermarkt_data = transfermarkt_data.copy()
+    transfermarkt_data["team_id"] = REGISTRY.ids(transfermarkt_data["Team"])
 
-    merged_df = final_team_data.merge(df_tp, left_on="team", right_on="teams", how="outer")
-    merged_df.drop(columns=["teams"], inplace=True)
+    # Resolve every source's team names to integer IDs and merge on those
+    final_team_data["team_id"] = REGISTRY.ids(final_team_data.pop("team"))
+    df_tp["team_id"] = REGISTRY.ids(df_tp.pop("teams"))
 
-    who_scored = pd.read_csv(who_scored_csv, encoding="utf-8", skiprows=1)
-    who_scored.columns = [
-        "team", "goals", "shots pg", "discipline",
-        "possession", "pass%", "aerialswon", "rating"
-    ]
-    who_scored["team"] = (
-        who_scored["team"]
-        .str.replace(r"^\d+\.\s*", "", regex=True)
-        .str.lower()
-        .replace(team_mapping)
-        .str.replace(" ", "_")
-    )
+    # Points of directories that hold no team data (e.g. __pycache__) are dropped
+    merged_df = final_team_data.merge(df_tp, on="team_id", how="left")
 
-    final_merged_df = merged_df.merge(who_scored, on="team", how="outer")
+    who_scored["team_id"] = REGISTRY.ids(who_scored.pop("team"))
 
-    # Add market values from Transfermarkt
-    final_merged_df['Market_Value'] = final_merged_df['team'].map(
-        transfermarkt_data.set_index("Given_Name")["Market_Value"]
-    )
-    final_merged_df = final_merged_df.dropna(subset=["team"]).reset_index(drop=True)
+    final_merged_df = merged_df.merge(who_scored, on="team_id", how="outer")
+
+    # Add market values from Transfermarkt, as shown and in euros
+    market_values = transfermarkt_data.set_index("team_id")
+    final_merged_df['Market_Value'] = final_merged_df['team_id'].map(market_values["Market_Value"])
+    final_merged_df['Market_Value_EUR'] = final_merged_df['team_id'].map(market_values["Market_Value_EUR"])
+    final_merged_df = final_merged_df.dropna(subset=["team_id"])
+    final_merged_df.insert(0, "team", REGISTRY.slugs(final_merged_df.pop("team_id")))
+    final_merged_df = final_merged_df.sort_values("team").reset_index(drop=True)
     final_merged_df.fillna(
         {
             "normal_shots": 0,
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+from teams import REGISTRY
+
+MATCH_FRAME_COLUMNS = ["team", "Date", "Opponent", "Home Score", "Away Score", "Side", "Home xG", "Away xG"]
+
+DEFAULT_WINDOWS = (3, 5, 10)
+DEFAULT_EWM_SPANS = (5,)
+
+
+def load_matches(store):
+    """
+    Concatenate the matches.csv files of every team in a TeamDataStore into one long frame.
+
+    Dates are parsed once for all teams. Teams without a readable matches.csv are
+    left out and reported in the second return value.
+
+    :param store: The TeamDataStore to read from
+    :return: A tuple of the long matches DataFrame (with a "team" column) and the
+        list of teams whose matches could not be read.
+    """
+    frames = {}
+    missing = []
+    for team in store.teams:
+        try:
+            frames[team] = store.get(team, "matches")
+        except (FileNotFoundError, ValueError):
+            missing.append(team)
+
+    if not frames:
+        return pd.DataFrame(columns=MATCH_FRAME_COLUMNS), missing
+
+    matches = pd.concat(frames, names=["team", None]).reset_index(level=0).reset_index(drop=True)
+    matches["Date"] = pd.to_datetime(matches["Date"], format="%b %d, %Y")
+    return matches, missing
+
+
+def match_sides(matches):
+    """
+    Return whether each team played its match at home ("h") or away ("a").
+
+    Files scraped before the "Side" column was recorded keep the home team's score
+    first without saying which team that was. For those rows the venue is taken
+    from the opponent's row of the same match when that file records it; when
+    neither file does, the side is left missing.
+    """
+    side = matches["Side"] if "Side" in matches else pd.Series(np.nan, index=matches.index)
+    side = side.astype(object).where(side.isin(["h", "a"]))
+    if side.notna().all() or side.isna().all():
+        return side
+
+    team = REGISTRY.ids(matches["team"].astype(str)).to_numpy()
+    opponent = REGISTRY.ids(matches["Opponent"].astype(str)).to_numpy()
+    known = pd.DataFrame({
+        "Date": matches["Date"].to_numpy(),
+        "_team": opponent,
+        "_opponent": team,
+        "_side": side.map({"h": "a", "a": "h"}).to_numpy(),
+    })[side.notna().to_numpy()].drop_duplicates(["Date", "_team", "_opponent"])
+    looked_up = pd.DataFrame({"Date": matches["Date"].to_numpy(), "_team": team, "_opponent": opponent}).merge(
+        known, on=["Date", "_team", "_opponent"], how="left"
+    )["_side"]
+    return side.fillna(pd.Series(looked_up.to_numpy(), index=matches.index))
+
+
+def match_points(matches):
+    """
+    Compute the points of every match in one vectorized pass: 3 when the team scored
+    more than its opponent, 1 for a draw and 0 otherwise.
+
+    The scores are those of the home and away team, so the goal difference is
+    negated for away matches. Matches whose venue is unknown (see match_sides) get
+    NaN points rather than a guess.
+    """
+    side = match_sides(matches).to_numpy()
+    goal_diff = matches["Home Score"].to_numpy(dtype=float) - matches["Away Score"].to_numpy(dtype=float)
+    goal_diff = np.where(side == "a", -goal_diff, goal_diff)
+    points = np.select([goal_diff > 0, goal_diff == 0], [3, 1], default=0).astype(float)
+    return pd.Series(
+        np.where(pd.isna(side), np.nan, points),
+        index=matches.index,
+        name="points"
+    )
+
+
+def compute_form(matches, windows=DEFAULT_WINDOWS, ewm_spans=DEFAULT_EWM_SPANS):
+    """
+    Compute the rolling form of every team after each of its matches.
+
+    Rolling sums are taken as differences of per-team cumulative sums and the
+    exponentially weighted means use pandas' grouped ewm, so all teams are
+    handled in one pass whatever their number.
+
+    :param matches: The long matches DataFrame from load_matches
+    :param windows: The numbers of matches summed for the "form_<n>" columns
+    :param ewm_spans: The spans of the exponentially weighted "form_ewm_<span>" columns
+    :return: The matches sorted by team and date with "points", "form_<n>" and
+        "form_ewm_<span>" columns. A rolling form is NaN until the team has
+        played n matches, and while one of its last n matches has unknown points.
+        The exponentially weighted means skip those matches.
+    """
+    form = matches.sort_values(["team", "Date"], kind="stable").reset_index(drop=True)
+    form["points"] = match_points(form)
+
+    by_team = form.groupby("team", sort=False)
+    cumulative = form["points"].fillna(0).groupby(form["team"], sort=False).cumsum()
+    unknown = form["points"].isna().astype(int).groupby(form["team"], sort=False).cumsum()
+    position = by_team.cumcount()
+    for window in windows:
+        previous = cumulative.groupby(form["team"], sort=False).shift(window).fillna(0)
+        previous_unknown = unknown.groupby(form["team"], sort=False).shift(window).fillna(0)
+        complete = (position >= window - 1) & (unknown - previous_unknown == 0)
+        form[f"form_{window}"] = (cumulative - previous).where(complete)
+
+    for span in ewm_spans:
+        ewm = by_team["points"].ewm(span=span).mean()
+        form[f"form_ewm_{span}"] = ewm.reset_index(level=0, drop=True)
+
+    return form
+
+
+def latest_form(form, column="form_5"):
+    """
+    Return the value of a form column after the last match of every team.
+    """
+    last = form.drop_duplicates("team", keep="last")
+    return last[["team", column]].reset_index(drop=True)
@@ -0,0 +1,26 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from scrape_archive import recording_archive
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+
+def create_session(pool_size=8):
+    """
+    Create a requests session with a connection pool sized for concurrent fetches
+    and retries on transient server errors. While scrape_archive is recording,
+    every response of the session is added to the archive.
+    """
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    archive = recording_archive()
+    if archive is not None:
+        session.hooks["response"].append(archive.record_response)
+    return session
@@ -0,0 +1,296 @@
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+DEFAULT_PROFILE_DIR = os.path.join(".cache", "profiles")
+
+# Prefix of every exported Prometheus metric
+METRIC_PREFIX = "epl"
+
+# The tracer spans are recorded into, see start_tracing
+_tracer = None
+
+
+def count_rows(value):
+    """
+    Return the rows of a stage output or written table: its length when it has one.
+    """
+    return len(value) if hasattr(value, "__len__") and not isinstance(value, (str, bytes, dict)) else None
+
+
+class Tracer:
+    """
+    Records spans: the wall time, CPU time, rows and peak memory of one unit of
+    work (a pipeline stage, a team scrape, a page navigation, a file write...).
+
+    The CPU time is that of the whole process and the peak memory is the highest
+    tracemalloc peak while the span was open, above the memory traced when it
+    started; spans that overlap (concurrent team scrapes) therefore share what
+    happened during their overlap. Tracing memory slows Python code down, pass
+    memory=False to record times only.
+
+    :param memory: Whether to trace memory with tracemalloc
+    :param profile: The names of the "stage" spans run under cProfile, "all" for every stage
+    :param profile_dir: The directory of the .prof files
+    """
+
+    def __init__(self, memory=True, profile=(), profile_dir=DEFAULT_PROFILE_DIR):
+        self.memory = memory
+        self.profile = set(profile or ())
+        self.profile_dir = profile_dir
+        self.spans = []
+        self.started = time.time()
+        self._open = []
+        self._lock = threading.Lock()
+        self._profile_numbers = itertools.count(1)
+        self._own_tracemalloc = memory and not tracemalloc.is_tracing()
+        if self._own_tracemalloc:
+            tracemalloc.start()
+
+    def _fold_peak(self):
+        # Credit the peak since the last span event to every open span, then start a new interval
+        _, peak = tracemalloc.get_traced_memory()
+        for record in self._open:
+            record["_peak"] = max(record["_peak"], peak)
+        tracemalloc.reset_peak()
+
+    @contextlib.contextmanager
+    def span(self, kind, name, **labels):
+        """
+        Record the work done in the with block. The yielded record can be updated
+        in the block, e.g. record["rows"] = len(df) or record["labels"]["status"] = "cached".
+        """
+        record = {"kind": kind, "name": name, "labels": labels, "rows": None,
+                  "thread": threading.current_thread().name, "error": None}
+        profiler = self._start_profiler(kind, name)
+        with self._lock:
+            if self.memory:
+                self._fold_peak()
+                record["_start_memory"] = record["_peak"] = tracemalloc.get_traced_memory()[0]
+            self._open.append(record)
+        record["start"] = time.time()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = repr(e)
+            raise
+        finally:
+            record["wall_seconds"] = time.perf_counter() - wall
+            record["cpu_seconds"] = time.process_time() - cpu
+            if profiler is not None:
+                self._dump_profile(profiler, name)
+            with self._lock:
+                if self.memory:
+                    self._fold_peak()
+                    record["peak_bytes"] = max(record.pop("_peak") - record.pop("_start_memory"), 0)
+                else:
+                    record["peak_bytes"] = None
+                self._open.remove(record)
+                self.spans.append(record)
+
+    def _start_profiler(self, kind, name):
+        if kind != "stage" or not (name in self.profile or "all" in self.profile):
+            return None
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active, e.g. on an enclosing stage
+            print(f"Not profiling {name}: another profiler is active")
+            return None
+        return profiler
+
+    def _dump_profile(self, profiler, name):
+        profiler.disable()
+        os.makedirs(self.profile_dir, exist_ok=True)
+        # The process ID and a per-run number keep profiles of the same second apart
+        path = os.path.join(
+            self.profile_dir,
+            f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._profile_numbers)}.prof"
+        )
+        profiler.dump_stats(path)
+        print(f"Profile of {name} saved to {path}")
+
+    def summary(self):
+        """
+        Aggregate the spans by kind and name.
+
+        :return: A dictionary (kind, name) -> "count", "errors", "wall_seconds",
+            "cpu_seconds", "rows" (sums) and "peak_bytes" (max).
+        """
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for record in spans:
+            total = totals.setdefault((record["kind"], record["name"]), {
+                "count": 0, "errors": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "rows": 0, "peak_bytes": 0
+            })
+            total["count"] += 1
+            total["errors"] += record["error"] is not None
+            total["wall_seconds"] += record["wall_seconds"]
+            total["cpu_seconds"] += record["cpu_seconds"]
+            total["rows"] += record["rows"] or 0
+            total["peak_bytes"] = max(total["peak_bytes"], record["peak_bytes"] or 0)
+        return totals
+
+    def write_trace(self, path):
+        """
+        Write the spans as a Chrome trace-event JSON file (chrome://tracing, Perfetto),
+        with the CPU time, rows, peak memory and labels of each span in its args.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        threads = {}
+        events = []
+        for record in sorted(spans, key=lambda record: record["start"]):
+            events.append({
+                "name": record["name"],
+                "cat": record["kind"],
+                "ph": "X",
+                "ts": (record["start"] - self.started) * 1e6,
+                "dur": record["wall_seconds"] * 1e6,
+                "pid": os.getpid(),
+                "tid": threads.setdefault(record["thread"], len(threads)),
+                "args": {
+                    "cpu_seconds": record["cpu_seconds"],
+                    "rows": record["rows"],
+                    "peak_bytes": record["peak_bytes"],
+                    "error": record["error"],
+                    **record["labels"],
+                },
+            })
+        for thread, tid in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+                           "args": {"name": thread}})
+        trace = {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"started": self.started}}
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(trace, f, default=str)
+        os.replace(f"{path}.tmp", path)
+        print(f"Trace of {len(spans)} spans saved to {path}")
+
+    def write_prometheus(self, path):
+        """
+        Write the summary in the Prometheus text format, for the node exporter's
+        textfile collector. Every metric is labelled by span kind and name only; the
+        other labels (URLs, paths) are left to the JSON trace.
+        """
+        # Gauges, not counters: the file describes the last run and is replaced by the next one
+        metrics = [
+            ("span_count", "count", "Spans recorded by the last run."),
+            ("span_errors", "errors", "Spans of the last run that raised an exception."),
+            ("span_wall_seconds", "wall_seconds", "Wall time spent in the spans of the last run."),
+            ("span_cpu_seconds", "cpu_seconds", "Process CPU time spent in the spans of the last run."),
+            ("span_rows", "rows", "Rows processed or written by the spans of the last run."),
+            ("span_peak_memory_bytes", "peak_bytes", "Highest traced memory of a span above its start."),
+        ]
+        summary = self.summary()
+        lines = []
+        for metric, field, help_text in metrics:
+            name = f"{METRIC_PREFIX}_{metric}"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            for (kind, span_name), total in sorted(summary.items()):
+                labels = f'kind="{_escape_label(kind)}",name="{_escape_label(span_name)}"'
+                lines.append(f"{name}{{{labels}}} {total[field]}")
+        lines += [f"# HELP {METRIC_PREFIX}_last_run_timestamp_seconds Start of the last traced run.",
+                  f"# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge",
+                  f"{METRIC_PREFIX}_last_run_timestamp_seconds {self.started}"]
+        # The collector may read at any time, so the file is only replaced once complete
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(f"{path}.tmp", path)
+        print(f"Prometheus metrics saved to {path}")
+
+    def close(self):
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def start_tracing(memory=True, profile=(), profile_dir=DEFAULT_PROFILE_DIR):
+    """
+    Record the spans of the instrumented code (pipeline stages, sources, team
+    scrapes, page navigations, file writes) from now on.
+
+    :return: The Tracer.
+    """
+    global _tracer
+    _tracer = Tracer(memory, profile, profile_dir)
+    return _tracer
+
+
+def stop_tracing():
+    """
+    Stop recording and return the tracer, or None when not tracing.
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
+    return tracer
+
+
+@contextlib.contextmanager
+def span(kind, name, **labels):
+    """
+    Record a span in the active tracer; without one, only yield a record that is discarded.
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield {"labels": labels}
+        return
+    with tracer.span(kind, name, **labels) as record:
+        yield record
+
+
+def add_arguments(parser, suppress_defaults=False):
+    """
+    Add the --trace, --prometheus, --profile, --profile-dir and --no-memory options to a parser.
+
+    :param suppress_defaults: Leave the options out of the namespace unless they are
+        given, for subcommand parsers whose values would otherwise replace those given
+        before the subcommand
+    """
+    def default(value):
+        return argparse.SUPPRESS if suppress_defaults else value
+
+    parser.add_argument("--trace", default=default(None),
+                        help="Write a JSON trace of every stage, scrape and write here.")
+    parser.add_argument("--prometheus", default=default(None),
+                        help="Write the per-stage metrics in the Prometheus textfile format here.")
+    parser.add_argument("--profile", action="append", default=default([]), metavar="STAGE",
+                        help="Run this pipeline stage under cProfile, \"all\" for every stage; repeatable.")
+    parser.add_argument("--profile-dir", default=default(DEFAULT_PROFILE_DIR), help="Directory of the .prof files.")
+    parser.add_argument("--no-memory", action="store_true", default=default(False),
+                        help="Do not trace memory, which slows Python code.")
+
+
+@contextlib.contextmanager
+def traced_run(args, name):
+    """
+    Trace the with block as a "run" span when the options of add_arguments ask for
+    it, then write the requested outputs.
+    """
+    if not (args.trace or args.prometheus or args.profile):
+        yield
+        return
+    tracer = start_tracing(memory=not args.no_memory, profile=args.profile, profile_dir=args.profile_dir)
+    try:
+        with tracer.span("run", name):
+            yield
+    finally:
+        stop_tracing()
+        if args.trace:
+            tracer.write_trace(args.trace)
+        if args.prometheus:
+            tracer.write_prometheus(args.prometheus)
@@ -1,12 +1,31 @@
-from etl import get_final_merged_df
+import argparse
+from clustering import save_model, write_cluster_tables
+from instrumentation import add_arguments, span, traced_run
+from pipeline import run_pipeline
+from stage_cache import DEFAULT_CACHE_DIR
 
 if __name__ == "__main__":
-    df = get_final_merged_df(
-        base_dir="./",
-        pl_tables_csv="./pl-tables-1993-2024.csv",
-        who_scored_csv="./premier_league_stats.csv"
-    )
+    parser = argparse.ArgumentParser(description="Scrape every source and build final_output.csv and the cluster tables.")
+    parser.add_argument("--etl-only", action="store_true",
+                        help="Skip scraping and build the output from the last snapshots.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Recompute every stage instead of reusing the stage cache.")
+    add_arguments(parser)
+    args = parser.parse_args()
 
-    df.to_csv('final_output.csv',index=False, encoding="utf-8")
-    print(df)
+    with traced_run(args, "main"):
+        outputs = run_pipeline(
+            base_dir="./",
+            pl_tables_csv="./pl-tables-1993-2024.csv",
+            who_scored_csv="./premier_league_stats.csv",
+            sources=() if args.etl_only else ("understat", "whoscored", "transfermarkt"),
+            cache_dir=None if args.no_cache else DEFAULT_CACHE_DIR
+        )
+        df = outputs["merge"]
 
+        with span("file_write", "final_output", path="final_output.csv") as record:
+            df.to_csv('final_output.csv',index=False, encoding="utf-8")
+            record["rows"] = len(df)
+        write_cluster_tables(df, outputs["clustering"]["membership"])
+        save_model(outputs["clustering"])
+    print(df)
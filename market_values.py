@@ -0,0 +1,149 @@
+import json
+import os
+import time
+import pandas as pd
+from bs4 import BeautifulSoup
+from instrumentation import span
+
+TRANSFERMARKT_URL = "https://www.transfermarkt.com/premier-league/marktwerteverein/wettbewerb/GB1"
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "transfermarkt")
+
+# Market values change slowly, a day old page is good enough
+DEFAULT_TTL = 24 * 60 * 60
+
+MARKET_VALUE_PATTERN = r"€\s*([\d.,]+)\s*(bn|m|k|th\.)?"
+MARKET_VALUE_UNITS = {"bn": 1e9, "m": 1e6, "k": 1e3, "th.": 1e3}
+
+
+def parse_market_values(values):
+    """
+    Convert Transfermarkt market values such as €1.15bn or €614.95m to euros, vectorized.
+
+    :param values: A Series of market value strings
+    :return: A float Series of values in euros, NaN where a value could not be parsed.
+    """
+    parts = values.astype("string").str.extract(MARKET_VALUE_PATTERN)
+    amount = pd.to_numeric(parts[0].str.replace(",", "", regex=False), errors="coerce")
+    unit = parts[1].map(MARKET_VALUE_UNITS).fillna(1).astype(float)
+    return (amount * unit).astype(float)
+
+
+def parse_market_value_table(html):
+    """
+    Extract the club names and market values from the Transfermarkt league page
+    (raw bytes or text).
+
+    :return: A DataFrame with "Team", "Market_Value" (as shown) and "Market_Value_EUR" columns.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    table = soup.find("table", {"class": "items"})
+
+    teams = []
+    market_values = []
+
+    for row in table.find("tbody").find_all("tr"):
+        team_name = row.find("td", {"class": "hauptlink no-border-links"}).text.strip()
+        market_value = row.find_all("td", {"class": "rechts"})[1].text.strip()
+        teams.append(team_name)
+        market_values.append(market_value)
+
+    market_data = pd.DataFrame({"Team": teams, "Market_Value": market_values})
+    market_data["Market_Value_EUR"] = parse_market_values(market_data["Market_Value"])
+    return market_data
+
+
+def _cache_paths(cache_dir):
+    return os.path.join(cache_dir, "market_values.html"), os.path.join(cache_dir, "meta.json")
+
+
+def read_cached_page(cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Return the cached page bytes and its metadata, or (None, {}) when nothing is cached.
+    """
+    page_path, meta_path = _cache_paths(cache_dir)
+    if not (os.path.exists(page_path) and os.path.exists(meta_path)):
+        return None, {}
+    with open(page_path, "rb") as f:
+        html = f.read()
+    with open(meta_path, encoding="utf-8") as f:
+        return html, json.load(f)
+
+
+def write_cache(cache_dir, html, meta):
+    """
+    Store the page and its metadata (fetch time and validators) in the cache directory.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    page_path, meta_path = _cache_paths(cache_dir)
+    if html is not None:
+        with open(page_path, "wb") as f:
+            f.write(html)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+
+def load_cached_market_values(cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Return the market values of the last cached page whatever its age, or None
+    when nothing is cached.
+    """
+    html, _ = read_cached_page(cache_dir)
+    return parse_market_value_table(html) if html is not None else None
+
+
+def fetch_market_values(cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, session=None, timeout=30, url=TRANSFERMARKT_URL):
+    """
+    Return the Premier League market values, from the disk cache when it is fresh.
+
+    A cached page younger than ttl seconds is used without any network call. An
+    older one is revalidated with If-None-Match / If-Modified-Since and reused
+    when the server answers 304 Not Modified.
+
+    :param cache_dir: The directory of the cached page
+    :param ttl: The number of seconds a cached page is used without revalidation
+    :param session: A requests session to reuse, a pooled one is created when omitted
+    :param timeout: The request timeout in seconds
+    :param url: The Transfermarkt page URL
+    :return: The DataFrame from parse_market_value_table.
+    """
+    html, meta = read_cached_page(cache_dir)
+    if html is not None and time.time() - meta.get("fetched_at", 0) < ttl:
+        print("Using cached Transfermarkt market values")
+        return parse_market_value_table(html)
+
+    headers = {}
+    if html is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    # requests is only needed when the cache is stale
+    from http_utils import create_session
+
+    own_session = session is None
+    session = session or create_session(pool_size=1)
+    try:
+        print(f"Fetching {url}...")
+        with span("page", "transfermarkt", url=url) as record:
+            response = session.get(url, headers=headers, timeout=timeout)
+            record["labels"]["status"] = response.status_code
+    finally:
+        if own_session:
+            session.close()
+
+    if response.status_code == 304 and html is not None:
+        print("Transfermarkt market values not modified")
+        meta["fetched_at"] = time.time()
+        write_cache(cache_dir, None, meta)
+        return parse_market_value_table(html)
+
+    response.raise_for_status()
+    html = response.content
+    write_cache(cache_dir, html, {
+        "fetched_at": time.time(),
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    })
+    return parse_market_value_table(html)
@@ -0,0 +1,331 @@
+import time
+import numpy as np
+import pandas as pd
+from form import load_matches
+from team_store import TeamDataStore
+from teams import REGISTRY
+
+# Matches this many days before the last one count half as much as the last one
+DEFAULT_HALF_LIFE_DAYS = 180
+
+# Ridge penalty on the attack and defence strengths, which keeps teams with few
+# matches close to average and makes the strengths identifiable
+DEFAULT_L2 = 0.01
+
+# Scorelines up to this many goals per team are predicted, more are vanishingly rare
+DEFAULT_MAX_GOALS = 10
+
+# Bounds of the Dixon-Coles low-score correlation
+RHO_BOUNDS = (-0.3, 0.3)
+
+FIXTURE_COLUMNS = ["Date", "home", "away", "home_goals", "away_goals", "home_xg", "away_xg", "venue_known"]
+
+
+def load_fixtures(base_dir="./", store=None):
+    """
+    Build one row per played match from the matches.csv files of every team.
+
+    A match appears in the files of both teams; it is kept once, preferring a row
+    that records the venue. Files scraped before the "Side" column was recorded
+    do not tell which of the two teams played at home, so neither which team scored
+    which goals: those matches are kept with venue_known False and the teams in
+    name order, and are left out of fit_strengths.
+
+    :param base_dir: The directory of the team directories, used when no store is given
+    :param store: A TeamDataStore holding the "matches" category (optional)
+    :return: The fixtures DataFrame with the FIXTURE_COLUMNS, team names as canonical keys.
+    """
+    if store is None:
+        store = TeamDataStore(base_dir, categories=("matches",))
+    matches, _ = load_matches(store)
+    if matches.empty:
+        return pd.DataFrame(columns=FIXTURE_COLUMNS)
+
+    team = REGISTRY.slugs(REGISTRY.ids(matches["team"])).to_numpy(dtype=object)
+    opponent = REGISTRY.slugs(REGISTRY.ids(matches["Opponent"].astype(str))).to_numpy(dtype=object)
+    side = matches["Side"].astype(object).to_numpy() if "Side" in matches else np.full(len(matches), None)
+    venue_known = pd.notna(side)
+    at_home = side == "h"
+
+    first, second = np.where(team < opponent, team, opponent), np.where(team < opponent, opponent, team)
+    fixtures = pd.DataFrame({
+        "Date": matches["Date"].to_numpy(),
+        "home": np.where(venue_known, np.where(at_home, team, opponent), first),
+        "away": np.where(venue_known, np.where(at_home, opponent, team), second),
+        "home_goals": matches["Home Score"].to_numpy(dtype=float),
+        "away_goals": matches["Away Score"].to_numpy(dtype=float),
+        "home_xg": matches["Home xG"].to_numpy(dtype=float) if "Home xG" in matches else np.nan,
+        "away_xg": matches["Away xG"].to_numpy(dtype=float) if "Away xG" in matches else np.nan,
+        "venue_known": venue_known,
+        "_pair": pd.Series(first + "|" + second),
+    })
+    fixtures = fixtures.sort_values("venue_known", ascending=False, kind="stable")
+    fixtures = fixtures.drop_duplicates(["Date", "_pair"]).drop(columns="_pair")
+    return fixtures.sort_values("Date", kind="stable").reset_index(drop=True)
+
+
+def decay_weights(dates, reference_date=None, half_life_days=DEFAULT_HALF_LIFE_DAYS):
+    """
+    Return the exponential time-decay weight of every match: 1 on the reference date
+    (the last match by default), halving every half_life_days before it.
+    """
+    dates = pd.to_datetime(pd.Series(dates))
+    reference_date = dates.max() if reference_date is None else pd.Timestamp(reference_date)
+    age_days = (reference_date - dates).dt.total_seconds().to_numpy() / 86400
+    if not half_life_days:
+        return np.ones(len(dates))
+    return np.exp(-np.log(2) * np.clip(age_days, 0, None) / half_life_days)
+
+
+def _low_score_correction(x, y, lam, mu, rho):
+    """
+    Return the log of the Dixon-Coles correction tau of every match and its derivatives
+    with respect to the home rate, the away rate and rho. Matches other than 0-0,
+    1-0, 0-1 and 1-1 are not corrected.
+    """
+    log_tau = np.zeros(len(x))
+    d_lam = np.zeros(len(x))
+    d_mu = np.zeros(len(x))
+    d_rho = np.zeros(len(x))
+
+    mask = (x == 0) & (y == 0)
+    tau = np.maximum(1 - lam[mask] * mu[mask] * rho, 1e-10)
+    log_tau[mask] = np.log(tau)
+    d_lam[mask] = -mu[mask] * rho / tau
+    d_mu[mask] = -lam[mask] * rho / tau
+    d_rho[mask] = -lam[mask] * mu[mask] / tau
+
+    mask = (x == 0) & (y == 1)
+    tau = np.maximum(1 + lam[mask] * rho, 1e-10)
+    log_tau[mask] = np.log(tau)
+    d_lam[mask] = rho / tau
+    d_rho[mask] = lam[mask] / tau
+
+    mask = (x == 1) & (y == 0)
+    tau = np.maximum(1 + mu[mask] * rho, 1e-10)
+    log_tau[mask] = np.log(tau)
+    d_mu[mask] = rho / tau
+    d_rho[mask] = mu[mask] / tau
+
+    mask = (x == 1) & (y == 1)
+    log_tau[mask] = np.log(1 - rho)
+    d_rho[mask] = -1 / (1 - rho)
+
+    return log_tau, d_lam, d_mu, d_rho
+
+
+def _negative_log_likelihood(params, home, away, x, y, weights, n_teams, l2, correct):
+    """
+    Return the weighted negative log-likelihood of the matches and its gradient.
+    """
+    intercept, home_advantage, rho = params[0], params[1], params[-1]
+    attack, defence = params[2:2 + n_teams], params[2 + n_teams:2 + 2 * n_teams]
+
+    log_lam = intercept + home_advantage + attack[home] - defence[away]
+    log_mu = intercept + attack[away] - defence[home]
+    lam, mu = np.exp(log_lam), np.exp(log_mu)
+    row_ll = x * log_lam - lam + y * log_mu - mu
+    if correct:
+        log_tau, tau_lam, tau_mu, tau_rho = _low_score_correction(x, y, lam, mu, rho)
+        row_ll += log_tau
+    else:
+        tau_lam = tau_mu = tau_rho = 0.0
+
+    ll = weights @ row_ll
+
+    # Derivatives of each match's weighted log-likelihood with respect to log(lambda) and log(mu)
+    g_lam = weights * (x - lam + lam * tau_lam)
+    g_mu = weights * (y - mu + mu * tau_mu)
+
+    gradient = np.empty_like(params)
+    gradient[0] = g_lam.sum() + g_mu.sum()
+    gradient[1] = g_lam.sum()
+    gradient[2:2 + n_teams] = (np.bincount(home, g_lam, n_teams) + np.bincount(away, g_mu, n_teams)
+                               - l2 * attack)
+    gradient[2 + n_teams:2 + 2 * n_teams] = (-np.bincount(away, g_lam, n_teams) - np.bincount(home, g_mu, n_teams)
+                                             - l2 * defence)
+    gradient[-1] = weights @ tau_rho if correct else 0.0
+
+    ll -= 0.5 * l2 * (attack @ attack + defence @ defence)
+    return -ll, -gradient
+
+
+def fit_strengths(fixtures, half_life_days=DEFAULT_HALF_LIFE_DAYS, reference_date=None,
+                  xg_weight=0.0, l2=DEFAULT_L2, previous=None):
+    """
+    Fit a Dixon-Coles team-strength model: the goals of the home team are Poisson with
+    rate exp(intercept + home advantage + attack[home] - defence[away]), those of the
+    away team with rate exp(intercept + attack[away] - defence[home]), and the
+    probabilities of 0-0, 1-0, 0-1 and 1-1 are corrected by rho.
+
+    Matches are weighted by decay_weights, so recent form counts more. The likelihood
+    and its analytic gradient are evaluated for all matches at once and maximised
+    with L-BFGS-B. Matches whose venue is unknown (see load_fixtures) are skipped.
+
+    :param fixtures: The played matches, e.g. from load_fixtures
+    :param half_life_days: The half-life of the time decay, None or 0 for equal weights
+    :param reference_date: The date of full weight, the last match by default
+    :param xg_weight: The share of xG in the fitted scores, 0 for goals only and 1 for
+        xG only; matches without xG use their goals. The low-score correction is only
+        fitted on goals (xg_weight 0).
+    :param l2: The ridge penalty on the attack and defence strengths
+    :param previous: A model returned by an earlier fit, whose parameters start the
+        optimisation (e.g. when refitting after a matchday)
+    :return: The model dictionary: "teams", "attack" and "defence" (arrays in team
+        order, centred on 0), "intercept", "home_advantage", "rho", the fit settings,
+        "log_likelihood", "matches" and "seconds".
+    """
+    from scipy.optimize import minimize
+
+    start = time.perf_counter()
+    known = fixtures["venue_known"].to_numpy(dtype=bool)
+    if not known.all():
+        print(f"Skipping {int((~known).sum())} matches without a recorded venue, re-scrape to include them")
+    fixtures = fixtures[known].reset_index(drop=True)
+    if fixtures.empty:
+        raise ValueError("No match records its venue; re-scrape the teams to record the Side column")
+    teams = sorted(set(fixtures["home"]) | set(fixtures["away"]))
+    n_teams = len(teams)
+    home = pd.Categorical(fixtures["home"], categories=teams).codes.astype(np.intp)
+    away = pd.Categorical(fixtures["away"], categories=teams).codes.astype(np.intp)
+
+    x = fixtures["home_goals"].to_numpy(dtype=float)
+    y = fixtures["away_goals"].to_numpy(dtype=float)
+    if xg_weight:
+        x = np.where(np.isnan(fixtures["home_xg"].to_numpy(dtype=float)), x,
+                     (1 - xg_weight) * x + xg_weight * fixtures["home_xg"].to_numpy(dtype=float))
+        y = np.where(np.isnan(fixtures["away_xg"].to_numpy(dtype=float)), y,
+                     (1 - xg_weight) * y + xg_weight * fixtures["away_xg"].to_numpy(dtype=float))
+    weights = decay_weights(fixtures["Date"], reference_date, half_life_days)
+
+    initial = np.zeros(2 * n_teams + 3)
+    initial[0] = np.log(max(np.average(x + y, weights=weights) / 2, 0.1))
+    initial[1] = 0.25
+    if previous is not None:
+        rows = {team: i for i, team in enumerate(previous["teams"])}
+        initial[0], initial[1], initial[-1] = previous["intercept"], previous["home_advantage"], previous["rho"]
+        for i, team in enumerate(teams):
+            if team in rows:
+                initial[2 + i] = previous["attack"][rows[team]]
+                initial[2 + n_teams + i] = previous["defence"][rows[team]]
+
+    correct = not xg_weight
+    bounds = [(None, None)] * (2 * n_teams + 2) + [RHO_BOUNDS if correct else (0.0, 0.0)]
+    initial[-1] = np.clip(initial[-1], *bounds[-1])
+    result = minimize(
+        _negative_log_likelihood, initial, jac=True, method="L-BFGS-B", bounds=bounds,
+        args=(home, away, x, y, weights, n_teams, l2, correct)
+    )
+
+    params = result.x
+    attack, defence = params[2:2 + n_teams], params[2 + n_teams:2 + 2 * n_teams]
+    # Centring both strengths on 0 leaves every rate unchanged
+    intercept = params[0] + attack.mean() - defence.mean()
+    return {
+        "teams": teams,
+        "attack": attack - attack.mean(),
+        "defence": defence - defence.mean(),
+        "intercept": float(intercept),
+        "home_advantage": float(params[1]),
+        "rho": float(params[-1]),
+        "half_life_days": half_life_days,
+        "reference_date": pd.to_datetime(fixtures["Date"]).max() if reference_date is None else reference_date,
+        "xg_weight": xg_weight,
+        "l2": l2,
+        "log_likelihood": float(-result.fun),
+        "matches": len(fixtures),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def strength_table(model):
+    """
+    Return the attack and defence strengths of a model as a DataFrame, best teams first.
+    """
+    table = pd.DataFrame({"team": model["teams"], "attack": model["attack"], "defence": model["defence"]})
+    table["overall"] = table["attack"] + table["defence"]
+    return table.sort_values("overall", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def expected_goals(model, home_teams, away_teams, neutral=False):
+    """
+    Return the expected goals of the home and away teams of many fixtures at once.
+    Teams unknown to the model get average strengths.
+    """
+    rows = pd.Categorical(home_teams, categories=model["teams"]).codes
+    away_rows = pd.Categorical(away_teams, categories=model["teams"]).codes
+    # Appending a 0 strength makes code -1 (unknown team) average
+    attack, defence = np.append(model["attack"], 0.0), np.append(model["defence"], 0.0)
+    home_advantage = 0.0 if neutral else model["home_advantage"]
+    lam = np.exp(model["intercept"] + home_advantage + attack[rows] - defence[away_rows])
+    mu = np.exp(model["intercept"] + attack[away_rows] - defence[rows])
+    return lam, mu
+
+
+def predict_scorelines(model, home_teams, away_teams, max_goals=DEFAULT_MAX_GOALS, neutral=False):
+    """
+    Predict the scoreline probabilities of a whole fixture list in one call.
+
+    :param model: A model returned by fit_strengths
+    :param home_teams: The canonical keys of the home teams, one per fixture
+    :param away_teams: The canonical keys of the away teams
+    :param max_goals: The highest number of goals of a team in the matrices
+    :param neutral: Whether the fixtures are played without home advantage
+    :return: An array of shape (fixtures, max_goals + 1, max_goals + 1) whose [n, i, j]
+        is the probability that fixture n ends i-j (home-away).
+    """
+    from scipy.special import gammaln
+
+    lam, mu = expected_goals(model, home_teams, away_teams, neutral)
+    goals = np.arange(max_goals + 1)
+    log_factorial = gammaln(goals + 1)
+    home_pmf = np.exp(goals * np.log(lam)[:, None] - lam[:, None] - log_factorial)
+    away_pmf = np.exp(goals * np.log(mu)[:, None] - mu[:, None] - log_factorial)
+    matrices = home_pmf[:, :, None] * away_pmf[:, None, :]
+
+    rho = model["rho"]
+    if rho:
+        matrices[:, 0, 0] *= np.maximum(1 - lam * mu * rho, 0)
+        matrices[:, 0, 1] *= 1 + lam * rho
+        matrices[:, 1, 0] *= 1 + mu * rho
+        matrices[:, 1, 1] *= 1 - rho
+    return matrices
+
+
+def outcome_probabilities(matrices):
+    """
+    Return the home win, draw and away win probabilities of scoreline matrices.
+    """
+    home_win = np.tril(np.ones(matrices.shape[1:], dtype=bool), -1)
+    return (
+        matrices[:, home_win].sum(axis=1),
+        np.trace(matrices, axis1=1, axis2=2),
+        matrices[:, home_win.T].sum(axis=1),
+    )
+
+
+def predict_fixtures(model, fixtures, max_goals=DEFAULT_MAX_GOALS):
+    """
+    Predict a fixture list, e.g. a whole gameweek.
+
+    :param model: A model returned by fit_strengths
+    :param fixtures: A DataFrame with "home" and "away" columns, team names from any source
+    :param max_goals: The highest number of goals of a team in the scoreline matrices
+    :return: The fixtures with the expected goals, the outcome probabilities and the
+        most likely score of every match.
+    """
+    home = REGISTRY.slugs(REGISTRY.ids(fixtures["home"].astype(str))).to_numpy(dtype=object)
+    away = REGISTRY.slugs(REGISTRY.ids(fixtures["away"].astype(str))).to_numpy(dtype=object)
+    matrices = predict_scorelines(model, home, away, max_goals)
+    lam, mu = expected_goals(model, home, away)
+    home_win, draw, away_win = outcome_probabilities(matrices)
+    most_likely = matrices.reshape(len(matrices), -1).argmax(axis=1)
+
+    predictions = fixtures.copy()
+    predictions["home_expected_goals"] = lam
+    predictions["away_expected_goals"] = mu
+    predictions["home_win"] = home_win
+    predictions["draw"] = draw
+    predictions["away_win"] = away_win
+    predictions["most_likely_score"] = [f"{i}-{j}" for i, j in zip(*np.divmod(most_likely, max_goals + 1))]
+    return predictions
@@ -0,0 +1,187 @@
+import argparse
+import glob
+import os
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+DEFAULT_DATASET_DIR = "understat_dataset"
+
+
+def category_path(dataset_dir, season, category):
+    """
+    Return the Parquet file of one category and season, which holds every team.
+
+    Every category has its own columns, so each category is a separate dataset
+    partitioned by season, with the team as a column:
+    <dataset_dir>/<category>/season=<season>/part-0.parquet
+    A file per team would be a few kilobytes, mostly Parquet metadata, and
+    larger on disk than the CSV files it replaces.
+    """
+    return os.path.join(dataset_dir, category, f"season={season}", "part-0.parquet")
+
+
+def category_files(dataset_dir, category):
+    """
+    Return the Parquet files of one category, one per season, in season order.
+    """
+    return sorted(glob.glob(os.path.join(dataset_dir, category, "season=*", "*.parquet")))
+
+
+def category_seasons(dataset_dir, category):
+    """
+    Return the seasons stored for one category, in ascending order.
+    """
+    return sorted(int(os.path.basename(os.path.dirname(path)).split("=", 1)[1])
+                  for path in category_files(dataset_dir, category))
+
+
+def dataset_exists(dataset_dir):
+    """
+    Check whether the Parquet dataset holds at least one category file.
+    """
+    return bool(glob.glob(os.path.join(dataset_dir, "*", "season=*", "*.parquet")))
+
+
+def infer_column_types(df):
+    """
+    Convert text columns that hold only numbers to numeric columns, as read_csv would.
+    Columns mixing numbers and text (e.g. 10.20+3.20) are kept as strings.
+    """
+    df = df.copy()
+    for column in df.columns:
+        if df[column].dtype == object:
+            try:
+                df[column] = pd.to_numeric(df[column])
+            except (ValueError, TypeError):
+                df[column] = df[column].astype("string")
+    return df
+
+
+def write_category_file(df, file_name):
+    """
+    Write one category DataFrame to a Parquet file, creating its partition directories.
+    The file is replaced only once it is complete.
+    """
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    table = pa.Table.from_pandas(infer_column_types(df), preserve_index=False)
+    pq.write_table(table, f"{file_name}.tmp", compression="zstd")
+    os.replace(f"{file_name}.tmp", file_name)
+
+
+def write_team_rows(df, file_name, team):
+    """
+    Replace the rows of one team in a category file, keeping those of the other teams.
+
+    :param df: The category DataFrame of the team, without a "team" column
+    :param file_name: The category file of the season, from category_path
+    :param team: The team directory name stored in the "team" column
+    """
+    rows = df.copy()
+    rows.insert(0, "team", team)
+    if os.path.exists(file_name):
+        existing = pq.read_table(file_name).to_pandas()
+        existing = existing[existing["team"] != team]
+        # Columns typed differently for other teams are inferred again over all rows
+        rows = pd.concat([existing.astype(object), rows.astype(object)], ignore_index=True)
+    write_category_file(rows, file_name)
+
+
+def infer_season(team_dir):
+    """
+    Infer the season start year of a CSV team directory from the first date of its matches.csv.
+    """
+    matches = pd.read_csv(os.path.join(team_dir, "matches.csv"), usecols=["Date"])
+    first_date = datetime.strptime(matches["Date"].iloc[0], "%b %d, %Y")
+    return first_date.year if first_date.month >= 7 else first_date.year - 1
+
+
+def season_from_team_url(team_url):
+    """
+    Return the season of an Understat team URL such as https://understat.com/team/Arsenal/2024.
+    """
+    return team_url.rstrip("/").rsplit("/", 1)[-1]
+
+
+def convert_csv_tree(base_dir, dataset_dir=DEFAULT_DATASET_DIR, season=None):
+    """
+    Convert the per-team CSV directories under base_dir into the Parquet dataset.
+
+    :param base_dir: The directory holding one sub-directory of CSV files per team
+    :param dataset_dir: The root of the Parquet dataset
+    :param season: The season of the CSV files, inferred from each matches.csv when omitted
+    :return: The number of CSV files converted.
+    """
+    # (category, season) -> team -> frame, so that every category file is written once
+    frames = {}
+    converted = 0
+    for team_dir in sorted(glob.glob(os.path.join(base_dir, "*", "matches.csv"))):
+        team_dir = os.path.dirname(team_dir)
+        team = os.path.basename(team_dir)
+        team_season = season if season is not None else infer_season(team_dir)
+        for csv_file in sorted(glob.glob(os.path.join(team_dir, "*.csv"))):
+            category = os.path.splitext(os.path.basename(csv_file))[0]
+            frames.setdefault((category, team_season), {})[team] = pd.read_csv(csv_file, dtype=str)
+            converted += 1
+        print(f"Read {team} ({team_season})")
+
+    for (category, category_season), teams in frames.items():
+        rows = pd.concat(teams, names=["team", None]).reset_index(level=0).reset_index(drop=True)
+        write_category_file(rows, category_path(dataset_dir, category_season, category))
+    return converted
+
+
+def read_category(dataset_dir, category, columns=None, teams=None, seasons=None):
+    """
+    Load one category of the Parquet dataset, reading only the requested columns
+    and partitions.
+
+    Numeric columns that are integers for some teams and floats for others are
+    promoted to floats.
+
+    :param dataset_dir: The root of the Parquet dataset
+    :param category: The category to read, e.g. "attackSpeed"
+    :param columns: The columns to read, all when omitted. The "team" column and the
+        "season" partition column are always included.
+    :param teams: The team directory names to read, all when omitted
+    :param seasons: The seasons to read, all when omitted. Other season files are not opened.
+    :return: A DataFrame with a "team" and a "season" column.
+    """
+    category_dir = os.path.join(dataset_dir, category)
+    files = category_files(dataset_dir, category)
+    if not files:
+        return pd.DataFrame(columns=["team", "season"] + list(columns or []))
+
+    file_schema = pa.unify_schemas([pq.read_schema(f) for f in files], promote_options="permissive")
+    partition_schema = pa.schema([("season", pa.int32())])
+    schema = pa.unify_schemas([file_schema, partition_schema])
+    dataset = ds.dataset(
+        category_dir, schema=schema, format="parquet",
+        partitioning=ds.partitioning(partition_schema, flavor="hive")
+    )
+
+    filters = []
+    if teams is not None:
+        filters.append(ds.field("team").isin(list(teams)))
+    if seasons is not None:
+        filters.append(ds.field("season").isin([int(season) for season in seasons]))
+    expression = None
+    for condition in filters:
+        expression = condition if expression is None else expression & condition
+
+    if columns is not None:
+        columns = ["team", "season"] + [c for c in columns if c not in ("team", "season")]
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the per-team CSV tree to a Parquet dataset.")
+    parser.add_argument("--base-dir", default="./", help="Directory holding the team CSV directories.")
+    parser.add_argument("--dataset-dir", default=DEFAULT_DATASET_DIR, help="Root of the Parquet dataset.")
+    parser.add_argument("--season", type=int, default=None,
+                        help="Season start year of the CSV files, inferred from matches.csv by default.")
+    args = parser.parse_args()
+    count = convert_csv_tree(args.base_dir, args.dataset_dir, args.season)
+    print(f"Converted {count} files into {args.dataset_dir}")
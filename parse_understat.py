@@ -1,112 +1,168 @@
+import argparse
 import asyncio
+import functools
 import os
-from playwright.async_api import async_playwright
-import json
+import time
+from urllib.parse import urlparse
 import pandas as pd
-import re
+from browser_utils import block_unneeded_resources
+from instrumentation import count_rows, span
+from understat_data import UNDERSTAT_URL, extract_json_blob, league_team_progress, matches_frame, statistics_to_frames
+from scrape_manifest import (
+    MANIFEST_FILE, load_manifest, record_team_progress, save_manifest,
+    select_outdated_teams, write_if_changed
+)
+from parquet_store import DEFAULT_DATASET_DIR, category_path, season_from_team_url, write_team_rows
+
+# Number of team pages scraped at the same time by scrape_team_links_and_statistics
+DEFAULT_CONCURRENCY = 4
+
+# Only documents and scripts from these hosts are loaded, everything else is blocked
+ALLOWED_HOSTS = ("understat.com",)
+
+# Selectors of the data a team page must show before it is parsed
+STATISTICS_READY_FUNCTION = "() => typeof statisticsData !== 'undefined'"
+CALENDAR_SELECTOR = ".calendar-container .calendar-date-container"
+
+# In-page extraction of every statistics table header and row in a single round trip
+TABLE_EXTRACTION_SCRIPT = """
+() => ({
+    headers: Array.from(document.querySelectorAll("table thead tr"), tr => tr.innerText),
+    rows: Array.from(
+        document.querySelectorAll("table tbody tr"),
+        tr => Array.from(tr.querySelectorAll("td"), td => td.innerText)
+    )
+})
+"""
+
+# In-page extraction of every played match of the calendar in a single round trip
+CALENDAR_EXTRACTION_SCRIPT = """
+selector => Array.from(document.querySelectorAll(selector)).map(container => {
+    const date = container.querySelector(".calendar-date");
+    const game = container.querySelector(".calendar-game");
+    if (!game) {
+        return null;
+    }
+    const home = game.querySelector(".team-home");
+    const away = game.querySelector(".team-away");
+    const opponent = game.querySelector(".team-title a");
+    if (!home || !away || !opponent) {
+        return null;
+    }
+    return {
+        "Date": date ? date.innerText : null,
+        "Opponent": opponent.innerText,
+        "Home Score": home.innerText,
+        "Away Score": away.innerText
+    };
+}).filter(match => match !== null)
+"""
+
+
+async def wait_for_team_page(page, timeout=30000):
+    """
+    Wait until the statistics script, the statistics table and the match calendar
+    of a team page are available.
 
+    :param page: The Playwright page object.
+    :param timeout: Maximum time to wait for each element, in milliseconds.
+    :return: None
+    """
+    await page.wait_for_function(STATISTICS_READY_FUNCTION, timeout=timeout)
+    await page.wait_for_selector("table tbody tr", timeout=timeout)
+    await page.wait_for_selector(CALENDAR_SELECTOR, state="attached", timeout=timeout)
 
-async def parse_team_statistics_and_matches(team_url, team_name):
+
+async def parse_team_statistics_and_matches(team_url, team_name, browser=None, headless=True):
     """
     Parse team statistics, match data, and table sections from the given team URL.
 
-    This function navigates to the team's page, waits for the page to load,
-    extracts script data for JSON statistics, parses the table sections,
-    and extracts match data.
+    This function navigates to the team's page, waits until the statistics script,
+    the table and the calendar are present, extracts script data for JSON statistics,
+    parses the table sections, and extracts match data. Images, fonts and
+    third-party requests are blocked while the page loads.
+
+    When a browser is given, the page is opened in a fresh context of that
+    browser so several teams can share one Chromium instance. Otherwise a
+    browser is launched for this team only.
 
     :param team_url: The URL of the team's page
     :param team_name: The name of the team
+    :param browser: An already launched Playwright browser to reuse (optional)
+    :param headless: Whether a browser launched by this function is headless
     :return: A tuple of two dictionaries: team statistics by category and match data.
+        The statistics dictionary also holds the time the page took to become ready.
     """
-    async with async_playwright() as p:
-        # Launch the browser
-        browser = await p.chromium.launch(headless=False)  # Use headless=True for silent execution
-        page = await browser.new_page()
+    if browser is None:
+        # Playwright is only imported when a browser is needed, so that the HTTP
+        # engine can save teams through this module without it
+        from playwright.async_api import async_playwright
+
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=headless)
+            try:
+                return await parse_team_statistics_and_matches(team_url, team_name, browser)
+            finally:
+                await browser.close()
+
+    context = await browser.new_context()
+    try:
+        # The host of the page itself is allowed too, e.g. a local replay server (see scrape_archive)
+        await block_unneeded_resources(context, ALLOWED_HOSTS + (urlparse(team_url).hostname,))
+        page = await context.new_page()
 
         # Navigate to the team's page
-        print(f"Navigating to {team_url}...")
-        await page.goto(team_url, timeout=180000)
+        print(f"[{team_name}] Navigating to {team_url}...")
+        start = time.perf_counter()
+        with span("page", "understat_team", team=team_name, url=team_url):
+            await page.goto(team_url, timeout=180000, wait_until="domcontentloaded")
 
-        # Wait for the page to load
-        print("Waiting for the page to load...")
-        await asyncio.sleep(5)
+            # Wait for the data we read, not for the whole page
+            await wait_for_team_page(page)
+        ready_seconds = time.perf_counter() - start
+        print(f"[{team_name}] Page ready in {ready_seconds:.2f}s")
 
         # Extract JSON statistics data
         content = await page.content()
-        statistics_data_script = None
-        for line in content.splitlines():
-            if "var statisticsData" in line:
-                statistics_data_script = line
-                break
-
-        if not statistics_data_script:
-            print("Could not find the statistics data script.")
-            await browser.close()
-            return None, None
+        statistics_data = extract_json_blob(content, "statisticsData")
 
-        print("Extracting statistics data...")
-        json_text = re.search(r'var statisticsData = JSON\.parse\((.*)\);', statistics_data_script).group(1)
-        decoded_json = bytes(json_text.strip("'"), "utf-8").decode("unicode_escape")
-        statistics_data = json.loads(decoded_json)
+        if statistics_data is None:
+            print(f"[{team_name}] Could not find the statistics data script.")
+            return None, None
 
         print("Processing statistics...")
-        data_frames = {}
-        for category, stats in statistics_data.items():
-            rows = []
-            for stat_name, stat_values in stats.items():
-                row = {"Statistic": stat_name, **stat_values, **stat_values.get("against", {})}
-                del row["against"]
-                rows.append(row)
-            df = pd.DataFrame(rows)
-            data_frames[category] = df
+        data_frames = statistics_to_frames(statistics_data)
 
         print("Parsing table sections...")
         table_sections = await parse_team_statistics_table(page)
 
         print("Extracting match data...")
-        matches = []
-        calendar_selector = ".calendar-container .calendar-date-container"
-        match_containers = await page.query_selector_all(calendar_selector)
-
-        for container in match_containers:
-            date_element = await container.query_selector(".calendar-date")
-            date_text = await date_element.inner_text() if date_element else None
-
-            game_element = await container.query_selector(".calendar-game")
-            if not game_element:
-                continue
-
-            home_score = await game_element.query_selector(".team-home")
-            away_score = await game_element.query_selector(".team-away")
-            opponent_element = await game_element.query_selector(".team-title a")
-
-            if home_score and away_score and opponent_element:
-                home_score_text = await home_score.inner_text()
-                away_score_text = await away_score.inner_text()
-                opponent = await opponent_element.inner_text()
-                matches.append({
-                    "Date": date_text,
-                    "Opponent": opponent,
-                    "Home Score": home_score_text,
-                    "Away Score": away_score_text,
-                })
-
-        match_df = pd.DataFrame(matches)
-
-        await browser.close()
+        # datesData also holds the venue and the xG of every match, which the calendar does not show
+        dates_data = extract_json_blob(content, "datesData")
+        if dates_data is not None:
+            match_df = matches_frame(dates_data)
+        else:
+            matches = await page.evaluate(CALENDAR_EXTRACTION_SCRIPT, CALENDAR_SELECTOR)
+            match_df = pd.DataFrame(matches)
 
         combined_data = {
             "json_statistics": data_frames,
-            "table_sections": table_sections
+            "table_sections": table_sections,
+            "ready_seconds": ready_seconds
         }
 
         return combined_data, match_df
+    finally:
+        await context.close()
 
 
 async def parse_team_statistics_table(page):
     """
     Parse distinct sections of the statistics table from the current page.
 
+    All header and row cells are read with one in-page evaluation, then rows are
+    assigned to the sections whose header has the same number of columns.
+
     :param page: The Playwright page object.
     :return: A dictionary of Pandas DataFrames for each table section.
     """
@@ -115,29 +171,29 @@ async def parse_team_statistics_table(page):
     # Wait for the table to load
     await page.wait_for_selector("table tbody tr", timeout=10000)
 
-    header_selector = "table thead tr"
-    headers_list = await page.locator(header_selector).all_inner_texts()
-    print(f"Headers list: {headers_list}")
-
-    headers_split = [header.split("\t") for header in headers_list]
+    table = await page.evaluate(TABLE_EXTRACTION_SCRIPT)
+    headers_split = [header.split("\t") for header in table["headers"]]
     print(f"Split headers: {headers_split}")
 
-    row_selector = "table tbody tr"
-    rows = page.locator(row_selector)
-    row_count = await rows.count()
-    print(f"Number of rows: {row_count}")
+    rows = table["rows"]
+    print(f"Number of rows: {len(rows)}")
 
+    return split_table_sections(headers_split, rows)
+
+
+def split_table_sections(headers_split, rows):
+    """
+    Split table rows into sections by matching their cell count to each header.
+
+    :param headers_split: The column names of each section
+    :param rows: The cell texts of every table row
+    :return: A dictionary of Pandas DataFrames for each table section.
+    """
     sections = {}
     for section_idx, headers in enumerate(headers_split):
         print(f"Processing section {section_idx + 1} with headers: {headers}")
 
-        valid_rows = []
-        for i in range(row_count):
-            row = rows.nth(i)
-            cells = await row.locator("td").all_inner_texts()
-
-            if len(cells) == len(headers):
-                valid_rows.append(cells)
+        valid_rows = [cells for cells in rows if len(cells) == len(headers)]
 
         if valid_rows:
             section_df = pd.DataFrame(valid_rows, columns=headers)
@@ -148,68 +204,200 @@ async def parse_team_statistics_table(page):
     return sections
 
 
-async def scrape_team_links_and_statistics():
+def save_team_data(team_name, combined_data, match_data, manifest=None, output_format="csv", season=None):
+    """
+    Save the scraped statistics, table sections and matches of a team to CSV files,
+    or to the Parquet dataset (see parquet_store) when output_format is "parquet".
+
+    When a manifest is given, files whose content has not changed since the last
+    write are left untouched and the manifest is updated with the new hashes.
+
+    :param team_name: The name of the team, used for the directory name
+    :param combined_data: The statistics dictionary returned by parse_team_statistics_and_matches
+    :param match_data: The match DataFrame returned by parse_team_statistics_and_matches
+    :param manifest: The scrape manifest (optional)
+    :param output_format: "csv" for one directory per team, "parquet" for the partitioned dataset
+    :param season: The season partition of the Parquet files, which hold the rows of every team
+    :return: None
+    """
+    team_dir = team_name.replace(" ", "_")
+    if output_format == "csv" and not os.path.exists(team_dir):
+        os.makedirs(team_dir)
+
+    frames = {}
+    json_statistics = combined_data["json_statistics"]
+    if json_statistics:
+        frames.update(json_statistics)
+
+    table_sections = combined_data["table_sections"]
+    if table_sections:
+        frames.update(table_sections)
+
+    if match_data is not None and not match_data.empty:
+        frames["matches"] = match_data
+
+    for category, df in frames.items():
+        if output_format == "parquet":
+            file_name = category_path(DEFAULT_DATASET_DIR, season, category)
+            write_func = functools.partial(write_team_rows, team=team_dir)
+        else:
+            file_name = os.path.join(team_dir, f"{category}.csv")
+            write_func = None
+
+        with span("file_write", category, team=team_name, path=file_name) as record:
+            record["rows"] = len(df)
+            if manifest is None:
+                if write_func is None:
+                    df.to_csv(file_name, index=False)
+                else:
+                    write_func(df, file_name)
+            elif not write_if_changed(df, file_name, manifest, team_name, category, write_func):
+                record["labels"]["status"] = "unchanged"
+                print(f"Unchanged {file_name}")
+                continue
+        print(f"Saved {file_name}")
+
+
+async def scrape_team(browser, semaphore, team_name, team_url, manifest=None, progress=None, output_format="csv"):
+    """
+    Scrape and save a single team while holding a slot of the semaphore.
+
+    :param browser: The shared Playwright browser
+    :param semaphore: The asyncio.Semaphore bounding the number of concurrent teams
+    :param team_name: The name of the team
+    :param team_url: The URL of the team's page
+    :param manifest: The scrape manifest updated after the team is saved (optional)
+    :param progress: The (matches played, last match date) of the team from the league page (optional)
+    :param output_format: "csv" or "parquet", see save_team_data
+    :return: The time in seconds the team's page took to become ready.
+    """
+    async with semaphore:
+        print(f"Processing team: {team_name} - {team_url}")
+        with span("team_scrape", team_name, engine="browser", url=team_url) as record:
+            combined_data, match_data = await parse_team_statistics_and_matches(team_url, team_name, browser)
+            if combined_data is None:
+                raise ValueError(f"No statistics data found on {team_url}")
+            save_team_data(team_name, combined_data, match_data, manifest,
+                           output_format, season_from_team_url(team_url))
+            record["rows"] = count_rows(match_data)
+        if manifest is not None and progress is not None:
+            record_team_progress(manifest, team_name, *progress, output_format)
+        return combined_data["ready_seconds"]
+
+
+async def scrape_team_links_and_statistics(concurrency=DEFAULT_CONCURRENCY, headless=True, engine="browser",
+                                           incremental=True, manifest_path=MANIFEST_FILE, output_format="csv",
+                                           base_url=UNDERSTAT_URL):
     """
     Scrape team links and statistics from the Understat EPL page.
 
     This function navigates to the Understat EPL page, waits for the table to load,
-    locates all team links, and processes the first 20 links. For each team, it
-    extracts team statistics, table sections, and match data, saves the data to CSV files.
-
-    :return: None
+    locates all team links, and processes the first 20 links. Teams are scraped
+    concurrently in separate contexts of one shared browser, at most `concurrency`
+    at a time. For each team, it extracts team statistics, table sections, and
+    match data, saves the data to CSV files. A failure on one team is reported
+    and does not stop the other teams.
+
+    A manifest of the matches played and the file hashes of every team is kept
+    in manifest_path. In incremental mode, teams without a new match since the
+    last run are skipped, and only files whose content changed are rewritten.
+
+    With engine="http" the pages are fetched without a browser and parsed from
+    their embedded JSON data (see understat_http.scrape_league_http).
+
+    :param concurrency: The maximum number of teams scraped at the same time
+    :param headless: Whether to run the browser without a visible window
+    :param engine: "browser" to render the pages with Playwright, "http" to fetch the raw HTML
+    :param incremental: Whether to skip the teams that have played no new match
+    :param manifest_path: The path of the scrape manifest
+    :param output_format: "csv" to write one directory per team, "parquet" to write the
+        season/team/category partitioned dataset
+    :param base_url: The site root, overridable to scrape a local replay server (see scrape_archive)
+    :return: A dictionary mapping the name of each team that failed to its error.
     """
-    league_url = 'https://understat.com/league/EPL'
+    if engine == "http":
+        from understat_http import scrape_league_http
+        return await scrape_league_http(base_url=base_url, concurrency=concurrency, headless=headless,
+                                        incremental=incremental, manifest_path=manifest_path,
+                                        output_format=output_format)
+
+    manifest = load_manifest(manifest_path)
+
+    league_url = f"{base_url.rstrip('/')}/league/EPL"
+    allowed_hosts = ALLOWED_HOSTS + (urlparse(base_url).hostname,)
+
+    from playwright.async_api import async_playwright
 
     async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
+        browser = await p.chromium.launch(headless=headless)
         page = await browser.new_page()
+        await block_unneeded_resources(page, allowed_hosts)
 
         print(f"Navigating to {league_url}...")
-        await page.goto(league_url, timeout=180000)
+        start = time.perf_counter()
+        with span("page", "understat_league", url=league_url):
+            await page.goto(league_url, timeout=180000, wait_until="domcontentloaded")
 
-        print("Waiting for the table to load...")
-        await page.wait_for_selector("table tbody tr")
+            print("Waiting for the table to load...")
+            await page.wait_for_selector("table tbody tr")
+        print(f"League page ready in {time.perf_counter() - start:.2f}s")
 
         team_links = page.locator("table tbody tr td:nth-child(2) a")
         count = await team_links.count()
         print(f"Found {count} links.")
 
+        teams = []
         for i in range(min(20, count)):
             team_link = team_links.nth(i)
             team_name = await team_link.inner_text()
             team_href = await team_link.get_attribute("href")
-            team_url = f"https://understat.com/{team_href}"
-
-            print(f"Processing team: {team_name.strip()} - {team_url}")
-            combined_data, match_data = await parse_team_statistics_and_matches(team_url, team_name.strip())
-
-            team_dir = team_name.strip().replace(" ", "_")
-            if not os.path.exists(team_dir):
-                os.makedirs(team_dir)
-
-            json_statistics = combined_data["json_statistics"]
-            if json_statistics:
-                for category, df in json_statistics.items():
-                    file_name = os.path.join(team_dir, f"{category}.csv")
-                    df.to_csv(file_name, index=False)
-                    print(f"Saved {file_name}")
-
-            table_sections = combined_data["table_sections"]
-            if table_sections:
-                for section_name, section_df in table_sections.items():
-                    section_file = os.path.join(team_dir, f"{section_name}.csv")
-                    section_df.to_csv(section_file, index=False)
-                    print(f"Saved {section_file}")
-
-            if match_data is not None and not match_data.empty:
-                match_file_name = os.path.join(team_dir, "matches.csv")
-                match_data.to_csv(match_file_name, index=False)
-                print(f"Saved {match_file_name}")
+            teams.append((team_name.strip(), f"{base_url.rstrip('/')}/{team_href.lstrip('/')}"))
+        progress = league_team_progress(await page.content())
+        await page.close()
+
+        if incremental:
+            teams = select_outdated_teams(teams, progress, manifest, output_format)
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        try:
+            results = await asyncio.gather(
+                *(scrape_team(browser, semaphore, team_name, team_url, manifest,
+                              progress.get(team_name), output_format)
+                  for team_name, team_url in teams),
+                return_exceptions=True
+            )
+        finally:
+            save_manifest(manifest, manifest_path)
+
+        failed = {}
+        for (team_name, _), result in zip(teams, results):
+            if isinstance(result, Exception):
+                print(f"Failed to scrape {team_name}: {result!r}")
+                failed[team_name] = repr(result)
+            else:
+                print(f"{team_name}: page ready in {result:.2f}s")
 
         await browser.close()
-        print("Scraping complete.")
+        print(f"Scraping complete. {len(teams) - len(failed)}/{len(teams)} teams saved.")
+        return failed
 
 
 if __name__ == "__main__":
-    asyncio.run(scrape_team_links_and_statistics())
-
+    parser = argparse.ArgumentParser(description="Scrape Understat EPL team statistics.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Number of teams scraped at the same time.")
+    parser.add_argument("--headed", action="store_true",
+                        help="Show the browser window instead of running headless.")
+    parser.add_argument("--engine", choices=["browser", "http"], default="browser",
+                        help="Render pages in Chromium or fetch the raw HTML over HTTP.")
+    parser.add_argument("--full", action="store_true",
+                        help="Scrape every team, even those without new matches.")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                        help="Write team CSV directories or the partitioned Parquet dataset.")
+    parser.add_argument("--base-url", default=UNDERSTAT_URL,
+                        help="Site root to scrape, e.g. a local replay server.")
+    args = parser.parse_args()
+    asyncio.run(scrape_team_links_and_statistics(
+        concurrency=args.concurrency, headless=not args.headed, engine=args.engine,
+        incremental=not args.full, output_format=args.format, base_url=args.base_url
+    ))
@@ -1,28 +1,42 @@
 from playwright.sync_api import sync_playwright
 from bs4 import BeautifulSoup
 import csv
+import os
 import time
+from urllib.parse import urlparse
+from browser_utils import block_unneeded_resources_sync
+from instrumentation import span
+from scrape_archive import rebase_url
 
-def scrape_table():
-    url = 'https://www.whoscored.com/Regions/252/Tournaments/2/Seasons/10316/Stages/23400/TeamStatistics/England-Premier-League-2024-2025'
+# Only documents and scripts from these hosts are loaded, everything else is blocked
+ALLOWED_HOSTS = ("whoscored.com",)
+
+WHOSCORED_URL = 'https://www.whoscored.com/Regions/252/Tournaments/2/Seasons/10316/Stages/23400/TeamStatistics/England-Premier-League-2024-2025'
+
+def scrape_table(headless=True, block_resources=True, output_csv='premier_league_stats.csv', base_url=None):
+    # base_url points the scrape at another site root, e.g. a local replay server (see scrape_archive)
+    url = rebase_url(WHOSCORED_URL, base_url) if base_url else WHOSCORED_URL
 
     with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
+        browser = p.chromium.launch(headless=headless)
         page = browser.new_page()
+        if block_resources:
+            block_unneeded_resources_sync(page, ALLOWED_HOSTS + (urlparse(url).hostname,))
 
         print("Navigating to the URL...")
-        page.goto(url, timeout=18000)
-
-        print("Waiting for the page to load...")
-        time.sleep(10)
-        try:
-            print("Waiting for the table to load...")
-            page.wait_for_selector('#top-team-stats-summary-grid', timeout=6000)
-        except Exception as e:
-            print(f"Error: {e}")
-            print("Table did not load. Exiting...")
-            browser.close()
-            return
+        start = time.perf_counter()
+        with span("page", "whoscored", url=url):
+            page.goto(url, timeout=18000, wait_until="domcontentloaded")
+
+            try:
+                print("Waiting for the table to load...")
+                page.wait_for_selector('#top-team-stats-summary-grid tbody tr', timeout=30000)
+            except Exception as e:
+                print(f"Error: {e}")
+                print("Table did not load. Exiting...")
+                browser.close()
+                return None
+        print(f"Table ready in {time.perf_counter() - start:.2f}s")
 
         # Get the page content
         content = page.content()
@@ -53,15 +67,22 @@ def scrape_table():
             for row in data_rows:
                 print(row)
 
-            # Save the data to a CSV file
-            with open('premier_league_stats.csv', 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(headers)
-                writer.writerows(data_rows)
-
-            print('Data saved to premier_league_stats.csv')
+            # Save the data to a CSV file, replacing the previous one only once complete
+            tmp_csv = f'{output_csv}.tmp'
+            with span("file_write", "whoscored", path=output_csv) as record:
+                with open(tmp_csv, 'w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(headers)
+                    writer.writerows(data_rows)
+                os.replace(tmp_csv, output_csv)
+                record["rows"] = len(data_rows)
+
+            print(f'Data saved to {output_csv}')
+            return output_csv
         else:
             print('Table not found.')
+            return None
 
 
-scrape_table()
\ No newline at end of file
+if __name__ == "__main__":
+    scrape_table()
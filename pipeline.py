@@ -0,0 +1,123 @@
+import os
+import clustering
+import etl
+import form
+import schema
+import team_points
+import team_store
+import teams
+from stage_cache import DEFAULT_CACHE_DIR, Stage, StageCache
+
+TRANSFERMARKT_CACHE_DIR = os.path.join(".cache", "transfermarkt")
+
+# The Understat stages: stage name -> (category file read, etl function)
+UNDERSTAT_STAGES = {
+    "attack_speed": ("attackSpeed", etl.process_attack_speed),
+    "formation": ("formation", etl.process_team_formation),
+    "game_state": ("gameState", etl.process_team_game_state),
+    "form": ("matches", etl.process_team_form),
+    "squad_size": ("section_2", etl.process_team_squad_size),
+}
+
+# Stages whose outputs are merged into the final table, in the order merge_final takes them
+MERGE_INPUTS = tuple(UNDERSTAT_STAGES) + ("historical_points", "whoscored", "market_values")
+
+
+def load_market_values(cache_dir):
+    """
+    Return the market values of the Transfermarkt page cached by the acquisition.
+
+    The stage only reads the cache, so its key depends on the page as acquired.
+    Without a cached page (e.g. offline on a fresh checkout) it falls back to an
+    empty table with a warning, like acquisition.transfermarkt_snapshot.
+    """
+    from acquisition import transfermarkt_snapshot
+
+    return transfermarkt_snapshot(cache_dir)
+
+
+def merge_stage_outputs(attack_speed, formation, game_state, form_df, squad_size,
+                        historical_points, who_scored, market_values):
+    final_team_data = etl.combine_team_frames(attack_speed, formation, game_state, form_df, squad_size)
+    return etl.merge_final(final_team_data, historical_points, who_scored, market_values)
+
+
+def cluster_stage(final_df, num_clusters):
+    return clustering.fit_clustering(final_df, num_clusters=num_clusters)
+
+
+def build_stages(base_dir="./", pl_tables_csv="./pl-tables-1993-2024.csv",
+                 who_scored_csv="./premier_league_stats.csv",
+                 transfermarkt_cache_dir=TRANSFERMARKT_CACHE_DIR, num_clusters=None):
+    """
+    Describe every pipeline stage with the files, parameters and code it depends on.
+
+    :return: A dictionary of stage name to stage_cache.Stage.
+    """
+    team_dirs = sorted(team_store.list_teams(base_dir))
+    stages = {}
+
+    for name, (category, process) in UNDERSTAT_STAGES.items():
+        def compute(category=category, process=process):
+            # A store of this category only, files already read in this process are reused
+            return process(base_dir, team_store.TeamDataStore(base_dir, categories=(category,)))
+
+        code = [process, team_store, schema] + ([form, teams] if category == "matches" else [])
+        stages[name] = Stage(
+            name, compute,
+            files=team_store.source_files(base_dir, category),
+            params={"teams": team_dirs},
+            code=code,
+        )
+
+    current_dir = os.getcwd()
+    stages["historical_points"] = Stage(
+        "historical_points",
+        lambda: team_points.process_team_data(csv_file=pl_tables_csv, current_dir=current_dir),
+        files=[pl_tables_csv],
+        params={"directories": sorted(team_points.get_directory_names(current_dir))},
+        code=[team_points, team_store, teams],
+    )
+    stages["whoscored"] = Stage(
+        "whoscored", lambda: etl.load_who_scored(who_scored_csv),
+        files=[who_scored_csv], code=[etl.load_who_scored],
+    )
+    stages["market_values"] = Stage(
+        "market_values", lambda: load_market_values(transfermarkt_cache_dir),
+        files=[os.path.join(transfermarkt_cache_dir, "market_values.html")],
+        code=[load_market_values, "acquisition", "market_values"],
+    )
+    stages["merge"] = Stage(
+        "merge", merge_stage_outputs, upstream=MERGE_INPUTS,
+        code=[merge_stage_outputs, etl.combine_team_frames, etl.merge_final, teams],
+    )
+    stages["clustering"] = Stage(
+        "clustering", lambda final_df: cluster_stage(final_df, num_clusters), upstream=["merge"],
+        params={"num_clusters": num_clusters}, code=[cluster_stage, clustering],
+    )
+    return stages
+
+
+def run_pipeline(base_dir="./", pl_tables_csv="./pl-tables-1993-2024.csv",
+                 who_scored_csv="./premier_league_stats.csv",
+                 sources=("understat", "whoscored", "transfermarkt"), timeouts=None,
+                 cache_dir=DEFAULT_CACHE_DIR, num_clusters=None, targets=("merge", "clustering")):
+    """
+    Acquire the sources, then run the pipeline stages through the stage cache.
+
+    Only the stages whose input files, parameters, code or upstream stages changed
+    since they were last stored are recomputed; the others are loaded from
+    cache_dir. Pass cache_dir=None to compute everything without storing it.
+
+    :return: A dictionary of target stage name to output: "merge" is the final
+        table of get_final_merged_df, "clustering" the model of clustering.fit_clustering,
+        whose cluster count is chosen by its sweep unless num_clusters is given.
+    """
+    if sources:
+        from acquisition import acquire_sources
+
+        acquire_sources(base_dir=base_dir, who_scored_csv=who_scored_csv, timeouts=timeouts,
+                        cache_dir=TRANSFERMARKT_CACHE_DIR, sources=sources)
+
+    stages = build_stages(base_dir, pl_tables_csv, who_scored_csv, TRANSFERMARKT_CACHE_DIR, num_clusters)
+    return StageCache(cache_dir).run(stages, targets)
@@ -0,0 +1,249 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from schema import COMPOUND_COLUMNS, split_compound_columns
+from team_store import TeamDataStore
+
+DEFAULT_INDEX_PATH = os.path.join(".cache", "players", "index.joblib")
+
+# Players with fewer minutes have per-90 rates too noisy to compare and are not indexed
+MIN_MINUTES = 270
+
+# Per-90 features of the index, computed from totals summed over every team and season
+RATE_FEATURES = ["goals_90", "assists_90", "shots_90", "key_passes_90", "xg_90", "xa_90", "goals_minus_xg_90"]
+
+# Positions of the section_2 "Pos" column (e.g. "F M"), one 0/1 feature each
+POSITIONS = ["GK", "D", "M", "F"]
+
+FEATURES = RATE_FEATURES + ["xg_per_shot"] + [f"pos_{position}" for position in POSITIONS]
+
+# Neighbours kept per player in the pynndescent graph
+INDEX_NEIGHBOURS = 30
+
+# Bumped whenever the keys or features of the index change, so that saved indexes are rebuilt
+INDEX_VERSION = 2
+
+
+def load_players(base_dir="./", dataset_dir=None, season=None):
+    """
+    Load the section_2 player tables of every team, one row per player, team and season.
+
+    :param base_dir: The directory of the CSV team directories
+    :param dataset_dir: The Parquet dataset to read instead, which holds every scraped season,
+        <base_dir>/understat_dataset when omitted and it exists
+    :param season: The season of the CSV files, inferred from each matches.csv when omitted
+    :return: A DataFrame with "player", "team", "season", "Pos", "Apps", "Min", "G",
+        "A", "Sh90", "KP90", "xG" and "xA" columns. The totals row of every table is dropped.
+    """
+    from parquet_store import DEFAULT_DATASET_DIR, dataset_exists
+
+    if dataset_dir is None and dataset_exists(os.path.join(base_dir, DEFAULT_DATASET_DIR)):
+        dataset_dir = os.path.join(base_dir, DEFAULT_DATASET_DIR)
+    if dataset_dir is not None:
+        from parquet_store import read_category
+
+        players = read_category(dataset_dir, "section_2")
+        players = split_compound_columns(players, COMPOUND_COLUMNS["section_2"])
+    else:
+        from parquet_store import infer_season
+
+        store = TeamDataStore(base_dir, categories=("section_2",))
+        frames = {}
+        for team in store.teams:
+            try:
+                frame = store.get(team, "section_2")
+            except (FileNotFoundError, ValueError):
+                print(f"section_2.csv not found or empty for team: {team}")
+                continue
+            frames[team] = frame.assign(
+                season=season if season is not None else infer_season(os.path.join(base_dir, team))
+            )
+        if not frames:
+            return pd.DataFrame(columns=["player", "team", "season"])
+        players = pd.concat(frames, names=["team", None]).reset_index(level=0).reset_index(drop=True)
+
+    players = players[players["Player"].notna()].rename(columns={"Player": "player"})
+    players["season"] = players["season"].astype(int)
+    return players.reset_index(drop=True)
+
+
+def player_features(players, min_minutes=MIN_MINUTES):
+    """
+    Aggregate the player rows of every team and season into one feature row per
+    player and team.
+
+    The tables hold no player ID, so a player is identified by their name and team:
+    two players of the same name stay apart unless they played for the same team,
+    and a player who changed teams has one row per team. Totals (goals, assists,
+    shots, key passes, xG, xA) are summed over the seasons and divided by the summed
+    minutes, so every season weighs by the minutes played in it. The position is
+    that of the latest season.
+
+    :param players: The rows from load_players
+    :param min_minutes: The minutes a player needs in total to be kept
+    :return: A DataFrame indexed by ("player", "team") with "season" (the latest),
+        "minutes" and the FEATURES.
+    """
+    minutes = players["Min"].astype(float)
+    totals = pd.DataFrame({
+        "player": players["player"].astype(str),
+        "team": players["team"].astype(str),
+        "minutes": minutes,
+        "goals": players["G"].astype(float),
+        "assists": players["A"].astype(float),
+        "shots": players["Sh90"].astype(float) * minutes / 90,
+        "key_passes": players["KP90"].astype(float) * minutes / 90,
+        "xg": players["xG"].astype(float),
+        "xa": players["xA"].astype(float),
+    })
+    summed = totals.groupby(["player", "team"], sort=True).sum()
+    latest = (players.assign(player=totals["player"], team=totals["team"])
+              .sort_values(["season", "Min"], kind="stable")
+              .drop_duplicates(["player", "team"], keep="last")
+              .set_index(["player", "team"])
+              .reindex(summed.index))
+
+    features = pd.DataFrame({"season": latest["season"], "minutes": summed["minutes"]})
+    nineties = summed["minutes"].where(summed["minutes"] > 0) / 90
+    for total, feature in [("goals", "goals_90"), ("assists", "assists_90"), ("shots", "shots_90"),
+                           ("key_passes", "key_passes_90"), ("xg", "xg_90"), ("xa", "xa_90")]:
+        features[feature] = summed[total] / nineties
+    features["goals_minus_xg_90"] = features["goals_90"] - features["xg_90"]
+    features["xg_per_shot"] = (summed["xg"] / summed["shots"].where(summed["shots"] > 0)).fillna(0)
+    positions = latest["Pos"].astype(str).str.split()
+    for position in POSITIONS:
+        features[f"pos_{position}"] = positions.map(lambda pos: float(position in pos))
+
+    return features[features["minutes"] >= min_minutes].fillna(0)
+
+
+class PlayerIndex:
+    """
+    Approximate nearest-neighbour index of players on their standardised features.
+
+    The scaling is fitted when the index is built and kept by update(), so that
+    players added later are placed in the same space and only they (and the
+    players whose statistics changed) are inserted in the pynndescent graph.
+    """
+
+    def __init__(self, features, n_neighbors=INDEX_NEIGHBOURS, random_state=42):
+        from pynndescent import NNDescent
+
+        start = time.perf_counter()
+        self.version = INDEX_VERSION
+        self.features = features.copy()
+        values = features[FEATURES].to_numpy(dtype=np.float32)
+        self.means = values.mean(axis=0)
+        self.scales = values.std(axis=0)
+        self.scales[self.scales == 0] = 1
+        self.players = []
+        self._rows = {}
+        self._names = {}
+        self._add_keys(features.index)
+        self.index = NNDescent(self._scale(values), n_neighbors=min(n_neighbors, len(values) - 1),
+                               random_state=random_state)
+        self.index.prepare()
+        print(f"Indexed {len(self.players)} players in {time.perf_counter() - start:.2f}s")
+
+    def _scale(self, values):
+        return ((values - self.means) / self.scales).astype(np.float32)
+
+    def _add_keys(self, keys):
+        for key in keys:
+            self._rows[key] = len(self.players)
+            self._names.setdefault(key[0].casefold(), []).append(len(self.players))
+            self.players.append(key)
+
+    def update(self, features):
+        """
+        Add the new players of a feature table to the index and move those whose
+        features changed, without rebuilding it. Players missing from the table stay indexed.
+
+        :return: A tuple of the number of players added and updated.
+        """
+        known = features.index.isin(self.players)
+        fresh = features[~known]
+        existing = features[known]
+        rows = np.array([self._rows[key] for key in existing.index], dtype=int)
+        changed = ~np.isclose(existing[FEATURES].to_numpy(dtype=np.float32),
+                              self.features.loc[existing.index, FEATURES].to_numpy(dtype=np.float32)).all(axis=1)
+
+        if fresh.empty and not changed.any():
+            return 0, 0
+        self.index.update(
+            xs_fresh=self._scale(fresh[FEATURES].to_numpy(dtype=np.float32)) if not fresh.empty else None,
+            xs_updated=self._scale(existing[FEATURES].to_numpy(dtype=np.float32)[changed]) if changed.any() else None,
+            updated_indices=rows[changed].tolist() if changed.any() else None,
+        )
+        self.index.prepare()
+
+        self.features.loc[existing.index[changed]] = existing[changed]
+        self.features = pd.concat([self.features, fresh])
+        self._add_keys(fresh.index)
+        return len(fresh), int(changed.sum())
+
+    def most_similar(self, player, k=10, team=None):
+        """
+        Return the k players most similar to a player.
+
+        The name is matched case-insensitively. When it belongs to several indexed
+        players (namesakes, or one player's rows for different teams), team picks
+        one of them; without it the name is ambiguous and a KeyError lists the teams.
+
+        :param player: The player name as on Understat
+        :param k: The number of neighbours
+        :param team: The team directory name (e.g. "Manchester_United") of the player
+        :return: A DataFrame indexed by player of the neighbours with their "distance",
+            team, season, minutes and features, closest first.
+        """
+        rows = self._names.get(str(player).casefold(), [])
+        if team is not None:
+            rows = [row for row in rows
+                    if self.players[row][1].casefold() == str(team).replace(" ", "_").casefold()]
+        if not rows:
+            raise KeyError(f"Unknown player: {player}" + (f" of {team}" if team is not None else ""))
+        if len(rows) > 1:
+            teams = ", ".join(sorted(self.players[row][1] for row in rows))
+            raise KeyError(f"Several players are named {player}, choose one with --team: {teams}")
+        row = rows[0]
+        query = self._scale(self.features.loc[[self.players[row]], FEATURES].to_numpy(dtype=np.float32))
+        neighbours, distances = self.index.query(query, k=min(k + 1, len(self.players)))
+        keep = neighbours[0] != row
+        neighbours, distances = neighbours[0][keep][:k], distances[0][keep][:k]
+        similar = self.features.loc[[self.players[i] for i in neighbours]].reset_index(level="team")
+        similar.insert(0, "distance", distances)
+        return similar
+
+
+def build_player_index(base_dir="./", dataset_dir=None, path=DEFAULT_INDEX_PATH, min_minutes=MIN_MINUTES):
+    """
+    Update the player index saved at path with the current section_2 tables, or
+    build it when there is none yet or it was saved with other keys or features
+    (INDEX_VERSION), and save it.
+
+    :return: The PlayerIndex.
+    """
+    import joblib
+
+    features = player_features(load_players(base_dir, dataset_dir), min_minutes)
+    player_index = joblib.load(path) if os.path.exists(path) else None
+    if player_index is not None and getattr(player_index, "version", 1) == INDEX_VERSION:
+        added, updated = player_index.update(features)
+        print(f"Player index: {added} players added, {updated} updated")
+    else:
+        player_index = PlayerIndex(features)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    joblib.dump(player_index, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+    return player_index
+
+
+def load_player_index(path=DEFAULT_INDEX_PATH):
+    """
+    Load a player index saved by build_player_index.
+    """
+    import joblib
+
+    return joblib.load(path)
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+SHOT_TYPES = ["normal", "standard", "slow", "fast"]
+
+
+def derive_metrics(df):
+    """
+    Return a copy of the team table with derived metrics added for every shot type:
+    goals and xG per shot, goals minus xG, and shots, goals and xG per 90 minutes.
+    Minutes are the time spent winning, drawing and losing from gameState.
+
+    :param df: The team table read by the dashboard
+    :return: The new DataFrame, the input is not modified.
+    """
+    derived = {}
+    minutes = df[["winning_time", "losing_time", "draw_time"]].sum(axis=1)
+    nineties = minutes.where(minutes > 0) / 90
+    for shot_type in SHOT_TYPES:
+        shots = df[f"{shot_type}_shots"].where(df[f"{shot_type}_shots"] > 0)
+        derived[f"{shot_type}_goals_per_shot"] = df[f"{shot_type}_goals"] / shots
+        derived[f"{shot_type}_xg_per_shot"] = df[f"{shot_type}_xg"] / shots
+        derived[f"{shot_type}_goals_minus_xg"] = df[f"{shot_type}_goals"] - df[f"{shot_type}_xg"]
+        for stat in ("shots", "goals", "xg"):
+            derived[f"{shot_type}_{stat}_per_90"] = df[f"{shot_type}_{stat}"] / nineties
+    return pd.concat([df, pd.DataFrame(derived, index=df.index)], axis=1)
+
+
+class RankIndex:
+    """
+    Rank every team on every numeric metric once, so that a team's rank and its
+    neighbours in the ranking are looked up without sorting.
+
+    Teams are ranked by descending value, ties in table order, missing values last.
+    """
+
+    def __init__(self, df, team_column="team"):
+        self.teams = df[team_column].to_numpy()
+        self.metrics = list(df.select_dtypes(include="number").columns)
+        self._rows = {team: row for row, team in enumerate(self.teams)}
+        self._values = {}
+        self._order = {}
+        self._positions = {}
+        for metric in self.metrics:
+            values = df[metric].to_numpy(dtype=float)
+            # Negating keeps NaN at the end of a stable ascending sort
+            order = np.argsort(-values, kind="stable")
+            positions = np.empty_like(order)
+            positions[order] = np.arange(len(order))
+            self._values[metric] = values
+            self._order[metric] = order
+            self._positions[metric] = positions
+
+    def rank(self, team, metric):
+        """
+        Return the 1-based rank of a team on a metric.
+        """
+        return int(self._positions[metric][self._rows[team]]) + 1
+
+    def neighbours(self, team, metric, k=2):
+        """
+        Return the up to k teams ranked directly above and the up to k ranked directly
+        below a team on a metric.
+
+        :return: A DataFrame with "team", the metric and "rank" columns, best first.
+        """
+        position = self._positions[metric][self._rows[team]]
+        order = self._order[metric]
+        rows = np.concatenate([order[max(0, position - k):position], order[position + 1:position + 1 + k]])
+        return pd.DataFrame({
+            "team": self.teams[rows],
+            metric: self._values[metric][rows],
+            "rank": self._positions[metric][rows] + 1,
+        })
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+# Column types of the team statistics categories taken from statisticsData
+_TEAM_STAT_DTYPES = {
+    "Statistic": "category",
+    "stat": "category",
+    "time": "int32",
+    "shots": "int32",
+    "goals": "int32",
+    "xG": "float64",
+}
+
+# Explicit column types of every Understat category file. Only these columns are
+# read, so pandas never has to infer a type. Compound "value+delta" columns are
+# read as text and split by split_compound_columns.
+CATEGORY_DTYPES = {
+    "attackSpeed": _TEAM_STAT_DTYPES,
+    "formation": _TEAM_STAT_DTYPES,
+    "gameState": _TEAM_STAT_DTYPES,
+    "timing": _TEAM_STAT_DTYPES,
+    "shotZone": _TEAM_STAT_DTYPES,
+    "situation": _TEAM_STAT_DTYPES,
+    "result": _TEAM_STAT_DTYPES,
+    "matches": {
+        "Date": "string[pyarrow]",
+        "Opponent": "category",
+        "Home Score": "int16",
+        "Away Score": "int16",
+        # Missing from files scraped before the venue and the match xG were recorded
+        "Side": "category",
+        "Home xG": "float32",
+        "Away xG": "float32",
+    },
+    # Counts are floats because the totals row at the bottom of the page tables has blank cells
+    "section_1": {
+        "№": "float32",
+        "Situation": "category",
+        "Sh": "float32",
+        "G": "float32",
+        "ShA": "float32",
+        "GA": "float32",
+        "xG": "string",
+        "xGA": "string",
+        "xGD": "float32",
+        "xG/Sh": "float32",
+        "xGA/Sh": "float32",
+    },
+    "section_2": {
+        "№": "float32",
+        "Player": "string[pyarrow]",
+        "Pos": "category",
+        "Apps": "float32",
+        "Min": "float32",
+        "G": "float32",
+        "A": "float32",
+        "Sh90": "float32",
+        "KP90": "float32",
+        "xG": "string",
+        "xA": "string",
+        "xG90": "float32",
+        "xA90": "float32",
+    },
+}
+
+# The dtype strings resolved once, so that reading a file does not parse them again
+_RESOLVED_DTYPES = {
+    category: {column: pd.api.types.pandas_dtype(dtype) for column, dtype in dtypes.items()}
+    for category, dtypes in CATEGORY_DTYPES.items()
+}
+
+# Columns stored by Understat as "value+delta" text, e.g. 10.20+3.20 or 9.62-0.38
+COMPOUND_COLUMNS = {
+    "section_1": ["xG", "xGA"],
+    "section_2": ["xG", "xA"],
+}
+
+COMPOUND_PATTERN = r"^\s*([+-]?\d+(?:\.\d+)?)\s*([+-]\d+(?:\.\d+)?)?\s*$"
+
+
+def split_compound(values):
+    """
+    Split a "value+delta" text column into two float32 columns in one vectorized pass.
+    A value shown without a delta (e.g. 0.00) has a delta of 0.
+
+    :param values: The text Series, e.g. ["10.20+3.20", "9.62-0.38", "0.00"]
+    :return: A tuple of the value and the delta float32 Series.
+    """
+    # Extracting from object strings and casting the matched groups with numpy is
+    # several times faster than going through pd.to_numeric on the string dtype
+    parts = values.astype(object).str.extract(COMPOUND_PATTERN).to_numpy(dtype=object)
+    value = parts[:, 0].astype("float32")
+    delta = parts[:, 1].astype("float32")
+    delta[np.isnan(delta) & ~np.isnan(value)] = 0
+    return pd.Series(value, index=values.index), pd.Series(delta, index=values.index)
+
+
+def split_compound_columns(df, columns):
+    """
+    Replace each compound column by its float32 value and a "<column>_diff" float32 delta column.
+    """
+    df = df.copy()
+    for column in columns:
+        if column not in df.columns:
+            continue
+        value, delta = split_compound(df[column])
+        position = df.columns.get_loc(column)
+        df[column] = value
+        df.insert(position + 1, f"{column}_diff", delta)
+    return df
+
+
+def read_category_csv(path, category):
+    """
+    Read an Understat category CSV with its declared column types.
+
+    Unknown categories are read with pandas type inference.
+
+    :param path: The CSV path
+    :param category: The category name, e.g. "section_2"
+    :return: The typed DataFrame, with compound columns split into value and delta.
+    """
+    dtypes = _RESOLVED_DTYPES.get(category)
+    if dtypes is None:
+        return pd.read_csv(path)
+
+    df = pd.read_csv(path, dtype=dtypes, usecols=lambda column: column in dtypes)
+    return split_compound_columns(df, COMPOUND_COLUMNS.get(category, []))
+
+
+def apply_category_dtypes(df, category):
+    """
+    Give a category frame read from the Parquet dataset the column types of read_category_csv.
+
+    :param df: The frame of one team, without the "team" and "season" columns
+    :param category: The category name, e.g. "section_2"
+    :return: The typed DataFrame, with compound columns split into value and delta.
+    """
+    dtypes = _RESOLVED_DTYPES.get(category)
+    if dtypes is None:
+        return df
+
+    compound = COMPOUND_COLUMNS.get(category, [])
+    df = df[[column for column in df.columns if column in dtypes]]
+    # Going through object gives the categories the same dtype as when reading a CSV file.
+    # Compound columns without any delta are stored as numbers, so they are made text again.
+    df = df.astype(object).astype({column: "string" if column in compound else dtypes[column] for column in df.columns})
+    return split_compound_columns(df, compound)
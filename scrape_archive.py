@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+DEFAULT_ARCHIVE_DIR = os.path.join(".cache", "archive")
+
+INDEX_FILE = "index.jsonl"
+
+# Response headers stored with every page and sent back when it is replayed
+KEPT_HEADERS = ("content-type", "etag", "last-modified")
+
+# The archive every scraped response is recorded into, see start_recording
+_recording = None
+
+
+def archive_key(url):
+    """
+    Return the key of a URL in the archive: its path and query. The host is left
+    out, so that pages recorded from any site are replayed from a single server.
+    """
+    parts = urlsplit(url)
+    return (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+
+def rebase_url(url, base_url):
+    """
+    Point a URL at another site root, e.g. https://www.whoscored.com/Regions/252
+    with base URL http://127.0.0.1:8765 becomes http://127.0.0.1:8765/Regions/252.
+    """
+    return base_url.rstrip("/") + archive_key(url)
+
+
+def load_index(root):
+    """
+    Read the index of an archive: key -> entry ("url", "status", "headers", "body"
+    file name, "bytes", "recorded"). A page recorded several times keeps its last entry.
+    """
+    path = os.path.join(root, INDEX_FILE)
+    if not os.path.exists(path):
+        return {}
+    entries = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                entries[entry["key"]] = entry
+    return entries
+
+
+class PageArchive:
+    """
+    Directory of recorded responses: the bodies are stored once each under their
+    SHA-256, and every response appends a line to index.jsonl. Recording is safe
+    from several threads.
+    """
+
+    def __init__(self, root=DEFAULT_ARCHIVE_DIR):
+        self.root = root
+        self.entries = load_index(root)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, "bodies"), exist_ok=True)
+
+    def record(self, url, status, headers, body):
+        """
+        Store one response. 304 Not Modified answers are skipped, they carry no page.
+        """
+        if status == 304:
+            return
+        digest = hashlib.sha256(body).hexdigest()
+        body_path = os.path.join(self.root, "bodies", digest)
+        entry = {
+            "key": archive_key(url),
+            "url": url,
+            "status": status,
+            "headers": {name: value for name, value in headers.items() if name.lower() in KEPT_HEADERS},
+            "body": digest,
+            "bytes": len(body),
+            "recorded": time.time(),
+        }
+        with self._lock:
+            if not os.path.exists(body_path):
+                with open(f"{body_path}.tmp", "wb") as f:
+                    f.write(body)
+                os.replace(f"{body_path}.tmp", body_path)
+            with open(os.path.join(self.root, INDEX_FILE), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            self.entries[entry["key"]] = entry
+
+    def record_response(self, response, *args, **kwargs):
+        """
+        requests response hook, installed by http_utils.create_session while recording.
+        """
+        self.record(response.url, response.status_code, response.headers, response.content)
+        return response
+
+    async def record_playwright_response(self, response):
+        """
+        Playwright (async API) response handler, installed by browser_utils while recording.
+        """
+        try:
+            body = await response.body()
+        except Exception:
+            # Redirects and aborted requests have no body
+            return
+        self.record(response.url, response.status, await response.all_headers(), body)
+
+    def record_playwright_response_sync(self, response):
+        """
+        Same as record_playwright_response, for the Playwright sync API.
+        """
+        try:
+            body = response.body()
+        except Exception:
+            return
+        self.record(response.url, response.status, response.all_headers(), body)
+
+    def read(self, key):
+        """
+        Return the entry and body of a key, or (None, None) when it was not recorded.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None, None
+        with open(os.path.join(self.root, "bodies", entry["body"]), "rb") as f:
+            return entry, f.read()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def start_recording(root=DEFAULT_ARCHIVE_DIR):
+    """
+    Record every page and response fetched from now on by the sessions of
+    http_utils.create_session and the Playwright pages set up by browser_utils.
+
+    :return: The PageArchive.
+    """
+    global _recording
+    _recording = PageArchive(root)
+    print(f"Recording fetched pages into {root}")
+    return _recording
+
+
+def stop_recording():
+    global _recording
+    _recording = None
+
+
+def recording_archive():
+    """
+    Return the archive being recorded into, or None when not recording.
+    """
+    return _recording
+
+
+class ReplayServer:
+    """
+    Local HTTP server answering from an archive, by path and query, whatever host
+    the pages were recorded from. Every request waits latency seconds plus a
+    uniform jitter, and a share error_rate of the requests is answered with
+    error_status instead of the page, so that scrapers can be exercised offline
+    under slow or flaky conditions. Unknown paths get a 404.
+
+    Use as a context manager, or call start() and stop().
+    """
+
+    def __init__(self, root=DEFAULT_ARCHIVE_DIR, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, error_status=503, seed=0):
+        self.archive = PageArchive(root)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.stats = {"requests": 0, "errors": 0, "missing": 0, "bytes": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _draw(self):
+        with self._lock:
+            self.stats["requests"] += 1
+            return self._random.random(), self._random.random()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _handler(self):
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, as the real sites, so that the scrapers' connection pools are exercised
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                error_draw, jitter_draw = replay._draw()
+                time.sleep(replay.latency + replay.jitter * jitter_draw)
+                if error_draw < replay.error_rate:
+                    replay._count("errors")
+                    self._send(replay.error_status, {"Content-Type": "text/plain"}, b"Injected error")
+                    return
+                entry, body = replay.archive.read(archive_key(self.path))
+                if entry is None:
+                    replay._count("missing")
+                    self._send(404, {"Content-Type": "text/plain"}, b"Not in the archive")
+                    return
+                replay._count("bytes", len(body))
+                self._send(entry["status"], entry["headers"], body)
+
+            def _send(self, status, headers, body):
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+
+MANIFEST_FILE = "scrape_manifest.json"
+
+
+def load_manifest(path=MANIFEST_FILE):
+    """
+    Load the scrape manifest, or return an empty one when it does not exist yet.
+
+    The manifest maps each team name to the number of matches played, the date of
+    the last match seen and the path and content hash of every category file written:
+    {"Arsenal": {"matches_played": 21, "last_match_date": "2025-01-18", "output_format": "csv",
+                 "files": {"matches": {"path": "Arsenal/matches.csv", "sha256": "<hash>"}}}}
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    """
+    Atomically write the scrape manifest.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def team_is_up_to_date(manifest, team_name, matches_played, last_match_date, output_format="csv"):
+    """
+    Check whether a team has played no new match since it was last scraped in the
+    same output format and all of its previously written files are still on disk.
+    """
+    entry = manifest.get(team_name)
+    if not entry or not entry.get("files"):
+        return False
+    if entry.get("matches_played") != matches_played or entry.get("last_match_date") != last_match_date:
+        return False
+    if entry.get("output_format", "csv") != output_format:
+        return False
+    return all(os.path.exists(file_entry["path"]) for file_entry in entry["files"].values())
+
+
+def record_team_progress(manifest, team_name, matches_played, last_match_date, output_format="csv"):
+    """
+    Remember the number of matches, the last match date and the output format of a scraped team.
+    """
+    entry = manifest.setdefault(team_name, {"files": {}})
+    entry["matches_played"] = matches_played
+    entry["last_match_date"] = last_match_date
+    entry["output_format"] = output_format
+
+
+def write_if_changed(df, file_name, manifest, team_name, category, write_func=None):
+    """
+    Write a DataFrame only when its content differs from the last write to the same path.
+
+    The content hash is taken over the CSV serialisation of the frame, whatever
+    the output format.
+
+    :param df: The DataFrame to write
+    :param file_name: The target path
+    :param manifest: The scrape manifest, updated with the new content hash
+    :param team_name: The team the file belongs to
+    :param category: The category name of the file, e.g. "attackSpeed"
+    :param write_func: A function(df, file_name) writing the file, CSV when omitted
+    :return: True when the file was written, False when it was left untouched.
+    """
+    content = df.to_csv(index=False)
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    files = manifest.setdefault(team_name, {"files": {}}).setdefault("files", {})
+    previous = files.get(category)
+    if previous == {"path": file_name, "sha256": digest} and os.path.exists(file_name):
+        return False
+
+    if write_func is None:
+        with open(file_name, "w", newline="", encoding="utf-8") as f:
+            f.write(content)
+    else:
+        write_func(df, file_name)
+    files[category] = {"path": file_name, "sha256": digest}
+    return True
+
+
+def select_outdated_teams(teams, progress, manifest, output_format="csv"):
+    """
+    Drop the teams that have played no new match since the last scrape.
+
+    :param teams: A list of (team name, team URL) tuples
+    :param progress: A dictionary mapping team names to (matches played, last match date),
+        as returned by understat_data.league_team_progress
+    :param manifest: The scrape manifest
+    :param output_format: The output format of this run, teams last written in another format are outdated
+    :return: The (team name, team URL) tuples that need to be scraped.
+    """
+    outdated = []
+    for team_name, team_url in teams:
+        matches_played, last_match_date = progress.get(team_name, (None, None))
+        if matches_played is not None and team_is_up_to_date(
+                manifest, team_name, matches_played, last_match_date, output_format):
+            print(f"Skipping {team_name}: no new matches since {last_match_date}")
+        else:
+            outdated.append((team_name, team_url))
+    return outdated
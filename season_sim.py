@@ -0,0 +1,248 @@
+import time
+import numpy as np
+import pandas as pd
+from numba import njit, prange
+
+DEFAULT_SIMULATIONS = 100_000
+
+# Simulations whose final positions are held in memory at once
+SIMULATION_CHUNK = 20_000
+
+# Places that win the title, qualify for the Champions League and are relegated
+TOP_PLACES = 4
+RELEGATION_PLACES = 3
+
+# Goal rates of rating_rates: the league's mean goals per team and match, the home
+# advantage on the log scale and the log-rate change per standard deviation of rating
+BASE_GOALS = 1.4
+HOME_ADVANTAGE = 0.25
+RATING_SCALE = 0.25
+
+# Columns of final_output.csv from which team_ratings derives a rating
+GOAL_COLUMNS = ["normal_goals", "standard_goals", "slow_goals", "fast_goals"]
+XG_COLUMNS = ["normal_xg", "standard_xg", "slow_xg", "fast_xg"]
+
+
+@njit(inline="always")
+def _next_uniform(state):
+    # splitmix64: a counter-based generator, so every simulation draws the same
+    # numbers whatever the number of threads
+    state = state + np.uint64(0x9E3779B97F4A7C15)
+    z = state
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z = z ^ (z >> np.uint64(31))
+    return state, (z >> np.uint64(11)) * (1.0 / 9007199254740992.0)
+
+
+@njit(inline="always")
+def _poisson(state, expected_exp, rate):
+    # Inversion, fast for the small rates of football scores
+    state, u = _next_uniform(state)
+    goals = 0
+    probability = expected_exp
+    cumulative = probability
+    while u > cumulative and goals < 30:
+        goals += 1
+        probability *= rate / goals
+        cumulative += probability
+    return state, goals
+
+
+@njit(parallel=True, cache=True)
+def _simulate_chunk(points, goal_difference, goals_for, home, away, home_rates, away_rates,
+                    first_simulation, seed, positions, final_points):
+    n_simulations, n_teams = positions.shape
+    home_exp = np.exp(-home_rates)
+    away_exp = np.exp(-away_rates)
+    for s in prange(n_simulations):
+        state = np.uint64(seed) * np.uint64(0x100000001B3) + np.uint64(first_simulation + s)
+        sim_points = points.copy()
+        sim_difference = goal_difference.copy()
+        sim_goals = goals_for.copy()
+        for f in range(len(home)):
+            state, x = _poisson(state, home_exp[f], home_rates[f])
+            state, y = _poisson(state, away_exp[f], away_rates[f])
+            h, a = home[f], away[f]
+            sim_goals[h] += x
+            sim_goals[a] += y
+            sim_difference[h] += x - y
+            sim_difference[a] += y - x
+            if x > y:
+                sim_points[h] += 3
+            elif x < y:
+                sim_points[a] += 3
+            else:
+                sim_points[h] += 1
+                sim_points[a] += 1
+
+        # Points, then goal difference, then goals scored, then a coin toss
+        key = np.empty(n_teams)
+        for t in range(n_teams):
+            state, u = _next_uniform(state)
+            key[t] = sim_points[t] * 1e6 + sim_difference[t] * 1e3 + sim_goals[t] + u
+        order = np.argsort(-key)
+        for rank in range(n_teams):
+            positions[s, order[rank]] = rank
+        for t in range(n_teams):
+            final_points[s, t] = sim_points[t]
+
+
+def played_matches(fixtures):
+    """
+    Return the played matches, checking that every one records its venue.
+
+    A match whose venue is unknown can neither be credited to the table nor
+    matched against the schedule, so it would be simulated again and its points
+    lost. Such matches raise instead of being dropped.
+    """
+    unknown = ~fixtures["venue_known"].astype(bool)
+    if unknown.any():
+        teams = sorted(set(fixtures.loc[unknown, "home"]) | set(fixtures.loc[unknown, "away"]))
+        raise ValueError(
+            f"{int(unknown.sum())} played matches do not record their venue; re-scrape these teams "
+            f"to record the Side column: {', '.join(teams)}"
+        )
+    return fixtures
+
+
+def current_table(fixtures, teams=None):
+    """
+    Build the league table of the played matches.
+
+    :param fixtures: The played matches, e.g. from match_model.load_fixtures
+    :param teams: The teams of the league, those of the fixtures by default
+    :return: A DataFrame with "team", "played", "points", "goal_difference" and
+        "goals_for", in teams order.
+    :raises ValueError: When a played match does not record its venue.
+    """
+    fixtures = played_matches(fixtures)
+    if teams is None:
+        teams = sorted(set(fixtures["home"]) | set(fixtures["away"]))
+    x = fixtures["home_goals"].to_numpy(dtype=int)
+    y = fixtures["away_goals"].to_numpy(dtype=int)
+    both = pd.DataFrame({
+        "team": np.concatenate([fixtures["home"].to_numpy(), fixtures["away"].to_numpy()]),
+        "played": 1,
+        "points": np.concatenate([np.select([x > y, x == y], [3, 1]), np.select([y > x, x == y], [3, 1])]),
+        "goal_difference": np.concatenate([x - y, y - x]),
+        "goals_for": np.concatenate([x, y]),
+    })
+    table = both.groupby("team").sum().reindex(teams, fill_value=0)
+    return table.rename_axis("team").reset_index()
+
+
+def remaining_fixtures(fixtures, teams=None):
+    """
+    Return the fixtures of a double round robin (every team hosting every other
+    once) that are not among the played matches.
+
+    :return: A DataFrame with "home" and "away" columns.
+    :raises ValueError: When a played match does not record its venue.
+    """
+    fixtures = played_matches(fixtures)
+    if teams is None:
+        teams = sorted(set(fixtures["home"]) | set(fixtures["away"]))
+    home, away = np.meshgrid(np.asarray(teams, dtype=object), np.asarray(teams, dtype=object), indexing="ij")
+    schedule = pd.DataFrame({"home": home.ravel(), "away": away.ravel()})
+    schedule = schedule[schedule["home"] != schedule["away"]]
+    played = pd.MultiIndex.from_arrays([fixtures["home"], fixtures["away"]])
+    unplayed = ~pd.MultiIndex.from_frame(schedule).isin(played)
+    return schedule[unplayed].reset_index(drop=True)
+
+
+def team_ratings(final_df, source="points"):
+    """
+    Return a rating of every team of final_output.csv, higher for stronger teams.
+
+    :param final_df: The final ETL table
+    :param source: "points" for the average points of recent seasons (points_last_10),
+        or "goals_minus_xg" for the goals scored minus their xG
+    :return: A Series of ratings indexed by team.
+    """
+    if source == "points":
+        ratings = final_df["points_last_10"]
+    elif source == "goals_minus_xg":
+        ratings = final_df[GOAL_COLUMNS].sum(axis=1) - final_df[XG_COLUMNS].sum(axis=1)
+    else:
+        raise ValueError(f"Unknown rating source: {source}")
+    return pd.Series(ratings.to_numpy(dtype=float), index=final_df["team"].to_numpy())
+
+
+def rating_rates(ratings, home_teams, away_teams, base_goals=BASE_GOALS,
+                 home_advantage=HOME_ADVANTAGE, scale=RATING_SCALE):
+    """
+    Turn team ratings into the expected goals of both teams of every fixture.
+
+    Ratings are standardised; each standard deviation between the teams moves the
+    log goal rates by scale. Teams without a rating are average.
+
+    :return: A tuple of the home and away expected goals arrays.
+    """
+    z = (ratings - ratings.mean()) / (ratings.std() or 1)
+    z_home = z.reindex(home_teams).fillna(0).to_numpy()
+    z_away = z.reindex(away_teams).fillna(0).to_numpy()
+    home_rates = base_goals * np.exp(home_advantage / 2 + scale * (z_home - z_away))
+    away_rates = base_goals * np.exp(-home_advantage / 2 + scale * (z_away - z_home))
+    return home_rates, away_rates
+
+
+def simulate_season(table, remaining, home_rates, away_rates, n_simulations=DEFAULT_SIMULATIONS,
+                    seed=0, top_places=TOP_PLACES, relegation_places=RELEGATION_PLACES):
+    """
+    Simulate the rest of the season many times, drawing the goals of every remaining
+    fixture from Poisson distributions, on all cores.
+
+    :param table: The current table, from current_table
+    :param remaining: The fixtures left to play ("home" and "away" columns)
+    :param home_rates: The expected goals of the home team of every remaining fixture
+    :param away_rates: The expected goals of the away team
+    :param n_simulations: The number of simulated season completions
+    :param seed: The random seed; results do not depend on the number of threads
+    :param top_places: The places counted by the "top" probability
+    :param relegation_places: The places counted by the "relegation" probability
+    :return: A tuple of the summary DataFrame ("team", "expected_points",
+        "expected_position", "title", "top", "relegation", best first) and the
+        position distribution DataFrame (teams x positions 1..n, probabilities).
+    """
+    start = time.perf_counter()
+    teams = table["team"].tolist()
+    n_teams = len(teams)
+    home = pd.Categorical(remaining["home"], categories=teams).codes.astype(np.int64)
+    away = pd.Categorical(remaining["away"], categories=teams).codes.astype(np.int64)
+    if (home < 0).any() or (away < 0).any():
+        raise ValueError("Remaining fixtures name teams that are not in the table")
+
+    points = table["points"].to_numpy(dtype=np.int64)
+    goal_difference = table["goal_difference"].to_numpy(dtype=np.int64)
+    goals_for = table["goals_for"].to_numpy(dtype=np.int64)
+    home_rates = np.asarray(home_rates, dtype=np.float64)
+    away_rates = np.asarray(away_rates, dtype=np.float64)
+
+    counts = np.zeros(n_teams * n_teams, dtype=np.int64)
+    points_sum = np.zeros(n_teams)
+    for first in range(0, n_simulations, SIMULATION_CHUNK):
+        size = min(SIMULATION_CHUNK, n_simulations - first)
+        positions = np.empty((size, n_teams), dtype=np.int16)
+        final_points = np.empty((size, n_teams), dtype=np.int32)
+        _simulate_chunk(points, goal_difference, goals_for, home, away, home_rates, away_rates,
+                        first, seed, positions, final_points)
+        # Flat (team, position) cells counted in one pass
+        counts += np.bincount((np.arange(n_teams) * n_teams + positions).ravel(), minlength=n_teams * n_teams)
+        points_sum += final_points.sum(axis=0)
+
+    distribution = pd.DataFrame(
+        counts.reshape(n_teams, n_teams) / n_simulations,
+        index=pd.Index(teams, name="team"), columns=range(1, n_teams + 1)
+    )
+    summary = pd.DataFrame({
+        "team": teams,
+        "expected_points": points_sum / n_simulations,
+        "expected_position": distribution.to_numpy() @ np.arange(1, n_teams + 1),
+        "title": distribution[1].to_numpy(),
+        "top": distribution.iloc[:, :top_places].sum(axis=1).to_numpy(),
+        "relegation": distribution.iloc[:, n_teams - relegation_places:].sum(axis=1).to_numpy(),
+    }).sort_values("expected_position", kind="stable").reset_index(drop=True)
+    print(f"Simulated {n_simulations} seasons of {len(remaining)} remaining fixtures "
+          f"in {time.perf_counter() - start:.2f}s")
+    return summary, distribution
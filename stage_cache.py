@@ -0,0 +1,248 @@
+import glob
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import pickle
+import threading
+import time
+from instrumentation import count_rows, span
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "stages")
+
+# Part of every key, bumped when the stored format changes
+CACHE_VERSION = 1
+
+# File digests memoised per process: absolute path -> (mtime_ns, size, sha256)
+_FILE_DIGESTS = {}
+_DIGEST_LOCK = threading.Lock()
+
+_MISSING = object()
+
+
+def file_digest(path):
+    """
+    Return the SHA-256 of a file's content, or None when it does not exist.
+    A file is only hashed again when its modification time or size changed.
+    """
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    with _DIGEST_LOCK:
+        cached = _FILE_DIGESTS.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    with _DIGEST_LOCK:
+        _FILE_DIGESTS[path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+
+def code_digest(objects):
+    """
+    Return the SHA-256 of the source code of functions, classes or modules.
+    Modules can also be given by name, which hashes their file without importing them.
+    """
+    digest = hashlib.sha256()
+    for obj in objects:
+        if isinstance(obj, str):
+            with open(importlib.util.find_spec(obj).origin, "rb") as f:
+                digest.update(f.read())
+        else:
+            digest.update(inspect.getsource(obj).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class Stage:
+    """
+    One pipeline step. Its output must only depend on the outputs of its upstream
+    stages, the content of its input files, its parameters and its code.
+
+    :param name: The stage name, also the name of its cache directory
+    :param compute: A function called with the outputs of the upstream stages, in order
+    :param upstream: The names of the stages whose outputs compute takes
+    :param files: The paths of the files compute reads
+    :param params: A JSON-serialisable dictionary of the other values compute depends on
+    :param code: The functions, classes, modules or module names whose source is the code version
+    """
+
+    def __init__(self, name, compute, upstream=(), files=(), params=None, code=()):
+        self.name = name
+        self.compute = compute
+        self.upstream = tuple(upstream)
+        self.files = tuple(files)
+        self.params = params or {}
+        self.code = tuple(code)
+
+
+class StageCache:
+    """
+    Persist stage outputs under a key derived from the hash of their inputs and code.
+
+    Keys are computed for the whole stage graph before anything is loaded, so a
+    cached stage is loaded without loading or computing its upstream stages, and
+    after one input changes only the stages downstream of it are recomputed.
+    With cache_dir set to None every stage is computed and nothing is stored.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        # Per-run status of each stage: (key, "cached" or "computed", seconds)
+        self.report = {}
+
+    def key(self, stage, upstream_keys):
+        """
+        Return the key of a stage given the keys of its upstream stages.
+        """
+        description = {
+            "version": CACHE_VERSION,
+            "stage": stage.name,
+            "upstream": upstream_keys,
+            "files": {path: file_digest(path) for path in stage.files},
+            "params": stage.params,
+            "code": code_digest(stage.code),
+        }
+        encoded = json.dumps(description, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _paths(self, stage_name, key):
+        stage_dir = os.path.join(self.cache_dir, stage_name)
+        return os.path.join(stage_dir, f"{key}.pkl"), os.path.join(stage_dir, f"{key}.json")
+
+    def load(self, stage_name, key):
+        """
+        Return the stored output of a stage, or _MISSING when there is none or it
+        cannot be read (e.g. it was written by an incompatible pandas version).
+        """
+        value_path, _ = self._paths(stage_name, key)
+        try:
+            with open(value_path, "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return _MISSING
+        except Exception as e:
+            print(f"Ignoring unreadable cache entry {value_path}: {e!r}")
+            return _MISSING
+
+    def store(self, stage, key, value, seconds, upstream_keys):
+        """
+        Write a stage output and its metadata, replacing the files only once complete.
+        """
+        value_path, meta_path = self._paths(stage.name, key)
+        os.makedirs(os.path.dirname(value_path), exist_ok=True)
+        with span("file_write", "stage_cache", stage=stage.name, path=value_path) as record:
+            with open(f"{value_path}.tmp", "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f"{value_path}.tmp", value_path)
+            record["rows"] = count_rows(value)
+
+        meta = {
+            "stage": stage.name,
+            "key": key,
+            "created": time.time(),
+            "seconds": seconds,
+            "rows": len(value) if hasattr(value, "__len__") else None,
+            "files": {path: file_digest(path) for path in stage.files},
+            "upstream": upstream_keys,
+            "params": stage.params,
+        }
+        with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2, default=str)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    def run(self, stages, targets):
+        """
+        Return the outputs of the target stages, loading every stage whose key is
+        cached and computing the others.
+
+        :param stages: A dictionary of stage name to Stage
+        :param targets: The names of the stages to return
+        :return: A dictionary of target stage name to output.
+        """
+        keys = {}
+        values = {}
+
+        def key_of(name):
+            if name not in keys:
+                stage = stages[name]
+                keys[name] = self.key(stage, {u: key_of(u) for u in stage.upstream})
+            return keys[name]
+
+        def value_of(name):
+            if name in values:
+                return values[name]
+            stage = stages[name]
+            key = key_of(name) if self.cache_dir is not None else None
+
+            start = time.perf_counter()
+            value = _MISSING
+            if key is not None:
+                with span("stage_load", name, key=key) as record:
+                    value = self.load(name, key)
+                    record["labels"]["hit"] = value is not _MISSING
+                    record["rows"] = count_rows(value) if value is not _MISSING else None
+            if value is not _MISSING:
+                status = "cached"
+            else:
+                args = [value_of(u) for u in stage.upstream]
+                start = time.perf_counter()
+                # Upstream stages are resolved first, so that the span and a profile cover this stage only
+                with span("stage", name, key=key) as record:
+                    value = stage.compute(*args)
+                    record["rows"] = count_rows(value)
+                status = "computed"
+            seconds = time.perf_counter() - start
+            if status == "computed" and key is not None:
+                self.store(stage, key, value, seconds, {u: keys[u] for u in stage.upstream})
+
+            self.report[name] = (key, status, seconds)
+            print(f"Stage {name}: {status} in {seconds:.2f}s")
+            values[name] = value
+            return value
+
+        return {name: value_of(name) for name in targets}
+
+
+def list_entries(cache_dir=DEFAULT_CACHE_DIR, stage=None):
+    """
+    Return the metadata of the stored entries, newest first, optionally of one stage only.
+    """
+    pattern = os.path.join(cache_dir, stage or "*", "*.json")
+    entries = []
+    for meta_path in glob.glob(pattern):
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        value_path = meta_path[:-len(".json")] + ".pkl"
+        meta["bytes"] = os.path.getsize(value_path) if os.path.exists(value_path) else 0
+        entries.append(meta)
+    return sorted(entries, key=lambda meta: meta["created"], reverse=True)
+
+
+def invalidate(cache_dir=DEFAULT_CACHE_DIR, stage=None, key=None, keep_latest=False):
+    """
+    Delete stored entries, forcing their stages to be recomputed on the next run.
+
+    :param cache_dir: The stage cache directory
+    :param stage: Only delete the entries of this stage
+    :param key: Only delete the entries whose key starts with this prefix
+    :param keep_latest: Keep the newest entry of each stage, deleting only older ones
+    :return: The number of deleted entries.
+    """
+    seen = set()
+    deleted = 0
+    for meta in list_entries(cache_dir, stage):
+        if key is not None and not meta["key"].startswith(key):
+            continue
+        if keep_latest and meta["stage"] not in seen:
+            seen.add(meta["stage"])
+            continue
+        for extension in (".pkl", ".json"):
+            path = os.path.join(cache_dir, meta["stage"], meta["key"] + extension)
+            if os.path.exists(path):
+                os.remove(path)
+        deleted += 1
+    return deleted
@@ -1,5 +1,7 @@
+import numpy as np
 import pandas as pd
-import os
+import team_store
+from teams import REGISTRY
 
 def load_table(file_path):
     """
@@ -9,39 +11,90 @@ def load_table(file_path):
 
 def get_directory_names(current_dir):
     """
-    List all directories in the current working directory, excluding hidden ones.
+    List the team directories in the current working directory, or the teams of
+    its Parquet dataset when it exists (see team_store.list_teams).
     """
-    return [
-        d for d in os.listdir(current_dir)
-        if os.path.isdir(os.path.join(current_dir, d)) and not d.startswith('.')
-    ]
+    return team_store.list_teams(current_dir)
 
-def normalize_team_names(df, team_column='team'):
+class SeasonIndex:
     """
-    Normalize team names by replacing spaces with underscores and converting to lowercase.
-    """
-    df[team_column] = df[team_column].str.replace(' ', '_').str.lower()
-    return df
+    Cumulative per-team, per-season sums of a league table for constant-time
+    averages over any run of seasons.
 
-def compute_average_points(table_df, season_cutoff):
+    For every metric, row t holds the running total of team t over the seasons,
+    with a leading zero column, so the total over the N seasons ending in year Y
+    is the difference of two entries. Seasons a team spent outside the league
+    count as zero and are not counted as seasons played.
     """
-    Compute the average points for teams after a specified season cutoff.
-    """
-    return (
-        table_df.loc[table_df['season_end_year'] > season_cutoff]
-        .groupby('team')['points']
-        .mean()
-    )
 
-def apply_team_name_corrections(points_series, corrections):
+    METRICS = ("points", "gf", "ga", "gd", "played")
+
+    def __init__(self, table_df, team_column='team'):
+        self.first_year = int(table_df['season_end_year'].min())
+        self.last_year = int(table_df['season_end_year'].max())
+        self.teams = pd.Index(table_df[team_column].unique())
+
+        rows = self.teams.get_indexer(table_df[team_column])
+        cols = table_df['season_end_year'].to_numpy() - self.first_year + 1
+        shape = (len(self.teams), self.last_year - self.first_year + 2)
+
+        self._cumulative = {}
+        for metric in self.METRICS + ("seasons",):
+            values = np.zeros(shape)
+            if metric == "seasons":
+                np.add.at(values, (rows, cols), 1)
+            else:
+                np.add.at(values, (rows, cols), table_df[metric].to_numpy(dtype=float))
+            self._cumulative[metric] = values.cumsum(axis=1)
+
+    def _bounds(self, last_n, end_year):
+        end_year = self.last_year if end_year is None else end_year
+        hi = int(np.clip(end_year - self.first_year + 1, 0, self.last_year - self.first_year + 1))
+        lo = max(hi - last_n, 0)
+        return lo, hi
+
+    def total(self, metric, last_n, end_year=None):
+        """
+        Return the sum of a metric for every team over the last_n seasons ending in end_year.
+        """
+        lo, hi = self._bounds(last_n, end_year)
+        cumulative = self._cumulative[metric]
+        return pd.Series(cumulative[:, hi] - cumulative[:, lo], index=self.teams, name=metric)
+
+    def average(self, metric='points', last_n=5, end_year=None, per_game=False):
+        """
+        Return the average of a metric for every team over the last_n seasons ending
+        in end_year (the latest season by default), counting only the seasons the
+        team played in the league.
+
+        :param metric: One of "points", "gf", "ga", "gd" or "played"
+        :param last_n: The number of seasons in the window
+        :param end_year: The season_end_year of the last season in the window
+        :param per_game: Divide by games played instead of seasons played, which
+            makes 42-game and 38-game seasons comparable
+        :return: A Series indexed by team, NaN for teams without a season in the window.
+        """
+        total = self.total(metric, last_n, end_year)
+        divisor = self.total('played' if per_game else 'seasons', last_n, end_year)
+        return (total / divisor.where(divisor > 0)).rename(metric)
+
+    def team_average(self, team, metric='points', last_n=5, end_year=None, per_game=False):
+        """
+        Return the average of a metric for a single team, in constant time.
+        """
+        row = self.teams.get_loc(team)
+        lo, hi = self._bounds(last_n, end_year)
+        total = self._cumulative[metric][row, hi] - self._cumulative[metric][row, lo]
+        divisor = self._cumulative['played' if per_game else 'seasons']
+        divisor = divisor[row, hi] - divisor[row, lo]
+        return total / divisor if divisor > 0 else np.nan
+
+
+def map_points_to_teams(directory_names, points_last_10, points_last_5):
     """
-    Apply corrections to team names in a points series.
-    """
-    return points_series.rename(index=corrections)
-
-def map_points_to_teams(directory_names, points_2014, points_2019):
-    """
-    Create a DataFrame with directory names and map points from 2014 and 2019 to teams.
+    Create a DataFrame with directory names and map the average points over the
+    last 10 seasons (points_last_10) and the last 5 seasons (points_last_5) to teams.
+    The points series may be indexed by team name or by team ID (see teams.REGISTRY).
     """
     # Create a DataFrame for team directories
     df = pd.DataFrame({'teams': directory_names})
@@ -50,8 +103,9 @@ def map_points_to_teams(directory_names, points_2014, points_2019):
     df['teams'] = df['teams'].str.replace(' ', '_').str.lower()
 
     # Map points to teams
-    df['points_last_5'] = df['teams'].map(points_2019)
-    df['points_last_10'] = df['teams'].map(points_2014)
+    keys = REGISTRY.ids(df['teams']) if pd.api.types.is_integer_dtype(points_last_5.index) else df['teams']
+    df['points_last_5'] = keys.map(points_last_5)
+    df['points_last_10'] = keys.map(points_last_10)
 
     return df
 
@@ -62,27 +116,17 @@ def process_team_data(csv_file, current_dir):
     # Load table data
     table_df = load_table(csv_file)
 
-    # Normalize team names in the table
-    table_df = normalize_team_names(table_df)
-
-    # Compute points for seasons after 2014 and 2019
-    points_2014 = compute_average_points(table_df, 2014)
-    points_2019 = compute_average_points(table_df, 2019)
+    # Key the table by team ID, which also resolves the pl-tables spellings
+    table_df['team'] = REGISTRY.ids(table_df['team'])
 
-    # Apply team name corrections
-    team_name_corrections = {
-        'manchester_utd': 'manchester_united',
-        'newcastle_utd': 'newcastle_united',
-        'wolves': 'wolverhampton_wanderers',
-        'leicester_city': 'leicester',
-        'ipswich_town': 'ipswich',
-    }
-    points_2014 = apply_team_name_corrections(points_2014, team_name_corrections)
-    points_2019 = apply_team_name_corrections(points_2019, team_name_corrections)
+    # Average points over the last 10 and last 5 seasons of the table
+    season_index = SeasonIndex(table_df)
+    points_last_10 = season_index.average('points', last_n=10)
+    points_last_5 = season_index.average('points', last_n=5)
 
     # Get directory names
     directory_names = get_directory_names(current_dir)
 
     # Map points to teams
-    return map_points_to_teams(directory_names, points_2014, points_2019)
+    return map_points_to_teams(directory_names, points_last_10, points_last_5)
 
@@ -0,0 +1,206 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from parquet_store import (
+    DEFAULT_DATASET_DIR, category_files, category_path, category_seasons, dataset_exists, read_category
+)
+from schema import apply_category_dtypes, read_category_csv
+
+# Category files read by the ETL
+DEFAULT_CATEGORIES = ("attackSpeed", "formation", "gameState", "matches", "section_2")
+
+# Parsed frames shared by every store of the process:
+# absolute path -> (mtime_ns, size, DataFrame or the exception raised while reading it),
+# or for a Parquet category file, (mtime_ns, size, {team: DataFrame})
+_FRAME_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def scan_team_dirs(base_dir):
+    """
+    Return a list of team directory names in the base directory.
+    """
+    return [
+        d for d in os.listdir(base_dir)
+        if os.path.isdir(os.path.join(base_dir, d))
+           and not d.startswith('.') and not d.startswith('_') and d != DEFAULT_DATASET_DIR
+    ]
+
+
+def list_teams(base_dir, dataset_dir=None):
+    """
+    Return the team names a TeamDataStore over base_dir holds: the teams of the
+    latest season of the Parquet dataset when it exists, the team directories otherwise.
+    """
+    dataset_dir = dataset_dir if dataset_dir is not None else os.path.join(base_dir, DEFAULT_DATASET_DIR)
+    if dataset_exists(dataset_dir):
+        seasons = category_seasons(dataset_dir, "matches")
+        teams = read_category(dataset_dir, "matches", columns=["team"], seasons=seasons[-1:])["team"]
+        return sorted(teams.unique())
+    return scan_team_dirs(base_dir)
+
+
+def source_files(base_dir, category, dataset_dir=None):
+    """
+    Return the files a TeamDataStore over base_dir reads a category from.
+    """
+    dataset_dir = dataset_dir if dataset_dir is not None else os.path.join(base_dir, DEFAULT_DATASET_DIR)
+    if dataset_exists(dataset_dir):
+        return category_files(dataset_dir, category)
+    return [
+        os.path.join(base_dir, team, f"{category}.csv") for team in sorted(scan_team_dirs(base_dir))
+        if os.path.exists(os.path.join(base_dir, team, f"{category}.csv"))
+    ]
+
+
+def clear_cache():
+    """
+    Drop every cached frame, forcing the next store refresh to read all files again.
+    """
+    with _CACHE_LOCK:
+        _FRAME_CACHE.clear()
+
+
+class TeamDataStore:
+    """
+    Scan a base directory of team folders once and hold the parsed category files.
+
+    Files are read on a thread pool and cached for the lifetime of the process,
+    keyed by their modification time and size, so a new store (or a refresh) on
+    the same directory only reads the files that changed in between. Files are
+    parsed with the column types declared in schema.CATEGORY_DTYPES.
+
+    When the Parquet dataset written by "scrape --format parquet" exists, the
+    latest season of every category is read from it instead of the team folders,
+    one file per category holding every team (see parquet_store).
+
+    The frames returned by get() are shared with the cache and must not be
+    modified in place.
+    """
+
+    def __init__(self, base_dir, categories=DEFAULT_CATEGORIES, max_workers=8, dataset_dir=None):
+        """
+        :param base_dir: The directory holding one sub-directory of CSV files per team
+        :param categories: The categories to load
+        :param max_workers: The number of files read at the same time
+        :param dataset_dir: The Parquet dataset, <base_dir>/understat_dataset when omitted.
+            The team folders are read when it holds no file.
+        """
+        self.base_dir = base_dir
+        self.categories = tuple(categories)
+        self.max_workers = max_workers
+        self.dataset_dir = dataset_dir if dataset_dir is not None else os.path.join(base_dir, DEFAULT_DATASET_DIR)
+        self.teams = []
+        # team -> season of its frames, filled when reading the Parquet dataset
+        self.seasons = {}
+        self._frames = {}
+        self.refresh()
+
+    @property
+    def uses_dataset(self):
+        """
+        Whether the frames are read from the Parquet dataset rather than the team folders.
+        """
+        return dataset_exists(self.dataset_dir)
+
+    def refresh(self):
+        """
+        Rescan the base directory and load the files added or changed since the last scan.
+
+        :return: The number of files read from disk.
+        """
+        if self.uses_dataset:
+            return self._refresh_dataset()
+
+        self.teams = scan_team_dirs(self.base_dir)
+        self.seasons = {}
+
+        stats = {}
+        for team in self.teams:
+            for category in self.categories:
+                path = os.path.abspath(os.path.join(self.base_dir, team, f"{category}.csv"))
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                stats[(team, category)] = (path, stat.st_mtime_ns, stat.st_size)
+
+        with _CACHE_LOCK:
+            stale = [
+                key for key, (path, mtime, size) in stats.items()
+                if _FRAME_CACHE.get(path, (None, None))[:2] != (mtime, size)
+            ]
+
+        if stale:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                loaded = executor.map(lambda key: self._read(stats[key][0], key[1]), stale)
+                with _CACHE_LOCK:
+                    for key, frame in zip(stale, loaded):
+                        path, mtime, size = stats[key]
+                        _FRAME_CACHE[path] = (mtime, size, frame)
+
+        with _CACHE_LOCK:
+            self._frames = {key: _FRAME_CACHE[path][2] for key, (path, _, _) in stats.items()}
+        return len(stale)
+
+    def _refresh_dataset(self):
+        """
+        Load the latest season of every category from the Parquet dataset,
+        reading only the category files changed since the last scan.
+        """
+        latest = {}
+        for category in self.categories:
+            seasons = category_seasons(self.dataset_dir, category)
+            if seasons:
+                latest[category] = seasons[-1]
+
+        frames = {}
+        seasons = {}
+        read = 0
+        for category, season in latest.items():
+            path = os.path.abspath(category_path(self.dataset_dir, season, category))
+            stat = os.stat(path)
+            with _CACHE_LOCK:
+                cached = _FRAME_CACHE.get(path)
+            if cached is None or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+                rows = read_category(self.dataset_dir, category, seasons=[season]).drop(columns="season")
+                by_team = {
+                    team: apply_category_dtypes(frame.drop(columns="team").reset_index(drop=True), category)
+                    for team, frame in rows.groupby("team", sort=False)
+                }
+                with _CACHE_LOCK:
+                    _FRAME_CACHE[path] = (stat.st_mtime_ns, stat.st_size, by_team)
+                read += 1
+            else:
+                by_team = cached[2]
+            for team, frame in by_team.items():
+                frames[(team, category)] = frame
+                seasons[team] = max(season, seasons.get(team, season))
+
+        self.teams = sorted(seasons)
+        self.seasons = seasons
+        self._frames = frames
+        return read
+
+    @staticmethod
+    def _read(path, category):
+        try:
+            return read_category_csv(path, category)
+        except ValueError as e:
+            return e
+
+    def get(self, team, category):
+        """
+        Return the parsed category file of a team.
+
+        :raises FileNotFoundError: When the team has no such file.
+        :raises ValueError: When the file could not be parsed (e.g. it is empty).
+        """
+        frame = self._frames.get((team, category))
+        if frame is None:
+            if self.seasons:
+                raise FileNotFoundError(f"{category} of {team} in {self.dataset_dir}")
+            raise FileNotFoundError(os.path.join(self.base_dir, team, f"{category}.csv"))
+        if isinstance(frame, Exception):
+            raise frame
+        return frame
@@ -0,0 +1,131 @@
+import re
+import pandas as pd
+
+# Canonical team keys with the names used for them by every source (Understat
+# directories and titles, Transfermarkt, WhoScored, pl-tables). A team's integer
+# ID is its position in this list, so IDs are stable across runs; new teams must
+# be appended at the end.
+CANONICAL_TEAMS = [
+    ("arsenal", ["Arsenal FC"]),
+    ("aston_villa", []),
+    ("bournemouth", ["AFC Bournemouth"]),
+    ("brentford", ["Brentford FC"]),
+    ("brighton", ["Brighton & Hove Albion"]),
+    ("chelsea", ["Chelsea FC"]),
+    ("crystal_palace", []),
+    ("everton", ["Everton FC"]),
+    ("fulham", ["Fulham FC"]),
+    ("ipswich", ["Ipswich Town"]),
+    ("leicester", ["Leicester City"]),
+    ("liverpool", ["Liverpool FC"]),
+    ("manchester_city", ["Man City"]),
+    ("manchester_united", ["Manchester Utd", "Man Utd"]),
+    ("newcastle_united", ["Newcastle Utd", "Newcastle"]),
+    ("nottingham_forest", []),
+    ("southampton", ["Southampton FC"]),
+    ("tottenham", ["Tottenham Hotspur", "Spurs"]),
+    ("west_ham", ["West Ham United"]),
+    ("wolverhampton_wanderers", ["Wolves"]),
+    ("barnsley", []),
+    ("birmingham_city", []),
+    ("blackburn", ["Blackburn Rovers"]),
+    ("blackpool", []),
+    ("bolton", ["Bolton Wanderers"]),
+    ("bradford_city", []),
+    ("burnley", []),
+    ("cardiff_city", []),
+    ("charlton_athletic", ["Charlton Ath"]),
+    ("coventry_city", []),
+    ("derby_county", []),
+    ("huddersfield", ["Huddersfield Town"]),
+    ("hull_city", []),
+    ("leeds_united", []),
+    ("luton_town", []),
+    ("middlesbrough", []),
+    ("norwich_city", []),
+    ("oldham_athletic", []),
+    ("portsmouth", []),
+    ("qpr", ["Queens Park Rangers"]),
+    ("reading", []),
+    ("sheffield_united", ["Sheffield Utd"]),
+    ("sheffield_wednesday", ["Sheffield Weds"]),
+    ("stoke_city", []),
+    ("sunderland", []),
+    ("swansea_city", []),
+    ("swindon_town", []),
+    ("watford", []),
+    ("west_brom", ["West Bromwich Albion"]),
+    ("wigan_athletic", []),
+    ("wimbledon", []),
+]
+
+
+def normalize_name(name):
+    """
+    Reduce a team name from any source to a lookup key: lowercase words joined by
+    underscores, without a leading table position ("1. Liverpool") or punctuation.
+    """
+    name = re.sub(r"^\s*\d+\.\s*", "", str(name)).lower().replace("&", " and ")
+    return re.sub(r"[^0-9a-z]+", "_", name).strip("_")
+
+
+class TeamRegistry:
+    """
+    Resolve team names from every source to a stable integer team ID in O(1).
+    """
+
+    def __init__(self, teams=CANONICAL_TEAMS):
+        self._slugs = []
+        self._ids = {}
+        for slug, aliases in teams:
+            self.register(slug, aliases)
+
+    def register(self, slug, aliases=()):
+        """
+        Add a team, or extra aliases of a known team, and return its ID.
+        """
+        key = normalize_name(slug)
+        team_id = self._ids.get(key)
+        if team_id is None:
+            team_id = len(self._slugs)
+            self._slugs.append(key)
+            self._ids[key] = team_id
+        for alias in aliases:
+            self._ids.setdefault(normalize_name(alias), team_id)
+        return team_id
+
+    def resolve(self, name, register=False):
+        """
+        Return the ID of a team name, or None when it is unknown and register is False.
+        """
+        if name is None or pd.isna(name):
+            return None
+        team_id = self._ids.get(normalize_name(name))
+        if team_id is None and register:
+            team_id = self.register(name)
+        return team_id
+
+    def slug(self, team_id):
+        """
+        Return the canonical key of a team ID, e.g. "manchester_united".
+        """
+        return self._slugs[team_id]
+
+    def ids(self, names, register=True):
+        """
+        Resolve a Series of names to a nullable Int32 Series of IDs, normalising each
+        distinct name once. Unknown names are registered as new teams by default,
+        so that they still form their own rows in merges.
+        """
+        mapping = {name: self.resolve(name, register) for name in pd.unique(names)}
+        return names.map(mapping).astype("Int32")
+
+    def slugs(self, team_ids):
+        """
+        Map a Series of team IDs back to their canonical keys.
+        """
+        return team_ids.map(lambda team_id: None if pd.isna(team_id) else self._slugs[int(team_id)])
+
+
+# The registry shared by the ETL modules
+REGISTRY = TeamRegistry()
@@ -0,0 +1,88 @@
+import asyncio
+import functools
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+import pytest
+from benchmark import understat_pages
+from parquet_store import DEFAULT_DATASET_DIR, category_files
+from team_store import TeamDataStore
+from understat_data import MATCH_COLUMNS, UNDERSTAT_URL
+from understat_http import scrape_league_http
+
+N_TEAMS = 3
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def understat_server(tmp_path):
+    """
+    Serve synthetic league and team pages from a directory through http.server,
+    as a local stand-in for understat.com.
+    """
+    site_dir = tmp_path / "site"
+    for url, html in understat_pages(n_teams=N_TEAMS):
+        path = site_dir / url[len(UNDERSTAT_URL):].lstrip("/")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(html, encoding="utf-8")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(site_dir)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_scrape_league_http_saves_every_team(understat_server, tmp_path, monkeypatch):
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    monkeypatch.chdir(work_dir)
+
+    failed = asyncio.run(scrape_league_http(
+        base_url=understat_server, concurrency=2, incremental=False, manifest_path=str(work_dir / "manifest.json")
+    ))
+
+    assert failed == {}
+    team_dirs = sorted(d for d in os.listdir(work_dir) if os.path.isdir(d))
+    assert team_dirs == [f"Team_{i:03d}" for i in range(N_TEAMS)]
+    for team_dir in team_dirs:
+        for category in ("attackSpeed", "formation", "gameState", "section_1", "section_2", "matches"):
+            assert (work_dir / team_dir / f"{category}.csv").exists()
+        matches = pd.read_csv(work_dir / team_dir / "matches.csv")
+        assert list(matches.columns) == MATCH_COLUMNS
+        assert set(matches["Side"]) <= {"h", "a"}
+
+
+def test_incremental_scrape_skips_unchanged_teams(understat_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manifest_path = str(tmp_path / "manifest.json")
+
+    assert asyncio.run(scrape_league_http(base_url=understat_server, manifest_path=manifest_path)) == {}
+    written = os.path.getmtime(tmp_path / "Team_000" / "matches.csv")
+    assert asyncio.run(scrape_league_http(base_url=understat_server, manifest_path=manifest_path)) == {}
+    assert os.path.getmtime(tmp_path / "Team_000" / "matches.csv") == written
+
+
+def test_parquet_scrape_writes_one_file_per_category(understat_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    failed = asyncio.run(scrape_league_http(
+        base_url=understat_server, output_format="parquet", manifest_path=str(tmp_path / "manifest.json")
+    ))
+
+    assert failed == {}
+    files = category_files(DEFAULT_DATASET_DIR, "matches")
+    assert [os.path.relpath(f, DEFAULT_DATASET_DIR) for f in files] == [
+        os.path.join("matches", "season=2024", "part-0.parquet")
+    ]
+    store = TeamDataStore(str(tmp_path), categories=("matches", "section_2"))
+    assert store.teams == [f"Team_{i:03d}" for i in range(N_TEAMS)]
+    assert list(store.get("Team_000", "matches").columns) == MATCH_COLUMNS
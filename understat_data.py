@@ -0,0 +1,209 @@
+import json
+import re
+from datetime import datetime
+import pandas as pd
+
+UNDERSTAT_URL = "https://understat.com"
+
+# Display names of the situations in the "Situation" table of a team page
+SITUATION_NAMES = {
+    "OpenPlay": "Open play",
+    "FromCorner": "From corner",
+    "SetPiece": "Set piece",
+    "DirectFreekick": "Direct Freekick",
+    "Penalty": "Penalty",
+}
+
+SECTION_1_COLUMNS = ["№", "Situation", "Sh", "G", "ShA", "GA", "xG", "xGA", "xGD", "xG/Sh", "xGA/Sh"]
+SECTION_2_COLUMNS = ["№", "Player", "Pos", "Apps", "Min", "G", "A", "Sh90", "KP90", "xG", "xA", "xG90", "xA90"]
+# "Side" is "h" when the team played at home and "a" away; the scores and xG are those of the home and away team
+MATCH_COLUMNS = ["Date", "Opponent", "Home Score", "Away Score", "Side", "Home xG", "Away xG"]
+
+
+def extract_json_blob(html, name):
+    """
+    Extract and decode a `var <name> = JSON.parse('...')` blob embedded in an Understat page.
+
+    Understat escapes the JSON string with \\xNN sequences, which are turned back
+    into bytes before decoding so that non-ASCII player names survive.
+
+    :param html: The raw HTML of the page
+    :param name: The JavaScript variable name, e.g. "statisticsData"
+    :return: The decoded JSON object, or None when the blob is not on the page.
+    """
+    match = re.search(rf"var {name}\s*=\s*JSON\.parse\('(.*?)'\)", html)
+    if not match:
+        return None
+    raw = re.sub(
+        rb"\\x([0-9a-fA-F]{2})",
+        lambda m: bytes([int(m.group(1), 16)]),
+        match.group(1).encode("utf-8")
+    )
+    return json.loads(raw.decode("utf-8"))
+
+
+def statistics_to_frames(statistics_data):
+    """
+    Convert the statisticsData blob into one DataFrame per category.
+    """
+    data_frames = {}
+    for category, stats in statistics_data.items():
+        rows = []
+        for stat_name, stat_values in stats.items():
+            row = {"Statistic": stat_name, **stat_values, **stat_values.get("against", {})}
+            del row["against"]
+            rows.append(row)
+        data_frames[category] = pd.DataFrame(rows)
+    return data_frames
+
+
+def format_value_delta(value, reference):
+    """
+    Format a value the way Understat tables do, e.g. 10.20+3.20 for xG 10.2 and 7 goals.
+    The delta is left out when it rounds to zero.
+    """
+    delta = round(value - reference, 2)
+    if delta == 0:
+        return f"{value:.2f}"
+    return f"{value:.2f}{delta:+.2f}"
+
+
+def situation_section(statistics_data):
+    """
+    Rebuild the "Situation" table (section_1) from the statisticsData blob.
+    """
+    rows = []
+    for stat_name, stats in statistics_data.get("situation", {}).items():
+        against = stats.get("against", {})
+        shots, goals, xg = int(stats["shots"]), int(stats["goals"]), float(stats["xG"])
+        shots_against, goals_against = int(against["shots"]), int(against["goals"])
+        xga = float(against["xG"])
+        rows.append([
+            len(rows) + 1,
+            SITUATION_NAMES.get(stat_name, stat_name),
+            shots,
+            goals,
+            shots_against,
+            goals_against,
+            format_value_delta(xg, goals),
+            format_value_delta(xga, goals_against),
+            f"{xg - xga:.2f}",
+            f"{xg / shots if shots else 0:.2f}",
+            f"{xga / shots_against if shots_against else 0:.2f}",
+        ])
+    return pd.DataFrame(rows, columns=SECTION_1_COLUMNS)
+
+
+def players_section(players_data):
+    """
+    Rebuild the players table (section_2) from the playersData blob, sorted by goals.
+
+    The totals row shown under the table on the page is not reproduced.
+    """
+    players = sorted(players_data, key=lambda player: int(player["goals"]), reverse=True)
+    rows = []
+    for player in players:
+        minutes = int(player["time"])
+        goals, assists = int(player["goals"]), int(player["assists"])
+        xg, xa = float(player["xG"]), float(player["xA"])
+        per_90 = 90 / minutes if minutes else 0
+        rows.append([
+            len(rows) + 1,
+            player["player_name"],
+            player["position"],
+            int(player["games"]),
+            minutes,
+            goals,
+            assists,
+            f"{int(player['shots']) * per_90:.2f}",
+            f"{int(player['key_passes']) * per_90:.2f}",
+            format_value_delta(xg, goals),
+            format_value_delta(xa, assists),
+            f"{xg * per_90:.2f}",
+            f"{xa * per_90:.2f}",
+        ])
+    return pd.DataFrame(rows, columns=SECTION_2_COLUMNS)
+
+
+def matches_frame(dates_data):
+    """
+    Build the played matches of a team (matches.csv) from the datesData blob.
+    """
+    matches = []
+    for match in dates_data:
+        if not match.get("isResult"):
+            continue
+        opponent = match["a"] if match["side"] == "h" else match["h"]
+        matches.append({
+            "Date": datetime.strptime(match["datetime"], "%Y-%m-%d %H:%M:%S").strftime("%b %d, %Y"),
+            "Opponent": opponent["title"],
+            "Home Score": match["goals"]["h"],
+            "Away Score": match["goals"]["a"],
+            "Side": match["side"],
+            "Home xG": float(match["xG"]["h"]),
+            "Away xG": float(match["xG"]["a"]),
+        })
+    return pd.DataFrame(matches, columns=MATCH_COLUMNS)
+
+
+def parse_team_page(html):
+    """
+    Parse a raw Understat team page without a browser.
+
+    :param html: The raw HTML of the team page
+    :return: A tuple of the statistics dictionary and the match DataFrame, in the
+        same format as parse_understat.parse_team_statistics_and_matches, or
+        (None, None) when one of the embedded blobs is missing.
+    """
+    statistics_data = extract_json_blob(html, "statisticsData")
+    players_data = extract_json_blob(html, "playersData")
+    dates_data = extract_json_blob(html, "datesData")
+    if statistics_data is None or players_data is None or dates_data is None:
+        return None, None
+
+    combined_data = {
+        "json_statistics": statistics_to_frames(statistics_data),
+        "table_sections": {
+            "section_1": situation_section(statistics_data),
+            "section_2": players_section(players_data),
+        },
+    }
+    return combined_data, matches_frame(dates_data)
+
+
+def league_teams(html, base_url, limit=20):
+    """
+    List the teams of a raw Understat league page from its teamsData blob.
+
+    :param html: The raw HTML of the league page
+    :param base_url: The site root used to build the team URLs
+    :param limit: The maximum number of teams returned
+    :return: A list of (team name, team URL) tuples, or None when the blob is missing.
+    """
+    teams_data = extract_json_blob(html, "teamsData")
+    if teams_data is None:
+        return None
+
+    teams = []
+    for team in list(teams_data.values())[:limit]:
+        season = min(match["date"] for match in team["history"])[:4] if team["history"] else ""
+        team_href = f"team/{team['title'].replace(' ', '_')}/{season}"
+        teams.append((team["title"], f"{base_url.rstrip('/')}/{team_href}"))
+    return teams
+
+
+def league_team_progress(html):
+    """
+    Read the number of matches played and the last match date of every team
+    from the teamsData blob of a raw Understat league page.
+
+    :param html: The raw HTML of the league page
+    :return: A dictionary mapping team names to (matches played, last match date as YYYY-MM-DD),
+        empty when the blob is missing.
+    """
+    teams_data = extract_json_blob(html, "teamsData") or {}
+    progress = {}
+    for team in teams_data.values():
+        dates = [match["date"] for match in team["history"]]
+        progress[team["title"]] = (len(dates), max(dates)[:10] if dates else None)
+    return progress
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http_utils import create_session
+from instrumentation import count_rows, span
+from understat_data import UNDERSTAT_URL, league_team_progress, league_teams, parse_team_page
+from scrape_manifest import (
+    MANIFEST_FILE, load_manifest, record_team_progress, save_manifest, select_outdated_teams
+)
+from parquet_store import season_from_team_url
+
+# HTTP pages are cheap, so more teams can be fetched at once than with the browser
+DEFAULT_HTTP_CONCURRENCY = 8
+
+
+async def fetch_html(session, url, timeout=30, executor=None):
+    """
+    Fetch a page with the pooled session without blocking the event loop.
+
+    :param session: The requests session from http_utils.create_session
+    :param url: The URL to fetch
+    :param timeout: The request timeout in seconds
+    :param executor: The thread pool running the request, the loop's default one when omitted
+    :return: The response body as text.
+    """
+    def get():
+        with span("page", "understat_http", url=url) as record:
+            response = session.get(url, timeout=timeout)
+            record["labels"]["status"] = response.status_code
+        response.raise_for_status()
+        response.encoding = response.encoding or "utf-8"
+        return response.text
+
+    return await asyncio.get_running_loop().run_in_executor(executor, get)
+
+
+class BrowserFallback:
+    """
+    Lazily launched Playwright browser for the team pages whose embedded data
+    could not be read over plain HTTP.
+    """
+
+    def __init__(self, headless=True):
+        self.headless = headless
+        self._playwright = None
+        self._browser = None
+        self._lock = asyncio.Lock()
+
+    async def parse(self, team_url, team_name):
+        from parse_understat import parse_team_statistics_and_matches
+
+        async with self._lock:
+            if self._browser is None:
+                from playwright.async_api import async_playwright
+
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        return await parse_team_statistics_and_matches(team_url, team_name, self._browser)
+
+    async def close(self):
+        if self._browser is not None:
+            await self._browser.close()
+            await self._playwright.stop()
+
+
+async def scrape_team_http(session, semaphore, fallback, team_name, team_url, manifest=None, progress=None,
+                           output_format="csv", executor=None):
+    """
+    Fetch, parse and save a single team page over HTTP, falling back to the
+    browser when the embedded JSON blobs are missing. The manifest, progress and
+    output_format arguments are the same as for parse_understat.scrape_team, the
+    executor that of fetch_html.
+
+    :return: The time in seconds it took to fetch and parse the page.
+    """
+    from parse_understat import save_team_data
+
+    async with semaphore:
+        print(f"Processing team: {team_name} - {team_url}")
+        with span("team_scrape", team_name, engine="http", url=team_url) as record:
+            start = time.perf_counter()
+            html = await fetch_html(session, team_url, executor=executor)
+            combined_data, match_data = parse_team_page(html)
+            if combined_data is None:
+                print(f"[{team_name}] Embedded data missing, falling back to the browser...")
+                combined_data, match_data = await fallback.parse(team_url, team_name)
+                if combined_data is None:
+                    raise ValueError(f"No statistics data found on {team_url}")
+            ready_seconds = time.perf_counter() - start
+            save_team_data(team_name, combined_data, match_data, manifest,
+                           output_format, season_from_team_url(team_url))
+            record["rows"] = count_rows(match_data)
+        if manifest is not None and progress is not None:
+            record_team_progress(manifest, team_name, *progress, output_format)
+        return ready_seconds
+
+
+async def scrape_league_http(base_url=UNDERSTAT_URL, concurrency=DEFAULT_HTTP_CONCURRENCY, headless=True,
+                             incremental=True, manifest_path=MANIFEST_FILE, output_format="csv"):
+    """
+    Scrape all EPL teams from the raw Understat HTML, without launching a browser
+    unless a page lacks its embedded data.
+
+    :param base_url: The site root, overridable to point at a local stand-in server
+    :param concurrency: The maximum number of team pages fetched at the same time
+    :param headless: Whether the fallback browser runs headless
+    :param incremental: Whether to skip the teams that have played no new match
+    :param manifest_path: The path of the scrape manifest
+    :param output_format: "csv" or "parquet", see parse_understat.save_team_data
+    :return: A dictionary mapping the name of each team that failed to its error.
+    """
+    league_url = f"{base_url.rstrip('/')}/league/EPL"
+    manifest = load_manifest(manifest_path)
+    session = create_session(pool_size=concurrency)
+    # The default executor of the loop has min(32, CPUs + 4) threads, which would
+    # cap the fetches in flight below concurrency on small machines
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    fallback = BrowserFallback(headless=headless)
+    try:
+        print(f"Fetching {league_url}...")
+        league_html = await fetch_html(session, league_url, executor=executor)
+        teams = league_teams(league_html, base_url)
+        if teams is None:
+            raise ValueError(f"No teams data found on {league_url}")
+        print(f"Found {len(teams)} teams.")
+
+        progress = league_team_progress(league_html)
+        if incremental:
+            teams = select_outdated_teams(teams, progress, manifest, output_format)
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        results = await asyncio.gather(
+            *(scrape_team_http(session, semaphore, fallback, team_name, team_url, manifest,
+                               progress.get(team_name), output_format, executor)
+              for team_name, team_url in teams),
+            return_exceptions=True
+        )
+    finally:
+        await fallback.close()
+        executor.shutdown()
+        session.close()
+        save_manifest(manifest, manifest_path)
+
+    failed = {}
+    for (team_name, _), result in zip(teams, results):
+        if isinstance(result, Exception):
+            print(f"Failed to scrape {team_name}: {result!r}")
+            failed[team_name] = repr(result)
+        else:
+            print(f"{team_name}: page ready in {result:.2f}s")
+
+    print(f"Scraping complete. {len(teams) - len(failed)}/{len(teams)} teams saved.")
+    return failed